@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Benchmark conversion of I/O data to and from the BigQuery storage
+representation: the schema-driven converters used by the BigQuery backend,
+against the previously used recursive, in-place conversion, over the
+specified files.
+"""
+
+import argparse
+import copy
+import decimal
+import json
+import sys
+import timeit
+from datetime import datetime, timezone
+from kcidb import db_schema
+from kcidb.backends import bigquery_schema
+
+
+def recursive_load_convert(node):
+    """The previously used recursive, in-place submitted data conversion"""
+    if isinstance(node, list):
+        for index, value in enumerate(node):
+            node[index] = recursive_load_convert(value)
+    elif isinstance(node, dict):
+        for key, value in list(node.items()):
+            if key == "misc":
+                node[key] = json.dumps(value)
+            else:
+                node[key] = recursive_load_convert(value)
+    return node
+
+
+def recursive_query_convert(node):
+    """The previously used recursive, in-place retrieved data conversion"""
+    if isinstance(node, decimal.Decimal):
+        node = float(node)
+    elif isinstance(node, datetime):
+        node = node.isoformat()
+    elif isinstance(node, list):
+        for index, value in enumerate(node):
+            node[index] = recursive_query_convert(value)
+    elif isinstance(node, dict):
+        for key, value in list(node.items()):
+            if value is None:
+                del node[key]
+            elif key == "misc":
+                node[key] = json.loads(value)
+            else:
+                node[key] = recursive_query_convert(value)
+    return node
+
+
+def to_bigquery_row(obj, fields):
+    """
+    Convert an I/O object to a row as BigQuery would return it: with all
+    the fields present, and numbers and timestamps represented as
+    Decimal and datetime.
+    """
+    row = {}
+    for field in fields:
+        value = obj.get(field.name)
+        if value is None:
+            value = [] if field.mode == "REPEATED" else None
+        elif field.name == "misc":
+            value = json.dumps(value)
+        elif field.field_type == "RECORD" and field.mode != "REPEATED":
+            value = to_bigquery_row(value, field.fields)
+        elif field.field_type == "NUMERIC":
+            value = decimal.Decimal(str(value))
+        elif field.field_type == "TIMESTAMP":
+            value = datetime.fromisoformat(value).astimezone(timezone.utc)
+        row[field.name] = value
+    return row
+
+
+def measure(function, setup, number):
+    """
+    Measure the minimum time it takes to run a function on the result of
+    a setup function, not counting the setup.
+    """
+    times = []
+    for _ in range(number):
+        arg = setup()
+        times.append(timeit.timeit(lambda: function(arg), number=1))
+    return min(times)
+
+
+def main():
+    """Run the benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        'files', metavar='FILE', nargs='+',
+        help='A file with I/O data to convert'
+    )
+    parser.add_argument(
+        '-n', '--number', type=int, default=5,
+        help='Number of times to convert each file (default: 5)'
+    )
+    args = parser.parse_args()
+
+    for path in args.files:
+        with open(path, "r") as json_file:
+            data = json.load(json_file)
+        rows = {
+            name: [to_bigquery_row(obj, fields) for obj in data.get(name, [])]
+            for name, fields in db_schema.TABLE_MAP.items()
+        }
+
+        def schema_load(data):
+            for name in db_schema.TABLE_MAP:
+                convert = bigquery_schema.LOAD_CONVERTER_MAP[name]
+                if convert is not None:
+                    list(map(convert, data.get(name, [])))
+
+        def schema_query(rows):
+            for name in db_schema.TABLE_MAP:
+                convert = bigquery_schema.QUERY_CONVERTER_MAP[name]
+                for row in rows[name]:
+                    convert(row.items())
+
+        def recursive_query(rows):
+            for name in db_schema.TABLE_MAP:
+                for row in rows[name]:
+                    recursive_query_convert(dict(row.items()))
+
+        times = dict(
+            recursive_load=measure(
+                lambda data: [recursive_load_convert(data.get(name, []))
+                              for name in db_schema.TABLE_MAP],
+                lambda: copy.deepcopy(data), args.number),
+            schema_load=measure(schema_load, lambda: data, args.number),
+            # The recursive conversion modified nested records in place
+            recursive_query=measure(recursive_query,
+                                    lambda: copy.deepcopy(rows),
+                                    args.number),
+            schema_query=measure(schema_query, lambda: rows, args.number),
+        )
+        print(f"{path}: " + ", ".join(
+            f"{name} {time * 1000:.1f}ms" for name, time in times.items()
+        ) + f" (load x{times['recursive_load'] / times['schema_load']:.1f},"
+            f" query x{times['recursive_query'] / times['schema_query']:.1f})")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Generate synthetic, schema-valid I/O data at a configurable scale, the same
+for the same seed, as newline-delimited JSON: one I/O data document per
+line, suitable for "kcidb-submit --ndjson".
+"""
+
+import argparse
+import json
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+
+# Test statuses, and their relative frequencies
+STATUS_WEIGHTS = dict(PASS=80, FAIL=8, ERROR=2, DONE=5, SKIP=5)
+
+# Build architectures
+ARCHITECTURES = ("aarch64", "ppc64le", "s390x", "x86_64")
+
+# The earliest generated timestamp
+EPOCH = datetime(2019, 1, 1, tzinfo=timezone.utc)
+
+
+# We'd like to have all the generation parameters in one call
+# pylint: disable=too-many-arguments,too-many-locals
+def generate(tests, seed=0, tests_per_build=100, builds_per_revision=10,
+             chunk_size=10000, origin="bench"):
+    """
+    Generate synthetic I/O data, lazily, chunk by chunk.
+
+    Args:
+        tests:                  The total number of tests to generate.
+        seed:                   The random number generator seed.
+        tests_per_build:        The number of tests to generate per build.
+        builds_per_revision:    The number of builds to generate per
+                                revision.
+        chunk_size:             The maximum number of objects in each
+                                generated I/O data document.
+        origin:                 The origin of the generated objects.
+
+    Returns:
+        A generator returning I/O data documents adhering to
+        kcidb.io_schema.JSON, with revisions coming before their builds,
+        and builds coming before their tests.
+    """
+    assert isinstance(tests, int) and tests >= 0
+    assert isinstance(tests_per_build, int) and tests_per_build > 0
+    assert isinstance(builds_per_revision, int) and builds_per_revision > 0
+    assert isinstance(chunk_size, int) and chunk_size > 0
+    rng = random.Random(seed)
+    statuses = list(STATUS_WEIGHTS)
+    status_weights = list(STATUS_WEIGHTS.values())
+    chunk = dict(version="1")
+    chunk_len = 0
+
+    def add(obj_list_name, obj):
+        nonlocal chunk, chunk_len
+        chunk.setdefault(obj_list_name, []).append(obj)
+        chunk_len += 1
+        if chunk_len >= chunk_size:
+            full_chunk = chunk
+            chunk = dict(version="1")
+            chunk_len = 0
+            return full_chunk
+        return None
+
+    test_index = 0
+    build_index = 0
+    revision_index = 0
+    while test_index < tests:
+        revision_id = f"r{revision_index}"
+        discovery_time = EPOCH + timedelta(minutes=revision_index * 10)
+        full_chunk = add("revisions", dict(
+            origin=origin,
+            origin_id=revision_id,
+            git_repository_url="https://git.kernel.org/pub/scm/linux/"
+                               "kernel/git/stable/linux-stable-rc.git",
+            git_repository_commit_hash=f"{rng.getrandbits(160):040x}",
+            git_repository_branch="linux-5.3.y",
+            discovery_time=discovery_time.isoformat(),
+            contacts=["linux-kernel@vger.kernel.org"],
+            valid=True,
+            misc=dict(pipeline_id=revision_index),
+        ))
+        if full_chunk:
+            yield full_chunk
+        revision_index += 1
+        for _ in range(builds_per_revision):
+            if test_index >= tests:
+                break
+            build_id = f"b{build_index}"
+            start_time = discovery_time + \
+                timedelta(seconds=rng.randrange(600))
+            full_chunk = add("builds", dict(
+                revision_origin=origin,
+                revision_origin_id=revision_id,
+                origin=origin,
+                origin_id=build_id,
+                start_time=start_time.isoformat(),
+                duration=rng.uniform(300, 3600),
+                architecture=rng.choice(ARCHITECTURES),
+                command="make -j30 INSTALL_MOD_STRIP=1 targz-pkg",
+                output_files=[dict(
+                    name="kernel.tar.gz",
+                    url=f"https://example.org/builds/{build_id}/"
+                        f"kernel.tar.gz"
+                )],
+                valid=rng.random() > 0.05,
+                misc=dict(job_id=build_index),
+            ))
+            if full_chunk:
+                yield full_chunk
+            build_index += 1
+            for build_test_index in range(tests_per_build):
+                if test_index >= tests:
+                    break
+                full_chunk = add("tests", dict(
+                    build_origin=origin,
+                    build_origin_id=build_id,
+                    origin=origin,
+                    origin_id=f"t{test_index}",
+                    environment=dict(
+                        description=f"host{rng.randrange(100)}",
+                        misc=dict(memory=rng.choice((4096, 8192))),
+                    ),
+                    path=f"suite{build_test_index % 10}."
+                         f"case{build_test_index // 10}",
+                    status=rng.choices(statuses, status_weights)[0],
+                    waived=rng.random() < 0.01,
+                    start_time=(start_time +
+                                timedelta(seconds=3600 + build_test_index)
+                                ).isoformat(),
+                    duration=rng.uniform(0, 600),
+                    output_files=[dict(
+                        name="console.log",
+                        url=f"https://example.org/tests/t{test_index}/"
+                            f"console.log"
+                    )],
+                    misc=dict(beaker_recipe_id=test_index),
+                ))
+                if full_chunk:
+                    yield full_chunk
+                test_index += 1
+    if chunk_len:
+        yield chunk
+
+
+def main():
+    """Execute the generator command-line tool"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '-t', '--tests', type=int, default=1000,
+        help='Number of tests to generate (default: 1000)'
+    )
+    parser.add_argument(
+        '-s', '--seed', type=int, default=0,
+        help='Random number generator seed (default: 0)'
+    )
+    parser.add_argument(
+        '--tests-per-build', type=int, default=100,
+        help='Number of tests per build (default: 100)'
+    )
+    parser.add_argument(
+        '--builds-per-revision', type=int, default=10,
+        help='Number of builds per revision (default: 10)'
+    )
+    parser.add_argument(
+        '--chunk-size', type=int, default=10000,
+        help='Maximum number of objects per line (default: 10000)'
+    )
+    args = parser.parse_args()
+    for data in generate(args.tests, seed=args.seed,
+                         tests_per_build=args.tests_per_build,
+                         builds_per_revision=args.builds_per_revision,
+                         chunk_size=args.chunk_size):
+        json.dump(data, sys.stdout)
+        sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Measure the startup time of the kcidb command-line tools, and check that
+tools not accessing the database don't import the libraries needed only
+for that, e.g. that "kcidb schema" doesn't import the BigQuery library.
+Exit with status 1 if any check fails, or the startup takes longer than
+the budget.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+# Default maximum median time to run "kcidb schema", seconds
+BUDGET = 0.25
+
+# A map of kcidb command lines and the modules they must not import
+FORBIDDEN_IMPORT_MAP = {
+    ("schema",): ("google.cloud.bigquery", "jsonschema"),
+    ("schema", "--help"): ("google.cloud.bigquery", "jsonschema"),
+    ("query", "--help"): ("google.cloud.bigquery", "jsonschema"),
+    ("submit", "--help"): ("google.cloud.bigquery", "jsonschema"),
+}
+
+
+def run_kcidb(args):
+    """
+    Run the kcidb tool with the specified arguments, importing modules
+    with "-X importtime".
+
+    Args:
+        args:   A sequence of arguments to pass to the tool.
+
+    Returns:
+        The set of names of the modules the tool imported.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "kcidb", *args],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        check=True, text=True
+    )
+    return {
+        line.rsplit("|", 1)[-1].strip()
+        for line in result.stderr.splitlines()
+        if line.startswith("import time:")
+    }
+
+
+def main():
+    """Run the benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '-n', '--number', type=int, default=10,
+        help='Number of times to run "kcidb schema" (default: 10)'
+    )
+    parser.add_argument(
+        '--budget', type=float, default=BUDGET,
+        help=f'Maximum median time to run "kcidb schema", seconds '
+             f'(default: {BUDGET})'
+    )
+    args = parser.parse_args()
+    ok = True
+    for command, forbidden_modules in FORBIDDEN_IMPORT_MAP.items():
+        modules = run_kcidb(command)
+        for module in forbidden_modules:
+            if module in modules:
+                print(f"FAIL: kcidb {' '.join(command)}: imports {module}",
+                      file=sys.stderr)
+                ok = False
+    times = []
+    for _ in range(args.number):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "kcidb", "schema"],
+                       stdout=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - start)
+    median = statistics.median(times)
+    over = median > args.budget
+    ok = ok and not over
+    print(f"{'FAIL' if over else 'OK'}: kcidb schema: "
+          f"median {median * 1000:.1f}ms, min {min(times) * 1000:.1f}ms, "
+          f"budget {args.budget * 1000:.1f}ms", file=sys.stderr)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Run the benchmark suite over synthetic I/O data generated at the specified
+scale, and output the results as JSON, optionally comparing them to the
+results of a previous run.
+
+The data is generated and processed chunk by chunk, so the memory use
+doesn't depend on the scale. The time spent on each chunk is accumulated
+per benchmark.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+import kcidb
+from kcidb import db_schema
+from kcidb import fake_bigquery
+from kcidb import io_schema
+from kcidb import misc
+from kcidb.backends import bigquery
+from kcidb.backends import bigquery_schema
+from convert import to_bigquery_row
+from generate import generate
+
+# Names and descriptions of the benchmarks
+BENCHMARKS = dict(
+    json_serialize="Serialize a chunk as compact JSON, "
+                   "as input to kcidb-submit",
+    json_parse="Parse a chunk from JSON, as kcidb-submit does",
+    json_dump_merged="Write a chunk as kcidb-query does",
+    validate_fast="Validate a chunk with io_schema.validate()",
+    validate_jsonschema="Validate a chunk with io_schema.validate() "
+                        "using jsonschema only",
+    convert_load="Convert a chunk for loading into BigQuery",
+    convert_query="Convert a chunk of rows retrieved from BigQuery",
+    submit_sqlite="Submit a chunk to an SQLite database with "
+                  "Client.submit()",
+    query_sqlite="Query all the data from the SQLite database with "
+                 "Client.query_iter()",
+    submit_fake_bigquery="Submit a chunk to a fake BigQuery client "
+                         "with Client.submit()",
+)
+
+
+class Timer:
+    """Accumulated time and number of objects per benchmark"""
+
+    def __init__(self, names):
+        """Initialize the timer for the specified benchmark names"""
+        self.names = set(names)
+        self.seconds = {name: 0.0 for name in names}
+        self.objects = {name: 0 for name in names}
+
+    def run(self, name, objects, function, *args):
+        """
+        Run a function, if its benchmark is enabled, and account the time
+        it took, and the number of objects it processed.
+
+        Returns:
+            The return value of the function, or None if not enabled.
+        """
+        if name not in self.names:
+            return None
+        start = time.perf_counter()
+        result = function(*args)
+        self.seconds[name] += time.perf_counter() - start
+        self.objects[name] += objects
+        return result
+
+    def results(self):
+        """Get the results as a JSON-compatible dictionary"""
+        return {
+            name: dict(
+                seconds=self.seconds[name],
+                objects=self.objects[name],
+                objects_per_second=(
+                    self.objects[name] / self.seconds[name]
+                    if self.seconds[name] else None
+                ),
+            )
+            for name in sorted(self.names)
+        }
+
+
+def count_objects(data):
+    """Count the objects in I/O data"""
+    return sum(len(data.get(name, [])) for name in db_schema.TABLE_MAP)
+
+
+def convert_load(data):
+    """Convert I/O data for loading into BigQuery"""
+    for name in db_schema.TABLE_MAP:
+        convert = bigquery_schema.LOAD_CONVERTER_MAP[name]
+        if convert is not None:
+            list(map(convert, data.get(name, [])))
+
+
+def convert_query(rows):
+    """Convert rows retrieved from BigQuery into I/O data"""
+    for name, row_list in rows.items():
+        convert = bigquery_schema.QUERY_CONVERTER_MAP[name]
+        for row in row_list:
+            convert(row.items())
+
+
+def consume_query(client):
+    """Retrieve all data with a client, returning the number of objects"""
+    return sum(count_objects(data) for data in client.query_iter())
+
+
+# It's a sequence of benchmarks
+# pylint: disable=too-many-locals
+def run(names, tests, seed, chunk_size):
+    """
+    Run the benchmarks.
+
+    Args:
+        names:      The names of the benchmarks to run.
+        tests:      The number of tests to generate.
+        seed:       The generator seed.
+        chunk_size: The maximum number of objects in a chunk.
+
+    Returns:
+        The JSON-compatible dictionary with the results, per benchmark.
+    """
+    timer = Timer(names)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        sqlite_client = kcidb.Client(
+            "sqlite:" + os.path.join(tmpdir, "bench.sqlite3"))
+        sqlite_client.init()
+        bq_client = fake_bigquery.Client()
+        # The fake BigQuery client can't run queries to update summaries
+        bq_kcidb_client = kcidb.Client(
+            bigquery.Backend("bench", bq_client=bq_client), summarize=False)
+        bq_kcidb_client.init()
+        for data in generate(tests, seed=seed, chunk_size=chunk_size):
+            objects = count_objects(data)
+            text = timer.run("json_serialize", objects, json.dumps, data) \
+                or json.dumps(data)
+            timer.run("json_parse", objects, json.loads, text)
+            with open(os.devnull, "w") as null:
+                timer.run("json_dump_merged", objects,
+                          misc.json_dump_merged, [data], null, 4, True)
+            timer.run("validate_fast", objects, io_schema.validate, data)
+            timer.run("validate_jsonschema", objects,
+                      io_schema.validate, data, False)
+            timer.run("convert_load", objects, convert_load, data)
+            if "convert_query" in names:
+                rows = {
+                    name: [to_bigquery_row(obj, fields)
+                           for obj in data.get(name, [])]
+                    for name, fields in db_schema.TABLE_MAP.items()
+                }
+                timer.run("convert_query", objects, convert_query, rows)
+            if "submit_sqlite" in names or "query_sqlite" in names:
+                timer.run("submit_sqlite", objects,
+                          sqlite_client.submit, data)
+                if "submit_sqlite" not in names:
+                    sqlite_client.submit(data)
+            timer.run("submit_fake_bigquery", objects,
+                      bq_kcidb_client.submit, data)
+            # Don't accumulate the rows in memory
+            for table_rows in bq_client.tables.values():
+                table_rows.clear()
+        if "query_sqlite" in names:
+            start = time.perf_counter()
+            timer.objects["query_sqlite"] = consume_query(sqlite_client)
+            timer.seconds["query_sqlite"] = time.perf_counter() - start
+    return timer.results()
+
+
+def compare(results, baseline, max_slowdown):
+    """
+    Compare benchmark results with the baseline, printing the ratios.
+
+    Args:
+        results:        The results output by this tool.
+        baseline:       The baseline results output by this tool before.
+        max_slowdown:   The maximum allowed ratio of per-object time to the
+                        baseline's.
+
+    Returns:
+        True if no benchmark was slower than allowed, False otherwise.
+    """
+    if results["parameters"] != baseline["parameters"]:
+        print("WARNING: comparing results with different parameters",
+              file=sys.stderr)
+    ok = True
+    for name, result in results["benchmarks"].items():
+        base = baseline["benchmarks"].get(name)
+        if not base or not base["objects_per_second"] or \
+                not result["objects_per_second"]:
+            continue
+        ratio = base["objects_per_second"] / result["objects_per_second"]
+        regressed = ratio > max_slowdown
+        ok = ok and not regressed
+        print(f"{'REGRESSION' if regressed else 'OK'}: {name}: "
+              f"x{ratio:.2f} time per object", file=sys.stderr)
+    return ok
+
+
+def main():
+    """Execute the benchmark suite command-line tool"""
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="Benchmarks:\n" + "\n".join(
+            f"  {name}: {description}"
+            for name, description in BENCHMARKS.items()
+        )
+    )
+    parser.add_argument(
+        '-t', '--tests', type=int, default=1000,
+        help='Number of tests to generate, e.g. from 1000 to 10000000 '
+             '(default: 1000)'
+    )
+    parser.add_argument(
+        '-s', '--seed', type=int, default=0,
+        help='Data generator seed (default: 0)'
+    )
+    parser.add_argument(
+        '--chunk-size', type=int, default=kcidb.SUBMIT_CHUNK_SIZE,
+        help=f'Maximum number of objects in a chunk '
+             f'(default: {kcidb.SUBMIT_CHUNK_SIZE})'
+    )
+    parser.add_argument(
+        '-b', '--benchmark', metavar='NAME', action='append',
+        choices=BENCHMARKS,
+        help='Run only this benchmark. Can be repeated. '
+             'Default is to run all.'
+    )
+    parser.add_argument(
+        '-o', '--output', metavar='FILE',
+        help='Write the results to FILE instead of standard output'
+    )
+    parser.add_argument(
+        '--baseline', metavar='FILE',
+        help='Compare the results to previous results in FILE, and exit '
+             'with status 1 if any benchmark regressed'
+    )
+    parser.add_argument(
+        '--max-slowdown', type=float, default=1.2,
+        help='Maximum allowed ratio of time per object to the baseline '
+             '(default: 1.2)'
+    )
+    args = parser.parse_args()
+    names = args.benchmark or list(BENCHMARKS)
+    results = dict(
+        time=datetime.now(timezone.utc).isoformat(),
+        python=platform.python_version(),
+        platform=platform.platform(),
+        parameters=dict(tests=args.tests, seed=args.seed,
+                        chunk_size=args.chunk_size),
+        benchmarks=run(names, args.tests, args.seed, args.chunk_size),
+    )
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=4, sort_keys=True)
+    else:
+        json.dump(results, sys.stdout, indent=4, sort_keys=True)
+        sys.stdout.write("\n")
+    if args.baseline:
+        with open(args.baseline, "r") as baseline_file:
+            baseline = json.load(baseline_file)
+        return 0 if compare(results, baseline, args.max_slowdown) else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Benchmark I/O data validation: the uncached jsonschema.validate() call
+previously used by kcidb.io_schema.validate(), the cached jsonschema
+validator, and the fast path, over the specified files.
+"""
+
+import argparse
+import json
+import sys
+import timeit
+import jsonschema
+from kcidb import io_schema
+
+
+def main():
+    """Run the benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        'files', metavar='FILE', nargs='+',
+        help='A file with I/O data to validate'
+    )
+    parser.add_argument(
+        '-n', '--number', type=int, default=5,
+        help='Number of times to validate each file (default: 5)'
+    )
+    args = parser.parse_args()
+    methods = dict(
+        uncached=lambda data:
+        jsonschema.validate(instance=data, schema=io_schema.JSON),
+        cached=lambda data: io_schema.validate(data, fast=False),
+        fast=io_schema.validate,
+    )
+    for path in args.files:
+        with open(path, "r") as json_file:
+            data = json.load(json_file)
+        times = {}
+        for name, method in methods.items():
+            times[name] = min(timeit.repeat(lambda: method(data),
+                                            number=1, repeat=args.number))
+        print(f"{path}: " + ", ".join(
+            f"{name} {time * 1000:.1f}ms "
+            f"(x{times['uncached'] / time:.1f})"
+            for name, time in times.items()
+        ))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,212 +1,476 @@
 """Kernel CI database management"""
 
-import argparse
-import decimal
-import json
-import sys
-from datetime import datetime
-from google.cloud import bigquery
-from google.api_core.exceptions import BadRequest
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from kcidb import backends
+from kcidb import columnar
 from kcidb import db_schema
 from kcidb import io_schema
+from kcidb import path_tree
+
+# Default maximum number of objects submitted at once by Client.submit_stream
+SUBMIT_CHUNK_SIZE = 10000
+
+# Default maximum number of objects returned in a page by Client.query_iter
+QUERY_PAGE_SIZE = 10000
+
+# Default maximum number of tables loaded concurrently by Client.submit
+LOAD_CONCURRENCY = len(db_schema.TABLE_MAP)
+
+
+class SubmitError(Exception):
+    """
+    The database rejected (a part of) the submitted data, so submitting the
+    same data again would fail again, as opposed to e.g. connection errors.
+    """
 
 
 class Client:
     """Kernel CI database client"""
 
-    def __init__(self, dataset_name):
+    def __init__(self, database, load_concurrency=LOAD_CONCURRENCY,
+                 dedup=False, summarize=True):
         """
         Initialize a Kernel CI database client.
 
         Args:
-            dataset_name:   The name of the Kernel CI dataset. The dataset
-                            should be located within the Google Cloud project
-                            specified in the credentials file pointed to by
-                            GOOGLE_APPLICATION_CREDENTIALS environment
-                            variable.
+            database:           The database to use: either a storage
+                                backend (kcidb.backends.Backend), or its
+                                specification string, as accepted by
+                                kcidb.backends.from_spec(). E.g. the name of
+                                the Kernel CI BigQuery dataset, which should
+                                be located within the Google Cloud project
+                                specified in the credentials file pointed to
+                                by GOOGLE_APPLICATION_CREDENTIALS environment
+                                variable.
+            load_concurrency:   The maximum number of tables to load data
+                                into concurrently, when submitting.
+            dedup:              True if submitted objects should replace
+                                the objects with the same origin and
+                                origin_id, both in the same submission, and
+                                in the database, making submissions
+                                idempotent. False if they should simply be
+                                added, which is faster.
+            summarize:          True if the summaries of the revisions and
+                                builds affected by each submission should
+                                be updated after it. False if not, e.g. for
+                                a bulk load followed by update_summaries().
         """
-        assert isinstance(dataset_name, str)
-        self.client = bigquery.Client()
-        self.dataset_ref = self.client.dataset(dataset_name)
+        assert isinstance(database, (str, backends.Backend))
+        assert isinstance(load_concurrency, int) and load_concurrency > 0
+        self.load_concurrency = load_concurrency
+        self.dedup = dedup
+        self.summarize = summarize
+        self.backend = backends.from_spec(database) \
+            if isinstance(database, str) else database
 
     def init(self):
         """
         Initialize the database. The database must be empty.
         """
-        for table_name, table_schema in db_schema.TABLE_MAP.items():
-            table_ref = self.dataset_ref.table(table_name)
-            table = bigquery.table.Table(table_ref, schema=table_schema)
-            self.client.create_table(table)
+        self.backend.init()
 
     def cleanup(self):
         """
         Cleanup (empty) the database, removing all data.
         """
-        for table_name, _ in db_schema.TABLE_MAP.items():
-            table_ref = self.dataset_ref.table(table_name)
-            self.client.delete_table(table_ref)
+        self.backend.cleanup()
+
+    # We're using Client.query_iter's arguments as the filters
+    # pylint: disable=too-many-arguments
+    def query_iter(self, origin=None, revision_ids=None,
+                   discovered_after=None, discovered_before=None,
+                   path_prefix=None, ingested_after=None,
+                   ingested_before=None, page_size=QUERY_PAGE_SIZE,
+                   obj_list_names=None):
+        """
+        Query data from the database, page by page, optionally filtering
+        it on the database side. Each page is retrieved only when the
+        previous one was consumed.
+
+        Args:
+            origin:             The name of the CI system to limit the
+                                returned objects to, or None to return
+                                objects from any CI system.
+            revision_ids:       A list of origin IDs of the revisions to
+                                limit the returned revisions to, or None to
+                                not filter revisions by ID.
+            discovered_after:   A timezone-aware datetime object specifying
+                                the earliest discovery time (inclusive) of
+                                the returned revisions, or None for no limit.
+            discovered_before:  A timezone-aware datetime object specifying
+                                the latest discovery time (exclusive) of the
+                                returned revisions, or None for no limit.
+            path_prefix:        A dot-separated test path to limit the
+                                returned tests to. Only the tests having
+                                that path, or a path of a node below it
+                                would be returned. None or empty string to
+                                return tests with any path.
+            ingested_after:     A timezone-aware datetime object specifying
+                                the earliest time (inclusive) the returned
+                                objects were received by the database,
+                                or None for no limit.
+            ingested_before:    A timezone-aware datetime object specifying
+                                the latest time (exclusive) the returned
+                                objects were received by the database,
+                                or None for no limit.
+            page_size:          The maximum number of objects to return in
+                                each page.
+            obj_list_names:     A list of names of the object lists to
+                                return ("revisions", "builds", or "tests"),
+                                or None to return all of them.
+
+            If revision_ids, discovered_after, or discovered_before is
+            specified, only the builds of the returned revisions, and only
+            the tests of those builds are returned.
+
+        Returns:
+            A generator returning JSON data adhering to the I/O schema
+            (kcidb.io_schema.JSON), each containing a page of objects of
+            one type. All pages with revisions are returned first, then
+            pages with builds, and then pages with tests.
+        """
+        assert origin is None or isinstance(origin, str)
+        assert revision_ids is None or \
+            all(isinstance(id, str) for id in revision_ids)
+        assert discovered_after is None or \
+            isinstance(discovered_after, datetime)
+        assert discovered_before is None or \
+            isinstance(discovered_before, datetime)
+        assert path_prefix is None or isinstance(path_prefix, str)
+        assert ingested_after is None or \
+            isinstance(ingested_after, datetime)
+        assert ingested_before is None or \
+            isinstance(ingested_before, datetime)
+        assert isinstance(page_size, int) and page_size > 0
+        assert obj_list_names is None or \
+            set(obj_list_names) <= set(db_schema.TABLE_MAP)
+
+        for obj_list_name in db_schema.TABLE_MAP:
+            if obj_list_names is not None and \
+                    obj_list_name not in obj_list_names:
+                continue
+            for obj_list in self.backend.query(
+                    obj_list_name, page_size, origin=origin,
+                    revision_ids=revision_ids,
+                    discovered_after=discovered_after,
+                    discovered_before=discovered_before,
+                    path_prefix=path_prefix,
+                    ingested_after=ingested_after,
+                    ingested_before=ingested_before):
+                data = {"version": "1", obj_list_name: obj_list}
+                io_schema.validate(data)
+                yield data
+
+    def query_since(self, watermark=None, **kwargs):
+        """
+        Query data received by the database since a watermark, page by
+        page, for incremental retrieval. Objects received too recently to
+        be reliably visible to queries are left for the next call.
+
+        Args:
+            watermark:  A timezone-aware datetime object returned by the
+                        previous call, or None to query all the data
+                        received so far.
+            kwargs:     Other filters to apply to the returned data, and
+                        the page size. See Client.query_iter() for their
+                        description.
+
+        Returns:
+            The watermark to pass to the next call, and a generator
+            returning pages of data, as Client.query_iter() does.
+        """
+        assert watermark is None or isinstance(watermark, datetime)
+        assert "ingested_after" not in kwargs
+        assert "ingested_before" not in kwargs
+        until = datetime.now(timezone.utc) - self.backend.ingestion_delay
+        # Don't go back in time if the clock or the delay changed
+        if watermark is not None and until < watermark:
+            until = watermark
+        return until, self.query_iter(ingested_after=watermark,
+                                      ingested_before=until, **kwargs)
+
+    def query_columnar(self, **kwargs):
+        """
+        Query data from the database into a compact, columnar in-memory
+        representation, page by page, e.g. for analyzing large amounts of
+        data, or exporting it to Apache Arrow or Parquet.
+
+        Args:
+            kwargs: Filters to apply to the returned data, and the page size.
+                    See Client.query_iter() for their description.
+
+        Returns:
+            The columnar data (kcidb.columnar.Data).
+        """
+        data = columnar.Data()
+        for page in self.query_iter(**kwargs):
+            data.extend(page)
+        return data
+
+    def export_tables(self, directory, file_format="parquet", **kwargs):
+        """
+        Export data from the database into files, one per table, named after
+        the table, with the extension of the format, page by page. Requires
+        pyarrow.
+
+        Args:
+            directory:      The path to the directory to write the files to.
+                            Created, if it doesn't exist.
+            file_format:    The format of the files, one of
+                            kcidb.columnar.FILE_FORMAT_EXTENSIONS: "parquet",
+                            or "arrow" (for Arrow IPC stream), with the
+                            schema returned by kcidb.columnar.arrow_schema().
+            kwargs:         Filters to apply to the exported data, and the
+                            page size. See Client.query_iter() for their
+                            description.
+        """
+        assert file_format in columnar.FILE_FORMAT_EXTENSIONS
+        extension = columnar.FILE_FORMAT_EXTENSIONS[file_format]
+        os.makedirs(directory, exist_ok=True)
+        for obj_list_name in db_schema.TABLE_MAP:
+            path = os.path.join(directory, obj_list_name + extension)
+            with columnar.open_writer(path, obj_list_name,
+                                      file_format) as writer:
+                for page in self.query_iter(obj_list_names=[obj_list_name],
+                                            **kwargs):
+                    table = columnar.Table(obj_list_name)
+                    table.extend(page[obj_list_name])
+                    writer.write_table(table.to_arrow())
+
+    def import_tables(self, directory, file_format="parquet",
+                      chunk_size=SUBMIT_CHUNK_SIZE):
+        """
+        Import data into the database from files written by
+        Client.export_tables(), chunk by chunk. Missing files are skipped.
+        Requires pyarrow.
+
+        Args:
+            directory:      The path to the directory to read the files from.
+            file_format:    The format of the files, one of
+                            kcidb.columnar.FILE_FORMAT_EXTENSIONS.
+            chunk_size:     The maximum number of objects to submit at once.
+        """
+        assert file_format in columnar.FILE_FORMAT_EXTENSIONS
+        assert isinstance(chunk_size, int) and chunk_size > 0
+        extension = columnar.FILE_FORMAT_EXTENSIONS[file_format]
+
+        def read():
+            for obj_list_name in db_schema.TABLE_MAP:
+                path = os.path.join(directory, obj_list_name + extension)
+                if not os.path.exists(path):
+                    continue
+                for batch in columnar.iter_batches(path, file_format,
+                                                   chunk_size):
+                    yield {
+                        "version": "1",
+                        obj_list_name: list(columnar.iter_arrow_objects(
+                            obj_list_name, batch))
+                    }
+
+        self.submit_stream(read(), chunk_size=chunk_size)
+
+    def query_path_trees(self, **kwargs):
+        """
+        Query test runs from the database, and build a test path tree
+        (kcidb.path_tree.PathTree) for each build, without keeping the test
+        runs in memory. The trees summarize test runs by path prefix,
+        e.g. for answering how a test suite did on a build.
+
+        Args:
+            kwargs: Filters to apply to the test runs, and the page size.
+                    See Client.query_iter() for their description.
 
-    def query(self):
+        Returns:
+            A dictionary of (build_origin, build_origin_id) tuples and the
+            root nodes of the path trees of the builds' test runs.
+        """
+        return path_tree.from_tests_by_build(
+            test
+            for page in self.query_iter(obj_list_names=["tests"], **kwargs)
+            for test in page["tests"]
+        )
+
+    def query(self, **kwargs):
         """
         Query data from the database.
 
+        Args:
+            kwargs: Filters to apply to the returned data.
+                    See Client.query_iter() for their description.
+
         Returns:
             The JSON data from the database adhering to the I/O schema
             (kcidb.io_schema.JSON).
         """
-        def convert_node(node):
+        data = dict(version="1")
+        for obj_list_name in db_schema.TABLE_MAP:
+            data[obj_list_name] = []
+        for page in self.query_iter(**kwargs):
+            for obj_list_name in db_schema.TABLE_MAP:
+                data[obj_list_name].extend(page.get(obj_list_name, []))
+        return data
+
+    def submit(self, data, validate=True):
+        """
+        Submit data to the database.
+
+        Args:
+            data:       The JSON data to submit to the database.
+                        Must adhere to the I/O schema (kcidb.io_schema.JSON).
+            validate:   True if the data should be validated before
+                        submission, False if it was already validated.
+
+        Raises:
+            `jsonschema.exceptions.ValidationError` if the data is invalid.
+            `SubmitError` if the database rejected some of the data, or
+                failed to update the summaries.
+        """
+        def load(obj_list_name):
             """
-            Convert a retrieved data node (and all its children) to
-            the JSON-compatible and schema-complying representation.
+            Load an object list into its table.
 
             Args:
-                node:   The node to convert.
+                obj_list_name:  The name of the object list to load.
 
             Returns:
-                The converted node.
+                A list of error message lines, empty if loaded successfully.
             """
-            if isinstance(node, decimal.Decimal):
-                node = float(node)
-            elif isinstance(node, datetime):
-                node = node.isoformat()
-            elif isinstance(node, list):
-                for index, value in enumerate(node):
-                    node[index] = convert_node(value)
-            elif isinstance(node, dict):
-                for key, value in list(node.items()):
-                    if value is None:
-                        del node[key]
-                    elif key == "misc":
-                        node[key] = json.loads(value)
-                    else:
-                        node[key] = convert_node(value)
-            return node
+            obj_list = data[obj_list_name]
+            if self.dedup:
+                # Keep the last of objects with the same ID
+                obj_list = list({
+                    (obj["origin"], obj["origin_id"]): obj
+                    for obj in obj_list
+                }.values())
+            return [
+                f"ERROR: {obj_list_name}: {message}\n"
+                for message in self.backend.load(obj_list_name, obj_list,
+                                                 dedup=self.dedup)
+            ]
 
-        data = dict(version="1")
-        for obj_list_name in db_schema.TABLE_MAP:
-            job_config = bigquery.job.QueryJobConfig(
-                default_dataset=self.dataset_ref)
-            query_job = self.client.query(
-                f"SELECT * FROM `{obj_list_name}`", job_config=job_config)
-            data[obj_list_name] = [
-                convert_node(dict(row.items())) for row in query_job
+        if validate:
+            io_schema.validate(data)
+        # Load the tables concurrently, waiting for all of them to finish
+        with ThreadPoolExecutor(max_workers=self.load_concurrency) as \
+                executor:
+            futures = [
+                executor.submit(load, obj_list_name)
+                for obj_list_name in db_schema.TABLE_MAP
+                if obj_list_name in data
             ]
+        errors = []
+        for future in futures:
+            errors.extend(future.result())
+        # Update summaries even if some tables failed to load,
+        # recomputing them, if so, or if objects could've been replaced
+        if self.summarize:
+            errors.extend(
+                f"ERROR: summaries: {message}\n"
+                for message in self.backend.summarize(
+                    data, added=not self.dedup and not errors)
+            )
+        if errors:
+            raise SubmitError("".join(errors))
 
-        io_schema.validate(data)
+    def update_summaries(self):
+        """
+        Recompute all revision and build summaries from scratch, e.g. after
+        loading data into the database bypassing the client.
+        """
+        errors = self.backend.update_summaries()
+        if errors:
+            raise Exception("".join(
+                f"ERROR: summaries: {message}\n" for message in errors
+            ))
 
-        return data
+    def query_summaries(self, origin=None, revision_ids=None):
+        """
+        Query revision and build summaries from the database: the numbers
+        of builds and test runs, test runs with each status, the summary
+        test status, and the total durations, maintained on submission.
+
+        Args:
+            origin:         The name of the CI system to limit the summarized
+                            revisions and builds to, or None to return
+                            summaries from any CI system.
+            revision_ids:   A list of origin IDs of the revisions to limit
+                            the returned revision summaries, and the build
+                            summaries of their builds to, or None to not
+                            filter by revision ID.
 
-    def submit(self, data):
+        Returns:
+            A dictionary of summary table names ("revision_summaries" and
+            "build_summaries") and lists of summaries: dictionaries with
+            fields described by kcidb.db_schema.SUMMARY_TABLE_MAP.
         """
-        Submit data to the database.
+        assert origin is None or isinstance(origin, str)
+        assert revision_ids is None or \
+            all(isinstance(id, str) for id in revision_ids)
+        return {
+            table_name: self.backend.query_summaries(
+                table_name, origin=origin, revision_ids=revision_ids)
+            for table_name in db_schema.SUMMARY_TABLE_MAP
+        }
+
+    def submit_valid(self, data, jobs=1):
+        """
+        Validate data object by object, and submit only the valid objects
+        to the database, instead of rejecting all of the data if any of
+        the objects are invalid.
 
         Args:
             data:   The JSON data to submit to the database.
-                    Must adhere to the I/O schema (kcidb.io_schema.JSON).
+                    Must adhere to the I/O schema (kcidb.io_schema.JSON),
+                    except for the revision, build, and test objects.
+            jobs:   The number of processes to validate the objects in,
+                    in parallel, or 1 to validate them in this process.
+
+        Returns:
+            The JSON data with only the invalid (not submitted) objects
+            left, and a list of errors found in them, each a tuple of the
+            error's JSON path and its message.
+
+        Raises:
+            `jsonschema.exceptions.ValidationError` if the data is invalid
+                outside the objects, e.g. if its version is unsupported.
         """
-        def convert_node(node):
-            """
-            Convert a submitted data node (and all its children) to
-            the BigQuery storage-compatible representation.
+        valid_data, invalid_data, errors = \
+            io_schema.validate_objects(data, jobs=jobs)
+        self.submit(valid_data, validate=False)
+        return invalid_data, errors
 
-            Args:
-                node:   The node to convert.
+    def submit_stream(self, data_stream, chunk_size=SUBMIT_CHUNK_SIZE):
+        """
+        Submit a stream of data to the database, in chunks of limited size,
+        so that the amount of memory used doesn't depend on the total amount
+        of data submitted.
 
-            Returns:
-                The converted node.
-            """
-            if isinstance(node, list):
-                for index, value in enumerate(node):
-                    node[index] = convert_node(value)
-            elif isinstance(node, dict):
-                for key, value in list(node.items()):
-                    # Flatten the "misc" fields
-                    if key == "misc":
-                        node[key] = json.dumps(value)
-                    else:
-                        node[key] = convert_node(value)
-            return node
-
-        io_schema.validate(data)
-        for obj_list_name in db_schema.TABLE_MAP:
-            if obj_list_name in data:
-                obj_list = convert_node(data[obj_list_name])
-                job_config = bigquery.job.LoadJobConfig(
-                    autodetect=False,
-                    schema=db_schema.TABLE_MAP[obj_list_name])
-                job = self.client.load_table_from_json(
-                    obj_list,
-                    self.dataset_ref.table(obj_list_name),
-                    job_config=job_config)
-                try:
-                    job.result()
-                except BadRequest:
-                    raise Exception("".join([
-                        f"ERROR: {error['message']}\n" for error in job.errors
-                    ]))
-
-
-def query_main():
-    """Execute the kcidb-query command-line tool"""
-    description = 'kcidb-query - Query test results from kernelci.org database'
-    parser = argparse.ArgumentParser(description=description)
-    parser.add_argument(
-        '-d', '--dataset',
-        help='Dataset name',
-        required=True
-    )
-    args = parser.parse_args()
-    client = Client(args.dataset)
-    json.dump(client.query(), sys.stdout, indent=4, sort_keys=True)
-
-
-def submit_main():
-    """Execute the kcidb-submit command-line tool"""
-    description = 'kcidb-submit - Submit test results to kernelci.org database'
-    parser = argparse.ArgumentParser(description=description)
-    parser.add_argument(
-        '-d', '--dataset',
-        help='Dataset name',
-        required=True
-    )
-    args = parser.parse_args()
-    data = json.load(sys.stdin)
-    io_schema.validate(data)
-    client = Client(args.dataset)
-    client.submit(data)
-
-
-def init_main():
-    """Execute the kcidb-init command-line tool"""
-    description = 'kcidb-init - Initialize a kernelci.org database'
-    parser = argparse.ArgumentParser(description=description)
-    parser.add_argument(
-        '-d', '--dataset',
-        help='Dataset name',
-        required=True
-    )
-    args = parser.parse_args()
-    client = Client(args.dataset)
-    client.init()
-
-
-def cleanup_main():
-    """Execute the kcidb-cleanup command-line tool"""
-    description = 'kcidb-cleanup - Cleanup a kernelci.org database'
-    parser = argparse.ArgumentParser(description=description)
-    parser.add_argument(
-        '-d', '--dataset',
-        help='Dataset name',
-        required=True
-    )
-    args = parser.parse_args()
-    client = Client(args.dataset)
-    client.cleanup()
-
-
-def schema_main():
-    """Execute the kcidb-schema command-line tool"""
-    description = 'kcidb-schema - Output I/O JSON schema'
-    parser = argparse.ArgumentParser(description=description)
-    parser.parse_args()
-    json.dump(io_schema.JSON, sys.stdout, indent=4, sort_keys=True)
+        Args:
+            data_stream:    An iterable returning JSON data to submit to the
+                            database. Each must adhere to the I/O schema
+                            (kcidb.io_schema.JSON), and is validated as soon
+                            as it is retrieved. Objects from all of them are
+                            merged and re-split into chunks before
+                            submission.
+            chunk_size:     The maximum number of objects (revisions, builds
+                            and tests together) to submit at once.
+        """
+        assert isinstance(chunk_size, int) and chunk_size > 0
+        chunk = None
+        chunk_len = 0
+        for data in data_stream:
+            io_schema.validate(data)
+            for obj_list_name in db_schema.TABLE_MAP:
+                for obj in data.get(obj_list_name, []):
+                    if chunk is None:
+                        chunk = dict(version=data["version"])
+                    chunk.setdefault(obj_list_name, []).append(obj)
+                    chunk_len += 1
+                    if chunk_len >= chunk_size:
+                        self.submit(chunk, validate=False)
+                        chunk = None
+                        chunk_len = 0
+        if chunk is not None:
+            self.submit(chunk, validate=False)
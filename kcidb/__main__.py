@@ -0,0 +1,5 @@
+"""Execute the kcidb command-line tool with "python3 -m kcidb" """
+import sys
+from kcidb.cli import main
+
+sys.exit(main())
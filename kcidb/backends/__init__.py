@@ -0,0 +1,31 @@
+"""Kernel CI database storage backends"""
+
+from kcidb.backends.base import Backend
+
+__all__ = ["Backend", "from_spec"]
+
+
+def from_spec(spec, stream=False):
+    """
+    Create a backend from a specification string.
+
+    Args:
+        spec:   The backend specification: "sqlite:<FILE>" for a local
+                SQLite database stored in <FILE> (or ":memory:"), or a name
+                of a BigQuery dataset.
+        stream: True if the backend should make loaded objects visible to
+                queries as soon as possible, e.g. with BigQuery streaming
+                inserts, at the cost of weaker deduplication guarantees.
+                False to use bulk loading. SQLite always loads immediately.
+
+    Returns:
+        The created backend.
+    """
+    assert isinstance(spec, str)
+    # Import backends lazily, only pulling in the libraries we need
+    # pylint: disable=import-outside-toplevel
+    if spec.startswith("sqlite:"):
+        from kcidb.backends import sqlite
+        return sqlite.Backend(spec[len("sqlite:"):])
+    from kcidb.backends import bigquery
+    return bigquery.Backend(spec, stream=stream)
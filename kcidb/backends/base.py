@@ -0,0 +1,136 @@
+"""Kernel CI database abstract storage backend"""
+
+from datetime import timedelta
+
+
+class Backend:
+    """
+    An abstract storage backend, storing I/O data objects in tables
+    described by kcidb.db_schema.TABLE_MAP, one table per object list.
+    """
+
+    # The maximum time it takes for a loaded object to become visible to
+    # queries, after its ingestion time. Queries for objects ingested
+    # more recently than that could miss some of them.
+    ingestion_delay = timedelta(0)
+
+    def init(self):
+        """
+        Initialize the database. The database must be empty.
+        """
+        raise NotImplementedError
+
+    def cleanup(self):
+        """
+        Cleanup (empty) the database, removing all data.
+        """
+        raise NotImplementedError
+
+    def load(self, obj_list_name, obj_list, dedup=False):
+        """
+        Load a list of objects into their table.
+
+        Args:
+            obj_list_name:  The name of the object list (and the table) to
+                            load the objects into.
+            obj_list:       The list of objects to load. Must adhere to the
+                            schema of the list in kcidb.io_schema.JSON.
+            dedup:          True if the loaded objects should replace the
+                            stored objects with the same origin and
+                            origin_id, False if they should be simply added.
+                            With True, the list must not contain multiple
+                            objects with the same origin and origin_id.
+
+        Returns:
+            A list of error messages, empty if loaded successfully.
+            The objects are stored with the time of loading as their
+            ingestion time (db_schema.INGESTION_TIME_FIELD_NAME).
+        """
+        raise NotImplementedError
+
+    def query(self, obj_list_name, page_size, **filters):
+        """
+        Query objects of one type from the database, page by page.
+
+        Args:
+            obj_list_name:  The name of the object list (and the table) to
+                            query the objects from.
+            page_size:      The maximum number of objects in a page.
+            filters:        The filters to apply to the objects, as
+                            accepted by kcidb.Client.query_iter().
+
+        Returns:
+            A generator returning pages: lists of objects, adhering to the
+            schema of the list in kcidb.io_schema.JSON.
+        """
+        raise NotImplementedError
+
+    def update_summaries(self, revision_keys=None, build_keys=None):
+        """
+        Recompute the summaries of the specified revisions and builds
+        (see kcidb.db_schema.SUMMARY_TABLE_MAP), as well as of the
+        revisions of the specified builds.
+
+        Args:
+            revision_keys:  A list of (origin, origin_id) tuples of the
+                            revisions to summarize, or None for all.
+            build_keys:     A list of (origin, origin_id) tuples of the
+                            builds to summarize, or None for all.
+
+        Returns:
+            A list of error messages, empty if updated successfully.
+        """
+        raise NotImplementedError
+
+    def summarize(self, data, added=False):
+        """
+        Update the summaries of the revisions and builds affected by
+        loading data: the revisions and builds in the data, the builds of
+        the tests in it, and the revisions of those builds.
+
+        Args:
+            data:   The loaded I/O data, adhering to kcidb.io_schema.JSON.
+            added:  True if all the data was loaded successfully, and only
+                    added to the database, without replacing any objects,
+                    so the summaries could be updated from the data alone.
+                    False if the summaries of the affected revisions and
+                    builds should be recomputed from the database.
+
+        Returns:
+            A list of error messages, empty if updated successfully.
+        """
+        del added
+        revision_keys = {
+            (revision["origin"], revision["origin_id"])
+            for revision in data.get("revisions", [])
+        }
+        build_keys = {
+            (build["origin"], build["origin_id"])
+            for build in data.get("builds", [])
+        } | {
+            (test["build_origin"], test["build_origin_id"])
+            for test in data.get("tests", [])
+        }
+        if not revision_keys and not build_keys:
+            return []
+        return self.update_summaries(sorted(revision_keys),
+                                     sorted(build_keys))
+
+    def query_summaries(self, table_name, origin=None, revision_ids=None):
+        """
+        Query summaries of revisions or builds from the database.
+
+        Args:
+            table_name:     The name of the summary table to query:
+                            "revision_summaries" or "build_summaries".
+            origin:         The name of the CI system to limit the
+                            summarized revisions and builds to, or None.
+            revision_ids:   A list of origin IDs of the revisions to limit
+                            the summaries to (of the revisions themselves,
+                            or of their builds), or None.
+
+        Returns:
+            A list of summaries: dictionaries of the table's fields and
+            values, omitting the ones without values.
+        """
+        raise NotImplementedError
@@ -0,0 +1,813 @@
+"""Kernel CI database BigQuery storage backend"""
+
+import json
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from importlib.util import find_spec
+from google.cloud import bigquery
+from google.api_core.exceptions import BadRequest
+from kcidb import db_schema
+from kcidb.backends import base
+from kcidb.backends import summaries
+from kcidb.backends.bigquery_schema import \
+    SCHEMA_MAP, QUERY_CONVERTER_MAP, SUMMARY_CONVERTER_MAP, \
+    get_parquet_file, get_json_rows
+
+# Lifetime of staging tables, in case they're not removed after loading
+STAGING_LIFETIME = timedelta(hours=1)
+
+# The time partitioning of all tables: by day of ingestion, which is
+# always known, only grows, and is the basis for incremental queries
+PARTITIONING = bigquery.TimePartitioning(
+    type_=bigquery.TimePartitioningType.DAY,
+    field=db_schema.INGESTION_TIME_FIELD_NAME,
+)
+
+# A map of table names to tuples of fields to cluster them by, at most four,
+# from the most commonly filtered on
+CLUSTERING_MAP = dict(
+    revisions=("origin", "origin_id"),
+    builds=("origin", "revision_origin", "revision_origin_id", "origin_id"),
+    tests=("origin", "path", "build_origin", "build_origin_id"),
+)
+
+# How much earlier than their discovery time objects could be ingested,
+# due to clocks of CI systems running ahead. Used to limit the ingestion
+# time partitions scanned, when querying revisions discovered after a time.
+# There is no matching limit for revisions discovered before a time, as
+# objects can be ingested any time after the discovery of their revisions:
+# e.g. tests of old revisions, or revisions submitted late.
+PRUNING_SLACK = timedelta(days=1)
+
+# The default load source format: the columnar PARQUET, if the optional
+# pyarrow package is available, or NEWLINE_DELIMITED_JSON otherwise
+LOAD_FORMAT = bigquery.SourceFormat.PARQUET if find_spec("pyarrow") \
+    else bigquery.SourceFormat.NEWLINE_DELIMITED_JSON
+
+# Maximum number of rows, and of bytes of JSON in a single streaming insert
+# request, within the recommended limits
+STREAM_BATCH_ROWS = 500
+STREAM_BATCH_BYTES = 5 * 1024 * 1024
+
+# The ingestion delay with streaming inserts, which make rows visible to
+# queries within seconds
+STREAM_INGESTION_DELAY = timedelta(minutes=1)
+
+# Maximum number of build summaries of loaded data added to the stored
+# summaries with one statement, keeping its parameters within size limits
+SUMMARY_BATCH_SIZE = 1000
+
+# Output columns of queries: everything except the ingestion time
+_QUERY_COLUMNS = f"* EXCEPT({db_schema.INGESTION_TIME_FIELD_NAME})"
+
+# A map of names of the time filters accepted by kcidb.Client.query_iter()
+# to tuples of: the table the filter applies to ("revisions" for the
+# revisions the objects are linked to, or None for the objects themselves),
+# the filtered column, the comparison operator, and True if the ingestion
+# time of all the linked objects can be limited the same way, to prune
+# partitions (see PRUNING_SLACK), False otherwise. Only lower limits of the
+# discovery time limit the ingestion time.
+_TIME_FILTER_MAP = dict(
+    discovered_after=("revisions", "discovery_time", ">=", True),
+    discovered_before=("revisions", "discovery_time", "<", False),
+    ingested_after=(None, db_schema.INGESTION_TIME_FIELD_NAME, ">=", False),
+    ingested_before=(None, db_schema.INGESTION_TIME_FIELD_NAME, "<", False),
+)
+
+
+def _where(conds):
+    """Generate an SQL WHERE clause matching all conditions, if any"""
+    return (" WHERE " + " AND ".join(conds)) if conds else ""
+
+
+def _batch_rows(rows, max_rows, max_bytes):
+    """
+    Split JSON rows into batches limited by the number of rows, and the
+    size of their JSON. A row exceeding the size limit gets its own batch.
+
+    Args:
+        rows:       The list of rows to split.
+        max_rows:   The maximum number of rows in a batch.
+        max_bytes:  The maximum size of the JSON of a batch's rows, bytes.
+
+    Returns:
+        A generator returning tuples of the index of the first row of a
+        batch, and the list of rows in the batch.
+    """
+    start = 0
+    batch_bytes = 0
+    for index, row in enumerate(rows):
+        row_bytes = len(json.dumps(row, separators=(",", ":")).encode())
+        if index > start and (index - start >= max_rows or
+                              batch_bytes + row_bytes > max_bytes):
+            yield start, rows[start:index]
+            start = index
+            batch_bytes = 0
+        batch_bytes += row_bytes
+    if start < len(rows):
+        yield start, rows[start:]
+
+
+# A dictionary of (process ID, Google Cloud project name) tuples and
+# BigQuery clients shared within the processes, and the lock protecting it
+_CLIENT_MAP = {}
+_CLIENT_MAP_LOCK = threading.Lock()
+
+
+def get_client(project=None):
+    """
+    Get a BigQuery client shared by the process, creating it on the first
+    call. Reusing the client reuses its credentials and HTTP connections,
+    avoiding the cost of authenticating and connecting again. The client is
+    not shared with forked processes, which get their own.
+
+    Args:
+        project:    The name of the Google Cloud project to use, or None
+                    for the one specified by the environment, e.g. in the
+                    credentials file pointed to by
+                    GOOGLE_APPLICATION_CREDENTIALS environment variable.
+
+    Returns:
+        The shared BigQuery client (bigquery.Client).
+    """
+    key = (os.getpid(), project)
+    with _CLIENT_MAP_LOCK:
+        client = _CLIENT_MAP.get(key)
+        if client is None:
+            client = bigquery.Client(project=project)
+            _CLIENT_MAP[key] = client
+        return client
+
+
+def get_struct_array_param(name, fields, rows):
+    """
+    Create a query parameter containing an array of structs.
+
+    Args:
+        name:   The name of the parameter.
+        fields: A sequence of the structs' fields (kcidb.db_schema.Field),
+                not records. Values of NUMERIC fields are rounded to the
+                type's scale.
+        rows:   An iterable of sequences of the structs' field values.
+
+    Returns:
+        The query parameter.
+    """
+    return bigquery.ArrayQueryParameter(
+        name,
+        bigquery.StructQueryParameterType(*(
+            bigquery.ScalarQueryParameterType(field.field_type,
+                                              name=field.name)
+            for field in fields
+        )),
+        [
+            bigquery.StructQueryParameter(None, *(
+                bigquery.ScalarQueryParameter(
+                    field.name, field.field_type,
+                    round(Decimal(repr(value)), 9)
+                    if field.field_type == "NUMERIC" and value is not None
+                    else value
+                )
+                for field, value in zip(fields, row)
+            ))
+            for row in rows
+        ]
+    )
+
+
+# The fields of query parameters containing (origin, origin_id) keys
+_KEY_FIELDS = (
+    db_schema.Field("origin", "STRING"),
+    db_schema.Field("origin_id", "STRING"),
+)
+
+
+class Backend(base.Backend):
+    """BigQuery storage backend"""
+
+    # Ingestion time is taken before starting a load job,
+    # which can take a while to queue up and complete
+    ingestion_delay = timedelta(minutes=10)
+
+    def __init__(self, dataset_name, bq_client=None, load_format=None,
+                 stream=False):
+        """
+        Initialize a BigQuery storage backend.
+
+        Args:
+            dataset_name:   The name of the Kernel CI dataset. The dataset
+                            should be located within the Google Cloud project
+                            specified in the credentials file pointed to by
+                            GOOGLE_APPLICATION_CREDENTIALS environment
+                            variable.
+            bq_client:      The BigQuery client to use, or None to use the
+                            one shared by the process (see get_client()).
+                            E.g. a kcidb.fake_bigquery.Client for testing.
+            load_format:    The source format of load jobs:
+                            bigquery.SourceFormat.PARQUET (requires
+                            pyarrow), or NEWLINE_DELIMITED_JSON, or None
+                            for LOAD_FORMAT.
+            stream:         True if objects should be loaded with streaming
+                            inserts, making them visible to queries within
+                            seconds, instead of load jobs, unless
+                            deduplication is requested. False to always
+                            use load jobs.
+        """
+        assert isinstance(dataset_name, str)
+        assert load_format in (None,
+                               bigquery.SourceFormat.PARQUET,
+                               bigquery.SourceFormat.NEWLINE_DELIMITED_JSON)
+        self.load_format = LOAD_FORMAT if load_format is None \
+            else load_format
+        self.stream = stream
+        if stream:
+            self.ingestion_delay = STREAM_INGESTION_DELAY
+        self.client = get_client() if bq_client is None else bq_client
+        self.dataset_ref = self.client.dataset(dataset_name)
+        # A dictionary of table names and references to the tables
+        self.table_ref_map = {
+            table_name: self.dataset_ref.table(table_name)
+            for table_name in (*db_schema.TABLE_MAP,
+                               *db_schema.SUMMARY_TABLE_MAP)
+        }
+        # A dictionary of object list names and configurations of jobs
+        # loading them into their tables. Copied by the client on use.
+        self.load_job_config_map = {}
+        for obj_list_name in db_schema.TABLE_MAP:
+            job_config = bigquery.job.LoadJobConfig(
+                autodetect=False,
+                schema=SCHEMA_MAP[obj_list_name],
+                source_format=self.load_format)
+            if self.load_format == bigquery.SourceFormat.PARQUET:
+                # Map Parquet lists to repeated fields
+                job_config.parquet_options = bigquery.ParquetOptions()
+                job_config.parquet_options.enable_list_inference = True
+            self.load_job_config_map[obj_list_name] = job_config
+        # The configuration of query jobs without parameters
+        self.query_job_config = bigquery.job.QueryJobConfig(
+            default_dataset=self.dataset_ref)
+
+    def _get_query_job_config(self, params):
+        """
+        Get a configuration for query jobs with parameters.
+
+        Args:
+            params: A list of query parameters, or an empty list.
+
+        Returns:
+            The query job configuration.
+        """
+        if not params:
+            return self.query_job_config
+        return bigquery.job.QueryJobConfig(
+            default_dataset=self.dataset_ref,
+            query_parameters=params)
+
+    def init(self):
+        """
+        Initialize the database. The database must be empty.
+        """
+        for table_name in db_schema.TABLE_MAP:
+            table_ref = self.table_ref_map[table_name]
+            table = bigquery.table.Table(table_ref,
+                                         schema=SCHEMA_MAP[table_name])
+            table.time_partitioning = PARTITIONING
+            table.clustering_fields = list(CLUSTERING_MAP[table_name])
+            self.client.create_table(table)
+        for table_name in db_schema.SUMMARY_TABLE_MAP:
+            table_ref = self.table_ref_map[table_name]
+            table = bigquery.table.Table(table_ref,
+                                         schema=SCHEMA_MAP[table_name])
+            table.clustering_fields = ["origin", "origin_id"]
+            self.client.create_table(table)
+
+    def cleanup(self):
+        """
+        Cleanup (empty) the database, removing all data.
+        """
+        for table_name in (*db_schema.TABLE_MAP,
+                           *db_schema.SUMMARY_TABLE_MAP):
+            self.client.delete_table(self.table_ref_map[table_name])
+
+    @staticmethod
+    def _merge_sql(obj_list_name, staging_table_name):
+        """
+        Generate an SQL statement merging objects from a staging table into
+        their table, replacing objects with the same origin and origin_id.
+
+        Args:
+            obj_list_name:      The name of the object list (and the table)
+                                to merge the objects into.
+            staging_table_name: The name of the staging table to merge the
+                                objects from. Must not contain multiple
+                                objects with the same origin and origin_id.
+
+        Returns:
+            The SQL statement string.
+        """
+        names = [field.name for field in db_schema.TABLE_MAP[obj_list_name]]
+        return f"MERGE `{obj_list_name}` AS target " \
+            f"USING `{staging_table_name}` AS source " \
+            "ON target.origin = source.origin AND " \
+            "target.origin_id = source.origin_id " \
+            "WHEN MATCHED THEN UPDATE SET " + \
+            ", ".join(f"{name} = source.{name}" for name in names) + " " \
+            "WHEN NOT MATCHED THEN INSERT ROW"
+
+    @staticmethod
+    def _filter_conds(obj_list_name, filters):
+        """
+        Generate SQL conditions implementing query filters, except the test
+        path prefix, along with their parameters.
+
+        Args:
+            obj_list_name:  The name of the object list (and the table)
+                            to generate the conditions for.
+            filters:        The filters to apply to the objects, as
+                            accepted by kcidb.Client.query_iter().
+
+        Returns:
+            A list of the conditions' parameters, and lists of conditions
+            on the linked revisions, on the builds of the linked
+            revisions, and on the objects themselves.
+        """
+        params = []
+        revision_conds = []
+        build_conds = []
+        conds = []
+        origin = filters.get("origin")
+        if origin is not None:
+            params.append(
+                bigquery.ScalarQueryParameter("origin", "STRING", origin))
+            revision_conds.append("origin = @origin")
+            if obj_list_name != "revisions":
+                conds.append(f"{obj_list_name}.origin = @origin")
+        if filters.get("revision_ids") is not None:
+            params.append(bigquery.ArrayQueryParameter(
+                "revision_ids", "STRING", list(filters["revision_ids"])))
+            revision_conds.append("origin_id IN UNNEST(@revision_ids)")
+        for name, (table_name, column, operator, pruning) in \
+                _TIME_FILTER_MAP.items():
+            if filters.get(name) is None:
+                continue
+            params.append(bigquery.ScalarQueryParameter(
+                name, "TIMESTAMP", filters[name]))
+            if table_name == "revisions":
+                revision_conds.append(f"{column} {operator} @{name}")
+            else:
+                conds.append(
+                    f"{obj_list_name}.{column} {operator} @{name}")
+            if pruning:
+                # Objects are ingested after the revisions were discovered,
+                # so limit the scanned partitions of all tables
+                params.append(bigquery.ScalarQueryParameter(
+                    f"pruned_{name}", "TIMESTAMP",
+                    filters[name] - PRUNING_SLACK))
+                pruning_cond = f"{db_schema.INGESTION_TIME_FIELD_NAME} " \
+                    f"{operator} @pruned_{name}"
+                revision_conds.append(pruning_cond)
+                build_conds.append("builds." + pruning_cond)
+                if obj_list_name != "revisions":
+                    conds.append(f"{obj_list_name}." + pruning_cond)
+        return params, revision_conds, build_conds, conds
+
+    @staticmethod
+    def _query_sql(obj_list_name, **filters):
+        """
+        Generate an SQL query retrieving objects of the specified type,
+        matching the specified filters, along with its parameters.
+
+        Args:
+            obj_list_name:  The name of the object list (and the table)
+                            to generate the query for.
+            filters:        The filters to apply to the objects, as
+                            accepted by kcidb.Client.query_iter().
+
+        Returns:
+            The SQL query string, and a list of its parameters.
+        """
+        assert set(filters) <= {"origin", "revision_ids", "path_prefix",
+                                *_TIME_FILTER_MAP}
+        params, revision_conds, build_conds, conds = \
+            Backend._filter_conds(obj_list_name, filters)
+        if obj_list_name == "revisions":
+            return f"SELECT {_QUERY_COLUMNS} FROM `revisions` AS revisions" + \
+                _where(revision_conds + conds), params
+        # Only restrict builds and tests to linked revisions
+        # if revisions are selected by something other than origin
+        linked = filters.get("revision_ids") is not None or any(
+            filters.get(name) is not None
+            for name, (table_name, *_) in _TIME_FILTER_MAP.items()
+            if table_name == "revisions"
+        )
+        revisions_sql = "SELECT DISTINCT origin, origin_id " \
+            "FROM `revisions`" + _where(revision_conds)
+        if obj_list_name == "builds":
+            sql = f"SELECT builds.{_QUERY_COLUMNS} FROM `builds` AS builds"
+            if linked:
+                sql += f" INNER JOIN ({revisions_sql}) AS revisions " \
+                    "ON builds.revision_origin = revisions.origin AND " \
+                    "builds.revision_origin_id = revisions.origin_id"
+            return sql + _where(conds), params
+        sql = f"SELECT tests.{_QUERY_COLUMNS} FROM `tests` AS tests"
+        if linked:
+            sql += " INNER JOIN (" \
+                "SELECT DISTINCT builds.origin, builds.origin_id " \
+                "FROM `builds` AS builds " \
+                f"INNER JOIN ({revisions_sql}) AS revisions " \
+                "ON builds.revision_origin = revisions.origin AND " \
+                "builds.revision_origin_id = revisions.origin_id" + \
+                _where(build_conds) + \
+                ") AS linked_builds " \
+                "ON tests.build_origin = linked_builds.origin AND " \
+                "tests.build_origin_id = linked_builds.origin_id"
+        path_prefix = filters.get("path_prefix")
+        if path_prefix:
+            # Match paths starting with the prefix and a dot using a
+            # range, as "/" follows "." in ASCII, to prune clusters
+            params.extend((
+                bigquery.ScalarQueryParameter(
+                    "path_prefix", "STRING", path_prefix),
+                bigquery.ScalarQueryParameter(
+                    "path_prefix_start", "STRING", path_prefix + "."),
+                bigquery.ScalarQueryParameter(
+                    "path_prefix_end", "STRING", path_prefix + "/"),
+            ))
+            conds.append(
+                "(tests.path = @path_prefix OR "
+                "(tests.path >= @path_prefix_start AND "
+                "tests.path < @path_prefix_end))")
+        return sql + _where(conds), params
+
+    def query(self, obj_list_name, page_size, **filters):
+        """
+        Query objects of one type from the database, page by page.
+
+        Args:
+            obj_list_name:  The name of the object list (and the table) to
+                            query the objects from.
+            page_size:      The maximum number of objects in a page.
+            filters:        The filters to apply to the objects, as
+                            accepted by kcidb.Client.query_iter().
+
+        Returns:
+            A generator returning pages: lists of objects, adhering to the
+            schema of the list in kcidb.io_schema.JSON.
+        """
+        sql, params = self._query_sql(obj_list_name, **filters)
+        query_job = self.client.query(
+            sql, job_config=self._get_query_job_config(params))
+        for page in query_job.result(page_size=page_size).pages:
+            convert = QUERY_CONVERTER_MAP[obj_list_name]
+            yield [convert(row.items()) for row in page]
+
+    def load(self, obj_list_name, obj_list, dedup=False):
+        """
+        Load a list of objects into their table.
+
+        Args:
+            obj_list_name:  The name of the object list (and the table) to
+                            load the objects into.
+            obj_list:       The list of objects to load. Must adhere to the
+                            schema of the list in kcidb.io_schema.JSON.
+            dedup:          True if the loaded objects should replace the
+                            stored objects with the same origin and
+                            origin_id, False if they should be simply added.
+                            With True, the list must not contain multiple
+                            objects with the same origin and origin_id.
+
+        Returns:
+            A list of error messages, empty if loaded successfully.
+            The objects are stored with the time of loading as their
+            ingestion time (db_schema.INGESTION_TIME_FIELD_NAME).
+        """
+        if self.stream and not dedup:
+            return self._insert(obj_list_name, obj_list)
+        if dedup:
+            # Load into a staging table, then merge into the target table
+            table_ref = self.dataset_ref.table(
+                f"_staging_{obj_list_name}_{uuid.uuid4().hex}")
+            table = bigquery.table.Table(table_ref,
+                                         schema=SCHEMA_MAP[obj_list_name])
+            # Make sure the table is removed even if we crash
+            table.expires = datetime.now(timezone.utc) + STAGING_LIFETIME
+            self.client.create_table(table)
+        else:
+            table_ref = self.table_ref_map[obj_list_name]
+        try:
+            job_config = self.load_job_config_map[obj_list_name]
+            ingestion_time = datetime.now(timezone.utc)
+            if self.load_format == bigquery.SourceFormat.PARQUET:
+                job = self.client.load_table_from_file(
+                    get_parquet_file(obj_list_name, obj_list,
+                                     ingestion_time),
+                    table_ref, job_config=job_config)
+            else:
+                job = self.client.load_table_from_json(
+                    get_json_rows(obj_list_name, obj_list, ingestion_time),
+                    table_ref, job_config=job_config)
+            try:
+                job.result()
+            except BadRequest:
+                return [error['message'] for error in job.errors]
+            if dedup:
+                job = self.client.query(
+                    self._merge_sql(obj_list_name, table_ref.table_id),
+                    job_config=self.query_job_config)
+                try:
+                    job.result()
+                except BadRequest:
+                    return [error['message'] for error in job.errors]
+        finally:
+            if dedup:
+                self.client.delete_table(table_ref, not_found_ok=True)
+        return []
+
+    def _insert(self, obj_list_name, obj_list):
+        """
+        Insert a list of objects into their table with streaming inserts,
+        in requests limited by STREAM_BATCH_ROWS and STREAM_BATCH_BYTES.
+        Rows are identified by their origin and origin_id, so BigQuery
+        drops repeated insertions of the same objects on a best-effort
+        basis, e.g. when a request is retried. Invalid objects are skipped,
+        and the rest are inserted.
+
+        Args:
+            obj_list_name:  The name of the object list (and the table) to
+                            insert the objects into.
+            obj_list:       The list of objects to insert. Must adhere to
+                            the schema of the list in kcidb.io_schema.JSON.
+
+        Returns:
+            A list of error messages, one per object failed to insert,
+            each specifying the index, origin, and origin_id of the object,
+            empty if all were inserted successfully.
+        """
+        table_ref = self.table_ref_map[obj_list_name]
+        rows = get_json_rows(obj_list_name, obj_list,
+                             datetime.now(timezone.utc))
+        errors = []
+        for start, batch in _batch_rows(rows, STREAM_BATCH_ROWS,
+                                        STREAM_BATCH_BYTES):
+            try:
+                row_errors = self.client.insert_rows_json(
+                    table_ref, batch,
+                    row_ids=[f"{row['origin']}:{row['origin_id']}"
+                             for row in batch],
+                    skip_invalid_rows=True)
+            except BadRequest as exc:
+                errors.append(
+                    f"{obj_list_name}[{start}:{start + len(batch)}]: "
+                    f"{exc.message}"
+                )
+                continue
+            for row_error in row_errors:
+                index = start + row_error["index"]
+                obj = obj_list[index]
+                messages = "; ".join(error["message"]
+                                     for error in row_error["errors"])
+                errors.append(f"{obj_list_name}[{index}] "
+                              f"{obj['origin']}:{obj['origin_id']}: "
+                              f"{messages}")
+        return errors
+
+    @staticmethod
+    def _summary_merge_sql(table_name, summaries_sql, complete=False,
+                           add=False):
+        """
+        Generate an SQL statement merging computed summaries into their
+        table, replacing the summaries with the same origin and origin_id,
+        or adding to them.
+
+        Args:
+            table_name:     The name of the summary table to merge into.
+            summaries_sql:  The SQL query computing the summaries.
+            complete:       True if the query computes all the summaries,
+                            and the summaries it doesn't produce should be
+                            removed, False otherwise.
+            add:            True if the computed summaries are summaries
+                            of newly-added data of the same builds, which
+                            should be added to the stored ones, False if
+                            they should replace them. Only supported for
+                            "build_summaries".
+
+        Returns:
+            The SQL statement string.
+        """
+        assert not add or table_name == "build_summaries"
+        if add:
+            exprs = summaries.build_summaries_combine_sql("target", "source")
+        else:
+            exprs = [
+                (field.name, f"source.{field.name}")
+                for field in db_schema.SUMMARY_TABLE_MAP[table_name]
+            ]
+        return f"MERGE `{table_name}` AS target " \
+            f"USING ({summaries_sql}) AS source " \
+            "ON target.origin = source.origin AND " \
+            "target.origin_id = source.origin_id " \
+            "WHEN MATCHED THEN UPDATE SET " + \
+            ", ".join(f"{name} = {expr}" for name, expr in exprs) + " " \
+            "WHEN NOT MATCHED THEN INSERT ROW" + \
+            (" WHEN NOT MATCHED BY SOURCE THEN DELETE" if complete else "")
+
+    def _revision_summaries_merge(self, revision_keys, build_keys):
+        """
+        Generate an SQL statement recomputing the summaries of the
+        specified revisions, and the revisions of the specified builds,
+        from the build summaries, along with its parameters.
+
+        Args:
+            revision_keys:  A list of (origin, origin_id) tuples of the
+                            revisions to summarize, or None for all.
+            build_keys:     A list of (origin, origin_id) tuples of the
+                            builds to summarize the revisions of, or None
+                            for all.
+
+        Returns:
+            The SQL statement string, and a list of its parameters.
+        """
+        if revision_keys is None or build_keys is None:
+            return self._summary_merge_sql(
+                "revision_summaries",
+                summaries.revision_summaries_sql(
+                    summaries.all_revision_keys_sql("UNION DISTINCT")),
+                True), []
+        keys_sql = "SELECT origin, origin_id " \
+            "FROM UNNEST(@revision_keys) UNION DISTINCT " + \
+            summaries.linked_revision_keys_sql(
+                "SELECT origin, origin_id FROM UNNEST(@build_keys)")
+        return self._summary_merge_sql(
+            "revision_summaries", summaries.revision_summaries_sql(keys_sql),
+            False
+        ), [get_struct_array_param("revision_keys", _KEY_FIELDS,
+                                   revision_keys),
+            get_struct_array_param("build_keys", _KEY_FIELDS, build_keys)]
+
+    def _execute(self, statements):
+        """
+        Execute SQL statements one after another, stopping at the first
+        failure.
+
+        Args:
+            statements: A list of tuples, each containing an SQL statement
+                        string, and a list of its parameters.
+
+        Returns:
+            A list of error messages, empty if executed successfully.
+        """
+        for sql, params in statements:
+            job = self.client.query(
+                sql, job_config=self._get_query_job_config(params))
+            try:
+                job.result()
+            except BadRequest:
+                return [error['message'] for error in job.errors]
+        return []
+
+    def update_summaries(self, revision_keys=None, build_keys=None):
+        """
+        Recompute the summaries of the specified revisions and builds
+        (see kcidb.db_schema.SUMMARY_TABLE_MAP), as well as of the
+        revisions of the specified builds.
+
+        Args:
+            revision_keys:  A list of (origin, origin_id) tuples of the
+                            revisions to summarize, or None for all.
+            build_keys:     A list of (origin, origin_id) tuples of the
+                            builds to summarize, or None for all.
+
+        Returns:
+            A list of error messages, empty if updated successfully.
+        """
+        if build_keys is None:
+            build_merge = self._summary_merge_sql(
+                "build_summaries",
+                summaries.build_summaries_sql(
+                    summaries.all_build_keys_sql("UNION DISTINCT")),
+                True), []
+        else:
+            # Filter the clustering columns with constants as well, as
+            # joins don't limit the scanned clusters
+            build_merge = self._summary_merge_sql(
+                "build_summaries",
+                summaries.build_summaries_sql(
+                    "SELECT origin, origin_id FROM UNNEST(@build_keys)",
+                    build_conds=(
+                        "builds.origin IN UNNEST(@build_origins)",
+                        "builds.origin_id IN UNNEST(@build_origin_ids)",
+                    ),
+                    test_conds=(
+                        "tests.build_origin IN UNNEST(@build_origins)",
+                        "tests.build_origin_id IN UNNEST(@build_origin_ids)",
+                    )),
+                False
+            ), [
+                get_struct_array_param("build_keys", _KEY_FIELDS,
+                                       build_keys),
+                bigquery.ArrayQueryParameter(
+                    "build_origins", "STRING",
+                    sorted({origin for origin, _ in build_keys})),
+                bigquery.ArrayQueryParameter(
+                    "build_origin_ids", "STRING",
+                    sorted({origin_id for _, origin_id in build_keys})),
+            ]
+        # Build summaries first, as revision summaries are based on them
+        return self._execute([
+            build_merge,
+            self._revision_summaries_merge(revision_keys, build_keys),
+        ])
+
+    def summarize(self, data, added=False):
+        """
+        Update the summaries of the revisions and builds affected by
+        loading data: the revisions and builds in the data, the builds of
+        the tests in it, and the revisions of those builds. If the data was
+        added, the build summaries are updated from the data alone,
+        without scanning the tables, and the revision summaries are
+        recomputed from the build summaries.
+
+        Args:
+            data:   The loaded I/O data, adhering to kcidb.io_schema.JSON.
+            added:  True if all the data was loaded successfully, and only
+                    added to the database, without replacing any objects,
+                    so the summaries could be updated from the data alone.
+                    False if the summaries of the affected revisions and
+                    builds should be recomputed from the database.
+
+        Returns:
+            A list of error messages, empty if updated successfully.
+        """
+        if not added:
+            return super().summarize(data)
+        build_summaries = summaries.get_build_summaries(data)
+        revision_keys = sorted({
+            (revision["origin"], revision["origin_id"])
+            for revision in data.get("revisions", [])
+        })
+        if not revision_keys and not build_summaries:
+            return []
+        fields = db_schema.SUMMARY_TABLE_MAP["build_summaries"]
+        add_sql = self._summary_merge_sql(
+            "build_summaries",
+            "SELECT * FROM UNNEST(@build_summaries)", add=True)
+        statements = [
+            (add_sql, [get_struct_array_param(
+                "build_summaries", fields,
+                ([summary[field.name] for field in fields]
+                 for summary in build_summaries[start:
+                                                start + SUMMARY_BATCH_SIZE])
+            )])
+            for start in range(0, len(build_summaries), SUMMARY_BATCH_SIZE)
+        ]
+        statements.append(self._revision_summaries_merge(
+            revision_keys,
+            sorted((summary["origin"], summary["origin_id"])
+                   for summary in build_summaries)
+        ))
+        return self._execute(statements)
+
+    def query_summaries(self, table_name, origin=None, revision_ids=None):
+        """
+        Query summaries of revisions or builds from the database.
+
+        Args:
+            table_name:     The name of the summary table to query:
+                            "revision_summaries" or "build_summaries".
+            origin:         The name of the CI system to limit the
+                            summarized revisions and builds to, or None.
+            revision_ids:   A list of origin IDs of the revisions to limit
+                            the summaries to (of the revisions themselves,
+                            or of their builds), or None.
+
+        Returns:
+            A list of summaries: dictionaries of the table's fields and
+            values, omitting the ones without values.
+        """
+        revision_prefix = "" if table_name == "revision_summaries" \
+            else "revision_"
+        params = []
+        conds = []
+        if origin is not None:
+            params.append(
+                bigquery.ScalarQueryParameter("origin", "STRING", origin))
+            conds.append("origin = @origin")
+            if revision_prefix and revision_ids is not None:
+                conds.append(f"{revision_prefix}origin = @origin")
+        if revision_ids is not None:
+            params.append(bigquery.ArrayQueryParameter(
+                "revision_ids", "STRING", list(revision_ids)))
+            conds.append(
+                f"{revision_prefix}origin_id IN UNNEST(@revision_ids)")
+        sql = f"SELECT * FROM `{table_name}`"
+        if conds:
+            sql += " WHERE " + " AND ".join(conds)
+        job_config = self._get_query_job_config(params)
+        convert = SUMMARY_CONVERTER_MAP[table_name]
+        return [
+            convert(row.items())
+            for row in self.client.query(sql, job_config=job_config)
+        ]
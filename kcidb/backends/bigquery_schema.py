@@ -0,0 +1,220 @@
+"""
+Kernel CI database BigQuery schema, and conversion of I/O objects to and
+from BigQuery table rows
+"""
+
+import io
+import json
+from datetime import datetime
+from google.cloud import bigquery
+from kcidb import columnar
+from kcidb import db_schema
+
+
+def _repeat(convert):
+    """Create a function converting each item of a list with another one"""
+    return lambda value: [convert(item) for item in value]
+
+
+def _dict_items(convert_items):
+    """Create a function converting a dictionary with a converter of items"""
+    return lambda value: convert_items(value.items())
+
+
+def get_load_converter(fields):
+    """
+    Create a function converting an I/O object to the BigQuery
+    storage-compatible representation, without modifying it, by only
+    processing the fields which need conversion: the JSON-encoded "misc"
+    fields, and the records containing them.
+
+    Args:
+        fields: The sequence of BigQuery schema fields of the object.
+
+    Returns:
+        The function accepting an object and returning its converted copy,
+        or the object itself, if it needed no conversion. None, if objects
+        with these fields never need conversion.
+    """
+    converters = []
+    for field in fields:
+        if field.name == "misc":
+            convert = json.dumps
+        elif field.field_type == "RECORD":
+            convert = get_load_converter(field.fields)
+        else:
+            convert = None
+        if convert is not None:
+            if field.mode == "REPEATED":
+                convert = _repeat(convert)
+            converters.append((field.name, convert))
+    if not converters:
+        return None
+
+    def convert_obj(obj):
+        row = None
+        for name, convert in converters:
+            if name in obj:
+                if row is None:
+                    row = obj.copy()
+                row[name] = convert(obj[name])
+        return obj if row is None else row
+    return convert_obj
+
+
+def get_query_converter(fields):
+    """
+    Create a function converting a row retrieved from BigQuery to the I/O
+    object representation, by only processing the fields which need
+    conversion: the JSON-encoded "misc" fields, timestamps, numbers, and
+    the records containing them. Fields with None values are omitted.
+
+    Args:
+        fields: The sequence of BigQuery schema fields of the row.
+
+    Returns:
+        The function accepting the row's items (pairs of field names and
+        values) and returning the converted object.
+    """
+    converter_map = {}
+    for field in fields:
+        if field.name == "misc":
+            convert = json.loads
+        elif field.field_type == "TIMESTAMP":
+            convert = datetime.isoformat
+        elif field.field_type in ("NUMERIC", "FLOAT"):
+            convert = float
+        elif field.field_type == "RECORD":
+            # Records are returned as dictionaries
+            convert = _dict_items(get_query_converter(field.fields))
+        else:
+            continue
+        if field.mode == "REPEATED":
+            convert = _repeat(convert)
+        converter_map[field.name] = convert
+
+    def convert_items(items):
+        obj = {}
+        for name, value in items:
+            if value is not None:
+                convert = converter_map.get(name)
+                obj[name] = value if convert is None else convert(value)
+        return obj
+    return convert_items
+
+
+def get_parquet_file(obj_list_name, obj_list, ingestion_time):
+    """
+    Convert a list of I/O objects to a Parquet file with a table's rows.
+    Requires pyarrow.
+
+    Args:
+        obj_list_name:  The name of the object list (and the table).
+        obj_list:       The list of objects to convert. Must adhere to the
+                        schema of the list in kcidb.io_schema.JSON.
+        ingestion_time: The ingestion time to assign to the rows, a
+                        timezone-aware datetime object.
+
+    Returns:
+        The file object containing the Parquet data, positioned at the start.
+    """
+    # Only require pyarrow, if we're loading Parquet
+    # pylint: disable=import-outside-toplevel
+    import pyarrow
+    import pyarrow.compute
+    import pyarrow.parquet
+    table = columnar.Table(obj_list_name)
+    table.extend(obj_list)
+    arrow_table = table.to_arrow()
+    # BigQuery doesn't convert doubles to NUMERIC
+    for index, field in enumerate(table.fields):
+        if field.field_type == "NUMERIC":
+            arrow_table = arrow_table.set_column(
+                index, field.name,
+                pyarrow.compute.cast(arrow_table.column(index),
+                                     pyarrow.decimal128(38, 9), safe=False))
+    arrow_table = arrow_table.append_column(
+        db_schema.INGESTION_TIME_FIELD_NAME,
+        pyarrow.array([ingestion_time] * len(table),
+                      type=pyarrow.timestamp("us", tz="UTC")))
+    parquet_file = io.BytesIO()
+    pyarrow.parquet.write_table(arrow_table, parquet_file)
+    parquet_file.seek(0)
+    return parquet_file
+
+
+# A map of table names to functions converting I/O objects to BigQuery rows,
+# or None, if the table's objects need no conversion
+LOAD_CONVERTER_MAP = {
+    table_name: get_load_converter(table_schema)
+    for table_name, table_schema in db_schema.TABLE_MAP.items()
+}
+
+
+def get_json_rows(obj_list_name, obj_list, ingestion_time):
+    """
+    Convert a list of I/O objects to JSON rows of their table, without
+    modifying the objects.
+
+    Args:
+        obj_list_name:  The name of the object list (and the table).
+        obj_list:       The list of objects to convert. Must adhere to the
+                        schema of the list in kcidb.io_schema.JSON.
+        ingestion_time: The ingestion time to assign to the rows, a
+                        timezone-aware datetime object.
+
+    Returns:
+        The list of rows.
+    """
+    convert = LOAD_CONVERTER_MAP[obj_list_name]
+    ingestion_time = ingestion_time.isoformat()
+    rows = []
+    for obj in obj_list:
+        row = obj if convert is None else convert(obj)
+        # Don't modify the objects
+        if row is obj:
+            row = obj.copy()
+        row[db_schema.INGESTION_TIME_FIELD_NAME] = ingestion_time
+        rows.append(row)
+    return rows
+
+
+def get_schema(fields):
+    """
+    Convert database field descriptions to a BigQuery schema.
+
+    Args:
+        fields: A sequence of field descriptions (kcidb.db_schema.Field).
+
+    Returns:
+        The list of bigquery.SchemaField objects.
+    """
+    return [
+        bigquery.SchemaField(field.name, field.field_type, mode=field.mode,
+                             description=field.description,
+                             fields=get_schema(field.fields))
+        for field in fields
+    ]
+
+
+# A map of table and summary table names to their BigQuery schemas
+SCHEMA_MAP = {
+    table_name: get_schema(table_schema)
+    for table_name, table_schema in (*db_schema.TABLE_MAP.items(),
+                                     *db_schema.SUMMARY_TABLE_MAP.items())
+}
+
+# A map of table names to functions converting BigQuery row items to I/O
+# objects
+QUERY_CONVERTER_MAP = {
+    table_name: get_query_converter(table_schema)
+    for table_name, table_schema in db_schema.TABLE_MAP.items()
+}
+
+
+# A map of summary table names to functions converting BigQuery row items
+# to summaries
+SUMMARY_CONVERTER_MAP = {
+    table_name: get_query_converter(table_schema)
+    for table_name, table_schema in db_schema.SUMMARY_TABLE_MAP.items()
+}
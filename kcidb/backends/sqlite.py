@@ -0,0 +1,486 @@
+"""Kernel CI database SQLite storage backend"""
+
+import json
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from kcidb import db_schema
+from kcidb.backends import base
+from kcidb import misc
+from kcidb.backends import summaries
+
+
+def _encode_timestamp(value):
+    """Encode an I/O timestamp as a UTC ISO-8601 string, sorting correctly"""
+    return misc.parse_timestamp(value).astimezone(timezone.utc).isoformat()
+
+
+def _get_column_codecs(field):
+    """
+    Get the functions converting values of a table field between the I/O
+    representation and the SQLite column representation.
+
+    Args:
+        field:  The table field (kcidb.db_schema Field).
+
+    Returns:
+        The SQLite column type, the function converting an I/O value to
+        the column value, and the function converting back.
+    """
+    if field.name == "misc" or field.mode == "REPEATED" or \
+            field.field_type == "RECORD":
+        return "TEXT", json.dumps, json.loads
+    if field.field_type == "TIMESTAMP":
+        return "TEXT", _encode_timestamp, None
+    if field.field_type == "NUMERIC":
+        return "REAL", None, None
+    if field.field_type == "BOOL":
+        return "INTEGER", int, bool
+    if field.field_type == "INTEGER":
+        return "INTEGER", None, None
+    return "TEXT", None, None
+
+
+# A map of table names to lists of tuples, one per I/O object field column,
+# each containing the column name, type, and the encoding and decoding
+# functions (or None). The ingestion time column is not included, and is
+# always the last one.
+_COLUMN_MAP = {
+    table_name: [
+        (field.name, *_get_column_codecs(field)) for field in table_schema
+        if field.name != db_schema.INGESTION_TIME_FIELD_NAME
+    ]
+    for table_name, table_schema in db_schema.TABLE_MAP.items()
+}
+
+# A map of summary table names to lists of column tuples, as in _COLUMN_MAP
+_SUMMARY_COLUMN_MAP = {
+    table_name: [
+        (field.name, *_get_column_codecs(field)) for field in table_schema
+    ]
+    for table_name, table_schema in db_schema.SUMMARY_TABLE_MAP.items()
+}
+
+# A map of summary table names to lists of tuples of indexed columns,
+# the first one unique
+_SUMMARY_INDEX_MAP = dict(
+    revision_summaries=[("origin", "origin_id")],
+    build_summaries=[("origin", "origin_id"),
+                     ("revision_origin", "revision_origin_id")],
+)
+
+# A map of table names to lists of tuples of indexed columns
+_INDEX_MAP = {
+    table_name: [("origin", "origin_id")] + [
+        (field.name[:-len("_id")], field.name)
+        for field in table_schema
+        if field.name.endswith("_origin_id")
+    ]
+    for table_name, table_schema in db_schema.TABLE_MAP.items()
+}
+for _index_list in _INDEX_MAP.values():
+    _index_list.append((db_schema.INGESTION_TIME_FIELD_NAME,))
+_INDEX_MAP["revisions"].append(("discovery_time",))
+_INDEX_MAP["tests"].append(("path",))
+
+# A map of names of the time filters accepted by kcidb.Client.query_iter()
+# to tuples of: the table the filter applies to ("revisions" for the
+# revisions the objects are linked to, or None for the objects themselves),
+# the filtered column, and the comparison operator
+_TIME_FILTER_MAP = dict(
+    discovered_after=("revisions", "discovery_time", ">="),
+    discovered_before=("revisions", "discovery_time", "<"),
+    ingested_after=(None, db_schema.INGESTION_TIME_FIELD_NAME, ">="),
+    ingested_before=(None, db_schema.INGESTION_TIME_FIELD_NAME, "<"),
+)
+
+
+def _where(conds):
+    """Generate an SQL WHERE clause matching all conditions, if any"""
+    return (" WHERE " + " AND ".join(conds)) if conds else ""
+
+
+class Backend(base.Backend):
+    """SQLite storage backend"""
+
+    # Loads are committed right after taking their ingestion time,
+    # so only allow for clock adjustments
+    ingestion_delay = timedelta(minutes=1)
+
+    def __init__(self, path):
+        """
+        Initialize an SQLite storage backend.
+
+        Args:
+            path:   The path to the SQLite database file,
+                    or ":memory:" for an in-memory database.
+        """
+        assert isinstance(path, str)
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        # Serializes access to the connection from multiple threads
+        self.lock = threading.RLock()
+
+    def init(self):
+        """
+        Initialize the database. The database must be empty.
+        """
+        with self.lock, self.conn:
+            if self.path != ":memory:":
+                self.conn.execute("PRAGMA journal_mode=WAL")
+            for table_name, columns in _COLUMN_MAP.items():
+                self.conn.execute(
+                    f"CREATE TABLE {table_name} (" +
+                    ", ".join(f"{name} {column_type}"
+                              for name, column_type, _, _ in columns) +
+                    f", {db_schema.INGESTION_TIME_FIELD_NAME} TEXT)"
+                )
+                for index_columns in _INDEX_MAP[table_name]:
+                    self.conn.execute(
+                        f"CREATE INDEX "
+                        f"{table_name}_{'_'.join(index_columns)} "
+                        f"ON {table_name} ({', '.join(index_columns)})"
+                    )
+            for table_name, columns in _SUMMARY_COLUMN_MAP.items():
+                self.conn.execute(
+                    f"CREATE TABLE {table_name} (" +
+                    ", ".join(f"{name} {column_type}"
+                              for name, column_type, _, _ in columns) +
+                    ")"
+                )
+                for index, index_columns in \
+                        enumerate(_SUMMARY_INDEX_MAP[table_name]):
+                    self.conn.execute(
+                        f"CREATE {'UNIQUE ' if index == 0 else ''}INDEX "
+                        f"{table_name}_{'_'.join(index_columns)} "
+                        f"ON {table_name} ({', '.join(index_columns)})"
+                    )
+
+    def cleanup(self):
+        """
+        Cleanup (empty) the database, removing all data.
+        """
+        with self.lock, self.conn:
+            for table_name in (*_COLUMN_MAP, *_SUMMARY_COLUMN_MAP):
+                self.conn.execute(f"DROP TABLE {table_name}")
+
+    def load(self, obj_list_name, obj_list, dedup=False):
+        """
+        Load a list of objects into their table.
+
+        Args:
+            obj_list_name:  The name of the object list (and the table) to
+                            load the objects into.
+            obj_list:       The list of objects to load. Must adhere to the
+                            schema of the list in kcidb.io_schema.JSON.
+            dedup:          True if the loaded objects should replace the
+                            stored objects with the same origin and
+                            origin_id, False if they should be simply added.
+                            With True, the list must not contain multiple
+                            objects with the same origin and origin_id.
+
+        Returns:
+            A list of error messages, empty if loaded successfully.
+            The objects are stored with the time of loading as their
+            ingestion time (db_schema.INGESTION_TIME_FIELD_NAME).
+        """
+        columns = _COLUMN_MAP[obj_list_name]
+        try:
+            rows = [
+                tuple(
+                    value if value is None or encode is None
+                    else encode(value)
+                    for value, encode in (
+                        (obj.get(name), encode)
+                        for name, _, encode, _ in columns
+                    )
+                )
+                for obj in obj_list
+            ]
+        except ValueError as exc:
+            return [str(exc)]
+        try:
+            with self.lock, self.conn:
+                ingestion_time = datetime.now(timezone.utc).isoformat()
+                if dedup:
+                    # Uses the (origin, origin_id) index
+                    self.conn.executemany(
+                        f"DELETE FROM {obj_list_name} "
+                        f"WHERE origin = ? AND origin_id = ?",
+                        ((obj["origin"], obj["origin_id"])
+                         for obj in obj_list)
+                    )
+                self.conn.executemany(
+                    f"INSERT INTO {obj_list_name} VALUES (" +
+                    ", ".join("?" * len(columns)) + ", ?)",
+                    (row + (ingestion_time,) for row in rows)
+                )
+        except sqlite3.Error as exc:
+            return [str(exc)]
+        return []
+
+    @staticmethod
+    def _filter_conds(obj_list_name, filters):
+        """
+        Generate SQL conditions implementing query filters, except the test
+        path prefix, along with their parameters.
+
+        Args:
+            obj_list_name:  The name of the object list (and the table)
+                            to generate the conditions for.
+            filters:        The filters to apply to the objects, as
+                            accepted by kcidb.Client.query_iter().
+
+        Returns:
+            A dictionary of the conditions' parameters, and lists of
+            conditions on the linked revisions, and on the objects
+            themselves.
+        """
+        params = {}
+        revision_conds = []
+        conds = []
+        origin = filters.get("origin")
+        if origin is not None:
+            params["origin"] = origin
+            revision_conds.append("origin = :origin")
+            if obj_list_name != "revisions":
+                conds.append(f"{obj_list_name}.origin = :origin")
+        if filters.get("revision_ids") is not None:
+            names = []
+            for index, revision_id in enumerate(filters["revision_ids"]):
+                names.append(f":revision_id_{index}")
+                params[f"revision_id_{index}"] = revision_id
+            revision_conds.append(f"origin_id IN ({', '.join(names)})")
+        for name, (table_name, column, operator) in \
+                _TIME_FILTER_MAP.items():
+            if filters.get(name) is None:
+                continue
+            params[name] = \
+                filters[name].astimezone(timezone.utc).isoformat()
+            if table_name == "revisions":
+                revision_conds.append(f"{column} {operator} :{name}")
+            else:
+                conds.append(
+                    f"{obj_list_name}.{column} {operator} :{name}")
+        return params, revision_conds, conds
+
+    @staticmethod
+    def _query_sql(obj_list_name, **filters):
+        """
+        Generate an SQL query retrieving objects of the specified type,
+        matching the specified filters, along with its parameters.
+
+        Args:
+            obj_list_name:  The name of the object list (and the table)
+                            to generate the query for.
+            filters:        The filters to apply to the objects, as
+                            accepted by kcidb.Client.query_iter().
+
+        Returns:
+            The SQL query string, and a dictionary of its parameters.
+        """
+        assert set(filters) <= {"origin", "revision_ids", "path_prefix",
+                                *_TIME_FILTER_MAP}
+        params, revision_conds, conds = \
+            Backend._filter_conds(obj_list_name, filters)
+        columns = ", ".join(
+            f"{obj_list_name}.{name}"
+            for name, _, _, _ in _COLUMN_MAP[obj_list_name]
+        )
+        if obj_list_name == "revisions":
+            return f"SELECT {columns} FROM revisions" + \
+                _where(revision_conds + conds), params
+        # Only restrict builds and tests to linked revisions
+        # if revisions are selected by something other than origin
+        linked = filters.get("revision_ids") is not None or any(
+            filters.get(name) is not None
+            for name, (table_name, *_) in _TIME_FILTER_MAP.items()
+            if table_name == "revisions"
+        )
+        revisions_sql = "SELECT DISTINCT origin, origin_id " \
+            "FROM revisions" + _where(revision_conds)
+        if obj_list_name == "builds":
+            sql = f"SELECT {columns} FROM builds"
+            if linked:
+                sql += f" INNER JOIN ({revisions_sql}) AS linked_revisions " \
+                    "ON builds.revision_origin = linked_revisions.origin " \
+                    "AND builds.revision_origin_id = " \
+                    "linked_revisions.origin_id"
+            return sql + _where(conds), params
+        sql = f"SELECT {columns} FROM tests"
+        if linked:
+            sql += " INNER JOIN (" \
+                "SELECT DISTINCT builds.origin, builds.origin_id " \
+                "FROM builds " \
+                f"INNER JOIN ({revisions_sql}) AS linked_revisions " \
+                "ON builds.revision_origin = linked_revisions.origin AND " \
+                "builds.revision_origin_id = linked_revisions.origin_id" \
+                ") AS linked_builds " \
+                "ON tests.build_origin = linked_builds.origin AND " \
+                "tests.build_origin_id = linked_builds.origin_id"
+        path_prefix = filters.get("path_prefix")
+        if path_prefix:
+            # Match paths starting with the prefix and a dot using an
+            # index-friendly range, as "/" follows "." in ASCII
+            params["path_prefix"] = path_prefix
+            params["path_prefix_start"] = path_prefix + "."
+            params["path_prefix_end"] = path_prefix + "/"
+            conds.append(
+                "(tests.path = :path_prefix OR "
+                "(tests.path >= :path_prefix_start AND "
+                "tests.path < :path_prefix_end))")
+        return sql + _where(conds), params
+
+    def query(self, obj_list_name, page_size, **filters):
+        """
+        Query objects of one type from the database, page by page.
+
+        Args:
+            obj_list_name:  The name of the object list (and the table) to
+                            query the objects from.
+            page_size:      The maximum number of objects in a page.
+            filters:        The filters to apply to the objects, as
+                            accepted by kcidb.Client.query_iter().
+
+        Returns:
+            A generator returning pages: lists of objects, adhering to the
+            schema of the list in kcidb.io_schema.JSON.
+        """
+        columns = _COLUMN_MAP[obj_list_name]
+        sql, params = self._query_sql(obj_list_name, **filters)
+        with self.lock:
+            cursor = self.conn.execute(sql, params)
+        while True:
+            with self.lock:
+                rows = cursor.fetchmany(page_size)
+            if not rows:
+                break
+            yield [
+                {
+                    name: value if decode is None else decode(value)
+                    for (name, _, _, decode), value in zip(columns, row)
+                    if value is not None
+                }
+                for row in rows
+            ]
+
+    def _fill_keys(self, table_name, keys):
+        """
+        Fill a temporary table with (origin, origin_id) keys.
+
+        Args:
+            table_name: The name of the temporary table to (re)fill.
+            keys:       An iterable of (origin, origin_id) tuples.
+
+        Returns:
+            An SQL query returning the keys from the table.
+        """
+        self.conn.execute(
+            f"CREATE TEMP TABLE IF NOT EXISTS {table_name} "
+            f"(origin TEXT, origin_id TEXT, PRIMARY KEY (origin, origin_id))"
+        )
+        self.conn.execute(f"DELETE FROM temp.{table_name}")
+        self.conn.executemany(
+            f"INSERT OR IGNORE INTO temp.{table_name} VALUES (?, ?)", keys)
+        return f"SELECT origin, origin_id FROM temp.{table_name}"
+
+    def update_summaries(self, revision_keys=None, build_keys=None):
+        """
+        Recompute the summaries of the specified revisions and builds
+        (see kcidb.db_schema.SUMMARY_TABLE_MAP), as well as of the
+        revisions of the specified builds.
+
+        Args:
+            revision_keys:  A list of (origin, origin_id) tuples of the
+                            revisions to summarize, or None for all.
+            build_keys:     A list of (origin, origin_id) tuples of the
+                            builds to summarize, or None for all.
+
+        Returns:
+            A list of error messages, empty if updated successfully.
+        """
+        try:
+            with self.lock, self.conn:
+                if build_keys is None:
+                    self.conn.execute("DELETE FROM build_summaries")
+                    build_keys_sql = summaries.all_build_keys_sql("UNION")
+                else:
+                    build_keys_sql = self._fill_keys("summary_build_keys",
+                                                     build_keys)
+                    self.conn.execute(
+                        "DELETE FROM build_summaries "
+                        f"WHERE (origin, origin_id) IN ({build_keys_sql})"
+                    )
+                self.conn.execute(
+                    "INSERT INTO build_summaries " +
+                    summaries.build_summaries_sql(build_keys_sql)
+                )
+                if revision_keys is None or build_keys is None:
+                    self.conn.execute("DELETE FROM revision_summaries")
+                    revision_keys_sql = \
+                        summaries.all_revision_keys_sql("UNION")
+                else:
+                    revision_keys_sql = self._fill_keys(
+                        "summary_revision_keys", revision_keys)
+                    self.conn.execute(
+                        "INSERT OR IGNORE INTO temp.summary_revision_keys " +
+                        summaries.linked_revision_keys_sql(build_keys_sql)
+                    )
+                    self.conn.execute(
+                        "DELETE FROM revision_summaries "
+                        f"WHERE (origin, origin_id) IN ({revision_keys_sql})"
+                    )
+                self.conn.execute(
+                    "INSERT INTO revision_summaries " +
+                    summaries.revision_summaries_sql(revision_keys_sql)
+                )
+        except sqlite3.Error as exc:
+            return [str(exc)]
+        return []
+
+    def query_summaries(self, table_name, origin=None, revision_ids=None):
+        """
+        Query summaries of revisions or builds from the database.
+
+        Args:
+            table_name:     The name of the summary table to query:
+                            "revision_summaries" or "build_summaries".
+            origin:         The name of the CI system to limit the
+                            summarized revisions and builds to, or None.
+            revision_ids:   A list of origin IDs of the revisions to limit
+                            the summaries to (of the revisions themselves,
+                            or of their builds), or None.
+
+        Returns:
+            A list of summaries: dictionaries of the table's fields and
+            values, omitting the ones without values.
+        """
+        columns = _SUMMARY_COLUMN_MAP[table_name]
+        revision_prefix = "" if table_name == "revision_summaries" \
+            else "revision_"
+        params = {}
+        conds = []
+        if origin is not None:
+            params["origin"] = origin
+            conds.append("origin = :origin")
+            if revision_prefix and revision_ids is not None:
+                conds.append(f"{revision_prefix}origin = :origin")
+        if revision_ids is not None:
+            names = []
+            for index, revision_id in enumerate(revision_ids):
+                names.append(f":revision_id_{index}")
+                params[f"revision_id_{index}"] = revision_id
+            conds.append(f"{revision_prefix}origin_id IN ({', '.join(names)})")
+        sql = f"SELECT * FROM {table_name}"
+        if conds:
+            sql += " WHERE " + " AND ".join(conds)
+        with self.lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [
+            {
+                name: value if decode is None else decode(value)
+                for (name, _, _, decode), value in zip(columns, row)
+                if value is not None
+            }
+            for row in rows
+        ]
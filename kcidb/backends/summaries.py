@@ -0,0 +1,362 @@
+"""
+Kernel CI database summary queries, common to the SQL storage backends.
+The generated SQL works both with BigQuery and SQLite.
+"""
+
+from kcidb import db_schema
+from kcidb import io_schema
+
+
+def _priority_sql(status_expr):
+    """
+    Generate an SQL expression converting a test status to its priority:
+    zero for the highest, NULL for a NULL status.
+    """
+    return "CASE " + status_expr + " " + " ".join(
+        f"WHEN '{status}' THEN {priority}"
+        for priority, status in enumerate(io_schema.TEST_STATUS_PRIORITY)
+    ) + " END"
+
+
+def _status_sql(priority_expr):
+    """
+    Generate an SQL expression converting a test status priority back to
+    the status, NULL for a NULL priority.
+    """
+    return "CASE " + priority_expr + " " + " ".join(
+        f"WHEN {priority} THEN '{status}'"
+        for priority, status in enumerate(io_schema.TEST_STATUS_PRIORITY)
+    ) + " END"
+
+
+def _test_summary_names():
+    """Get the names of the fields summarizing test runs"""
+    return [field.name for field in db_schema.TEST_SUMMARY_FIELDS]
+
+
+# A map of names of build summary fields, which are not added up when
+# combining summaries of separate parts of a build's data, to the value
+# which is kept: the "max"imum, the "min"imum, or the status with the
+# highest "priority". NULL values are never kept over others.
+_BUILD_SUMMARY_CHOICE_MAP = dict(
+    revision_origin="max",
+    revision_origin_id="max",
+    valid="min",
+    duration="max",
+    status="priority",
+)
+
+# A map of the choices in _BUILD_SUMMARY_CHOICE_MAP to functions checking
+# if the second (source) value should be kept over the first (target) one,
+# given that neither is None
+_BUILD_SUMMARY_CHOICE_FUNC_MAP = dict(
+    max=lambda target, source: source > target,
+    min=lambda target, source: source < target,
+    priority=lambda target, source:
+    io_schema.TEST_STATUS_PRIORITY.index(source) <
+    io_schema.TEST_STATUS_PRIORITY.index(target),
+)
+
+# A map of the choices in _BUILD_SUMMARY_CHOICE_MAP to functions generating
+# SQL conditions checking if the source value should be kept over the
+# target one
+_BUILD_SUMMARY_CHOICE_SQL_MAP = dict(
+    max=lambda target, source: f"{source} > {target}",
+    min=lambda target, source: f"{source} < {target}",
+    priority=lambda target, source:
+    f"{_priority_sql(source)} < {_priority_sql(target)}",
+)
+
+
+def _combine_build_summaries(target, source):
+    """
+    Combine a build summary with the summary of a separate part of the
+    build's data, in place, as build_summaries_combine_sql() would.
+
+    Args:
+        target: The build summary to update.
+        source: The build summary to add to it.
+    """
+    for name, value in source.items():
+        if value is None or name in ("origin", "origin_id"):
+            continue
+        choice = _BUILD_SUMMARY_CHOICE_MAP.get(name)
+        if target[name] is None:
+            target[name] = value
+        elif choice is None:
+            target[name] += value
+        elif _BUILD_SUMMARY_CHOICE_FUNC_MAP[choice](target[name], value):
+            target[name] = value
+
+
+def get_build_summaries(data):
+    """
+    Compute summaries of the builds in I/O data, and of the builds of the
+    tests in it, from the data alone, as build_summaries_sql() would, if
+    the database only contained that data.
+
+    Args:
+        data:   The I/O data to summarize, adhering to kcidb.io_schema.JSON.
+
+    Returns:
+        A list of build summaries: dictionaries with all the fields of the
+        "build_summaries" table, in the column order, and None for missing
+        values.
+    """
+    names = [
+        field.name
+        for field in db_schema.SUMMARY_TABLE_MAP["build_summaries"]
+    ]
+    count_names = [name for name in names if name.endswith("_count")]
+    summary_map = {}
+
+    def add(origin, origin_id, **values):
+        """Add the summary values of an object to its build's summary"""
+        summary = dict.fromkeys(names)
+        summary.update(origin=origin, origin_id=origin_id)
+        summary.update(dict.fromkeys(count_names, 0))
+        summary.update(values)
+        if (origin, origin_id) in summary_map:
+            _combine_build_summaries(summary_map[(origin, origin_id)],
+                                     summary)
+        else:
+            summary_map[(origin, origin_id)] = summary
+
+    for build in data.get("builds", []):
+        add(build["origin"], build["origin_id"],
+            revision_origin=build.get("revision_origin"),
+            revision_origin_id=build.get("revision_origin_id"),
+            valid=build.get("valid"),
+            duration=build.get("duration"))
+    for test in data.get("tests", []):
+        status = test.get("status")
+        values = dict(test_count=1, test_duration=test.get("duration"))
+        if status is not None:
+            values[f"{status.lower()}_count"] = 1
+        if test.get("waived"):
+            values["waived_count"] = 1
+        else:
+            values["status"] = status
+        add(test["build_origin"], test["build_origin_id"], **values)
+    return list(summary_map.values())
+
+
+def build_summaries_combine_sql(target, source):
+    """
+    Generate SQL expressions combining build summaries with the summaries
+    of separate parts of the same builds' data, e.g. the summaries of newly
+    added data (see get_build_summaries()), producing the summaries of all
+    the data.
+
+    Args:
+        target: The name of the table (or its alias) containing the
+                summaries to combine with.
+        source: The name of the table (or its alias) containing the
+                summaries to add.
+
+    Returns:
+        A list of tuples, each containing a name of a "build_summaries"
+        table field, except "origin" and "origin_id", and the SQL
+        expression computing its combined value, in the column order.
+    """
+    exprs = []
+    for field in db_schema.SUMMARY_TABLE_MAP["build_summaries"]:
+        if field.name in ("origin", "origin_id"):
+            continue
+        target_value = f"{target}.{field.name}"
+        source_value = f"{source}.{field.name}"
+        choice = _BUILD_SUMMARY_CHOICE_MAP.get(field.name)
+        if choice is None:
+            expr = f"COALESCE({target_value} + {source_value}, " \
+                f"{target_value}, {source_value})"
+        else:
+            source_kept = _BUILD_SUMMARY_CHOICE_SQL_MAP[choice](
+                target_value, source_value)
+            expr = f"CASE WHEN {target_value} IS NULL OR {source_kept} " \
+                f"THEN {source_value} ELSE {target_value} END"
+        exprs.append((field.name, expr))
+    return exprs
+
+
+def build_summaries_sql(keys_sql, build_conds=(), test_conds=()):
+    """
+    Generate an SQL query computing build summaries, in the column order
+    of the "build_summaries" table.
+
+    Args:
+        keys_sql:       An SQL query returning "origin" and "origin_id"
+                        columns of the builds to summarize, without
+                        duplicates.
+        build_conds:    Additional SQL conditions on the "builds" table
+                        rows to summarize, which must hold for all the
+                        rows of the summarized builds. E.g. constant
+                        filters limiting the data scanned by the query.
+        test_conds:     Additional SQL conditions on the "tests" table
+                        rows to summarize, same as build_conds.
+
+    Returns:
+        The SQL query string.
+    """
+    status_counts = ", ".join(
+        f"SUM(CASE WHEN tests.status = '{status}' THEN 1 ELSE 0 END) "
+        f"AS {status.lower()}_count"
+        for status in io_schema.TEST_STATUS_PRIORITY
+    )
+    return \
+        "WITH " \
+        f"summary_keys AS ({keys_sql}), " \
+        "build_data AS (" \
+        "SELECT builds.origin, builds.origin_id, " \
+        "MAX(builds.revision_origin) AS revision_origin, " \
+        "MAX(builds.revision_origin_id) AS revision_origin_id, " \
+        "MIN(builds.valid) AS valid, " \
+        "MAX(builds.duration) AS duration " \
+        "FROM builds INNER JOIN summary_keys " \
+        "ON " + " AND ".join((
+            "builds.origin = summary_keys.origin",
+            "builds.origin_id = summary_keys.origin_id",
+            *build_conds
+        )) + " " \
+        "GROUP BY builds.origin, builds.origin_id), " \
+        "test_data AS (" \
+        "SELECT tests.build_origin AS origin, " \
+        "tests.build_origin_id AS origin_id, " \
+        "COUNT(*) AS test_count, " \
+        f"{status_counts}, " \
+        "SUM(CASE WHEN tests.waived THEN 1 ELSE 0 END) AS waived_count, " \
+        "SUM(tests.duration) AS test_duration, " \
+        "MIN(CASE WHEN tests.waived THEN NULL " \
+        f"ELSE {_priority_sql('tests.status')} END) AS priority " \
+        "FROM tests INNER JOIN summary_keys " \
+        "ON " + " AND ".join((
+            "tests.build_origin = summary_keys.origin",
+            "tests.build_origin_id = summary_keys.origin_id",
+            *test_conds
+        )) + " " \
+        "GROUP BY tests.build_origin, tests.build_origin_id) " \
+        "SELECT summary_keys.origin AS origin, " \
+        "summary_keys.origin_id AS origin_id, " \
+        "build_data.revision_origin AS revision_origin, " \
+        "build_data.revision_origin_id AS revision_origin_id, " \
+        "build_data.valid AS valid, " \
+        "build_data.duration AS duration, " + \
+        "".join(
+            f"COALESCE(test_data.{name}, 0) AS {name}, "
+            for name in _test_summary_names()
+            if name.endswith("_count")
+        ) + \
+        "test_data.test_duration AS test_duration, " \
+        f"{_status_sql('test_data.priority')} AS status " \
+        "FROM summary_keys " \
+        "LEFT JOIN build_data " \
+        "ON summary_keys.origin = build_data.origin AND " \
+        "summary_keys.origin_id = build_data.origin_id " \
+        "LEFT JOIN test_data " \
+        "ON summary_keys.origin = test_data.origin AND " \
+        "summary_keys.origin_id = test_data.origin_id"
+
+
+def revision_summaries_sql(keys_sql):
+    """
+    Generate an SQL query computing revision summaries from the build
+    summaries of their builds, in the column order of the
+    "revision_summaries" table.
+
+    Args:
+        keys_sql:   An SQL query returning "origin" and "origin_id" columns
+                    of the revisions to summarize, without duplicates.
+
+    Returns:
+        The SQL query string.
+    """
+    return \
+        "WITH " \
+        f"summary_keys AS ({keys_sql}), " \
+        "build_data AS (" \
+        "SELECT build_summaries.revision_origin AS origin, " \
+        "build_summaries.revision_origin_id AS origin_id, " \
+        "COUNT(*) AS build_count, " \
+        "SUM(CASE WHEN build_summaries.valid THEN 1 ELSE 0 END) " \
+        "AS valid_build_count, " \
+        "SUM(build_summaries.duration) AS build_duration, " + \
+        "".join(
+            f"SUM(build_summaries.{name}) AS {name}, "
+            for name in _test_summary_names()
+            if name != "status"
+        ) + \
+        f"MIN({_priority_sql('build_summaries.status')}) AS priority " \
+        "FROM build_summaries INNER JOIN summary_keys " \
+        "ON build_summaries.revision_origin = summary_keys.origin AND " \
+        "build_summaries.revision_origin_id = summary_keys.origin_id " \
+        "GROUP BY build_summaries.revision_origin, " \
+        "build_summaries.revision_origin_id) " \
+        "SELECT summary_keys.origin AS origin, " \
+        "summary_keys.origin_id AS origin_id, " \
+        "COALESCE(build_data.build_count, 0) AS build_count, " \
+        "COALESCE(build_data.valid_build_count, 0) AS valid_build_count, " \
+        "build_data.build_duration AS build_duration, " + \
+        "".join(
+            f"COALESCE(build_data.{name}, 0) AS {name}, "
+            for name in _test_summary_names()
+            if name.endswith("_count")
+        ) + \
+        "build_data.test_duration AS test_duration, " \
+        f"{_status_sql('build_data.priority')} AS status " \
+        "FROM summary_keys " \
+        "LEFT JOIN build_data " \
+        "ON summary_keys.origin = build_data.origin AND " \
+        "summary_keys.origin_id = build_data.origin_id"
+
+
+def all_build_keys_sql(union):
+    """
+    Generate an SQL query returning "origin" and "origin_id" of all builds,
+    including the ones only referenced by tests.
+
+    Args:
+        union:  The SQL operator for a union without duplicates.
+
+    Returns:
+        The SQL query string.
+    """
+    return "SELECT origin, origin_id FROM builds " \
+        f"{union} " \
+        "SELECT build_origin AS origin, build_origin_id AS origin_id " \
+        "FROM tests"
+
+
+def all_revision_keys_sql(union):
+    """
+    Generate an SQL query returning "origin" and "origin_id" of all
+    revisions, including the ones only referenced by builds.
+
+    Args:
+        union:  The SQL operator for a union without duplicates.
+
+    Returns:
+        The SQL query string.
+    """
+    return "SELECT origin, origin_id FROM revisions " \
+        f"{union} " \
+        "SELECT revision_origin AS origin, revision_origin_id AS origin_id " \
+        "FROM builds"
+
+
+def linked_revision_keys_sql(build_keys_sql):
+    """
+    Generate an SQL query returning "origin" and "origin_id" of the
+    revisions of the specified builds, according to their summaries.
+
+    Args:
+        build_keys_sql: An SQL query returning "origin" and "origin_id"
+                        columns of the builds.
+
+    Returns:
+        The SQL query string.
+    """
+    return "SELECT build_summaries.revision_origin AS origin, " \
+        "build_summaries.revision_origin_id AS origin_id " \
+        f"FROM build_summaries INNER JOIN ({build_keys_sql}) AS build_keys " \
+        "ON build_summaries.origin = build_keys.origin AND " \
+        "build_summaries.origin_id = build_keys.origin_id " \
+        "WHERE build_summaries.revision_origin IS NOT NULL"
@@ -0,0 +1,390 @@
+"""
+Kernel CI backfill runner: imports history from a source split into
+shards (e.g. by branch, date range, or ObjectId range), fetching the
+shards in parallel processes, and submitting their data through one
+shared batching submitter, tracking each shard's progress in a state file
+"""
+
+import collections
+import logging
+import multiprocessing
+import queue
+from concurrent.futures import ProcessPoolExecutor
+from kcidb import db_schema
+from kcidb import io_schema
+from kcidb import misc
+
+# Module's logger
+LOGGER = logging.getLogger(__name__)
+
+# Default number of shards fetched in parallel
+JOBS = multiprocessing.cpu_count()
+
+# Default minimum number of objects submitted at once
+CHUNK_SIZE = 10000
+
+# Maximum number of the most recently seen revisions and builds a submitter
+# remembers, to drop them, if repeated
+KEYS_SIZE = 100000
+
+# Number of fetched pieces of data, per job, allowed to wait for submission,
+# before the fetching processes are blocked
+QUEUE_DEPTH = 4
+
+# Maximum number of seconds to wait for fetched data in one go
+POLL_INTERVAL = 1
+
+
+class Source:
+    """
+    An abstract source of I/O data to backfill, split into shards, which
+    can be fetched independently, in separate processes. Sources are sent
+    to the fetching processes by pickling, so they should only hold their
+    configuration, and open connections in fetch().
+    """
+
+    def get_shards(self, known):
+        """
+        Get the names of the shards to fetch.
+
+        Args:
+            known:  A list of names of the shards planned by previous runs
+                    (found in the state file), which the source could keep,
+                    so that their progress remains meaningful, e.g. if the
+                    shards are ranges computed from the data.
+
+        Returns:
+            A list of shard names.
+        """
+        raise NotImplementedError
+
+    def fetch(self, shard, progress):
+        """
+        Fetch the data of a shard, starting after the specified progress.
+
+        Args:
+            shard:      The name of the shard to fetch.
+            progress:   The JSON value describing the shard's progress, as
+                        returned by a previous call, or None to fetch the
+                        shard from the start.
+
+        Returns:
+            A generator returning (data, progress) tuples: the fetched I/O
+            data, adhering to kcidb.io_schema.JSON, and the JSON value of
+            the shard's progress once the data is submitted.
+        """
+        raise NotImplementedError
+
+
+def split_date_range(start, end, length):
+    """
+    Split a date range into consecutive ranges of a specified length,
+    leaving the last range open-ended, so objects added later fall into it.
+
+    Args:
+        start:  The datetime starting the range (inclusive).
+        end:    The datetime ending the range (exclusive).
+        length: The maximum length of each range (datetime.timedelta).
+
+    Returns:
+        A list of (start, end) tuples of the ranges' start (inclusive) and
+        end (exclusive) datetimes. The end of the last range is None.
+    """
+    assert start < end
+    assert length.total_seconds() > 0
+    ranges = []
+    while start + length < end:
+        ranges.append((start, start + length))
+        start += length
+    ranges.append((start, None))
+    return ranges
+
+
+def split_object_id_range(first, last, count):
+    """
+    Split a range of MongoDB ObjectIds into ranges of about the same size,
+    leaving the last range open-ended, so objects added later fall into it.
+    As ObjectIds start with their creation time, the ranges correspond to
+    periods of time.
+
+    Args:
+        first:  The hex string of the first ObjectId in the range.
+        last:   The hex string of the last ObjectId in the range.
+        count:  The maximum number of ranges to split into.
+
+    Returns:
+        A list of (low, high) tuples of hex strings of the ranges' low
+        (inclusive) and high (exclusive) ObjectIds. The high ObjectId of
+        the last range is None.
+    """
+    assert isinstance(count, int) and count > 0
+    low = int(first, 16)
+    high = int(last, 16)
+    assert low <= high
+    step = max((high - low) // count, 1)
+    bounds = sorted({
+        min(low + index * step, high) for index in range(count)
+    })
+    return [
+        (f"{bound:024x}",
+         f"{bounds[index + 1]:024x}" if index + 1 < len(bounds) else None)
+        for index, bound in enumerate(bounds)
+    ]
+
+
+class Submitter:
+    """
+    A batching submitter, merging the data of all shards into chunks,
+    dropping the revisions and builds submitted recently by the run,
+    submitting the chunks, and saving the progress of the shards whose data
+    was submitted.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, client, state, state_path=None,
+                 chunk_size=CHUNK_SIZE):
+        """
+        Initialize a submitter.
+
+        Args:
+            client:     The client (kcidb.Client) to submit the chunks with.
+            state:      A dictionary of shard names and their progress,
+                        updated after each submission.
+            state_path: The path to the file to save the state to after
+                        each submission, or None to not save it.
+            chunk_size: The minimum number of objects (revisions, builds,
+                        and tests together) to submit at once, except for
+                        the last submission.
+        """
+        assert isinstance(state, dict)
+        assert isinstance(chunk_size, int) and chunk_size > 0
+        self.client = client
+        self.state = state
+        self.state_path = state_path
+        self.chunk_size = chunk_size
+        # The chunk being collected: the I/O data, with a "progress"
+        # dictionary of shard names and their progress once the chunk is
+        # submitted, or None if there's no data collected
+        self.chunk = None
+        # An ordered dictionary with (obj_list_name, origin, origin_id)
+        # tuples of the revisions and builds submitted or added to the
+        # chunk, as keys, the least recently seen first, limited to
+        # KEYS_SIZE
+        self.keys = collections.OrderedDict()
+        # The number of objects submitted
+        self.total = 0
+
+    @property
+    def chunk_len(self):
+        """The number of objects in the chunk being collected"""
+        if self.chunk is None:
+            return 0
+        return sum(len(self.chunk.get(obj_list_name, []))
+                   for obj_list_name in db_schema.TABLE_MAP)
+
+    def add(self, shard, data, progress):
+        """
+        Add the validated data of a shard to the chunk, submitting it, if
+        it's full.
+
+        Args:
+            shard:      The name of the shard the data belongs to.
+            data:       The I/O data to add, adhering to
+                        kcidb.io_schema.JSON, already validated.
+            progress:   The JSON value of the shard's progress once the data
+                        is submitted.
+        """
+        if self.chunk is None:
+            self.chunk = dict(version=data["version"], progress={})
+        for obj_list_name in db_schema.TABLE_MAP:
+            for obj in data.get(obj_list_name, []):
+                if obj_list_name != "tests":
+                    key = (obj_list_name, obj["origin"], obj["origin_id"])
+                    if key in self.keys:
+                        self.keys.move_to_end(key)
+                        continue
+                    self.keys[key] = None
+                    if len(self.keys) > KEYS_SIZE:
+                        self.keys.popitem(last=False)
+                self.chunk.setdefault(obj_list_name, []).append(obj)
+        self.chunk["progress"][shard] = progress
+        if self.chunk_len >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Submit the chunk, if it has any objects, and save the progress of
+        the shards with data in it.
+        """
+        if self.chunk is None:
+            return
+        # Keep the chunk intact until it's submitted, so a failed
+        # submission can be retried, or at least doesn't lose the progress
+        chunk_len = self.chunk_len
+        if chunk_len:
+            self.client.submit(
+                {key: value for key, value in self.chunk.items()
+                 if key != "progress"},
+                validate=False
+            )
+            self.total += chunk_len
+            LOGGER.info("Submitted %u objects, %u in total",
+                        chunk_len, self.total)
+        progress = self.chunk["progress"]
+        self.chunk = None
+        self.state.update(progress)
+        if self.state_path is not None:
+            misc.json_save(self.state_path, self.state)
+
+
+def _fetch_shard(source, shard, progress, data_queue, stop_event):
+    """
+    Fetch and validate the data of a shard, and put it into a queue, in a
+    fetching process.
+
+    Args:
+        source:         The source (Source) to fetch from.
+        shard:          The name of the shard to fetch.
+        progress:       The JSON value of the shard's progress to start
+                        after, or None to start from the beginning.
+        data_queue:     The queue to put (shard, data, progress) tuples
+                        into.
+        stop_event:     The event signaling the fetching should be
+                        abandoned, when set.
+    """
+    for data, data_progress in source.fetch(shard, progress):
+        io_schema.validate(data)
+        while True:
+            try:
+                data_queue.put((shard, data, data_progress),
+                               timeout=POLL_INTERVAL)
+                break
+            except queue.Full:
+                if stop_event.is_set():
+                    return
+
+
+def _fetch_serially(source, shards, state, submitter):
+    """
+    Fetch the shards one after another, in this process, and add their
+    data to a submitter.
+
+    Args:
+        source:     The source (Source) to fetch the data from.
+        shards:     A list of names of the shards to fetch.
+        state:      A dictionary of shard names and their progress to
+                    start after.
+        submitter:  The submitter (Submitter) to add the data to.
+
+    Returns:
+        A dictionary of names of the failed shards and their exceptions.
+        Submission failures are not shard failures, and are raised.
+    """
+    errors = {}
+    for shard in shards:
+        data_iter = iter(source.fetch(shard, state[shard]))
+        while True:
+            try:
+                item = next(data_iter, None)
+                if item is None:
+                    break
+                data, progress = item
+                io_schema.validate(data)
+            except Exception as exc:  # pylint: disable=broad-except
+                LOGGER.error("Failed fetching shard %s: %s", shard, exc)
+                errors[shard] = exc
+                break
+            # Outside the "try", so submission errors aren't blamed on
+            # the shard
+            submitter.add(shard, data, progress)
+    return errors
+
+
+def _fetch_in_parallel(source, shards, state, submitter, jobs):
+    """
+    Fetch the shards in a pool of processes, and add their data to a
+    submitter, in this process.
+
+    Args:
+        source:     The source (Source) to fetch the data from.
+        shards:     A list of names of the shards to fetch.
+        state:      A dictionary of shard names and their progress to
+                    start after.
+        submitter:  The submitter (Submitter) to add the data to.
+        jobs:       The maximum number of shards to fetch in parallel.
+
+    Returns:
+        A dictionary of names of the failed shards and their exceptions.
+    """
+    errors = {}
+    with multiprocessing.Manager() as manager, \
+            ProcessPoolExecutor(max_workers=jobs) as executor:
+        data_queue = manager.Queue(maxsize=jobs * QUEUE_DEPTH)
+        stop_event = manager.Event()
+        future_shards = {
+            executor.submit(_fetch_shard, source, shard, state[shard],
+                            data_queue, stop_event): shard
+            for shard in shards
+        }
+        try:
+            while True:
+                # Check before waiting, so the data put by the finished
+                # processes is in the queue by then
+                done = all(future.done() for future in future_shards)
+                try:
+                    submitter.add(*data_queue.get(timeout=POLL_INTERVAL))
+                except queue.Empty:
+                    if done:
+                        break
+        finally:
+            stop_event.set()
+        for future, shard in future_shards.items():
+            exc = future.exception()
+            if exc is not None:
+                LOGGER.error("Failed fetching shard %s: %s", shard, exc)
+                errors[shard] = exc
+    return errors
+
+
+def run(source, client, state_path=None, jobs=JOBS, chunk_size=CHUNK_SIZE):
+    """
+    Backfill data from a source: fetch its shards, in parallel processes,
+    if more than one job is requested, and submit their data through one
+    batching submitter. Shards which failed don't stop the others.
+
+    Args:
+        source:     The source (Source) to fetch the data from.
+        client:     The client (kcidb.Client) to submit the data with.
+        state_path: The path to the JSON file storing the progress of each
+                    shard, to resume after, and to update after each
+                    submission, or None to start from scratch and not
+                    track the progress.
+        jobs:       The maximum number of shards to fetch in parallel.
+                    With one, the shards are fetched in this process.
+        chunk_size: The minimum number of objects (revisions, builds,
+                    and tests together) to submit at once.
+
+    Returns:
+        The number of submitted objects.
+
+    Raises:
+        `Exception` listing the failed shards, if any failed, after the
+            data of all the others is submitted.
+    """
+    assert isinstance(jobs, int) and jobs > 0
+    state = misc.json_load(state_path, {}) if state_path else {}
+    shards = source.get_shards(list(state))
+    for shard in shards:
+        state.setdefault(shard, None)
+    submitter = Submitter(client, state, state_path=state_path,
+                          chunk_size=chunk_size)
+    if jobs == 1:
+        errors = _fetch_serially(source, shards, state, submitter)
+    else:
+        errors = _fetch_in_parallel(source, shards, state, submitter, jobs)
+    submitter.flush()
+    if errors:
+        raise Exception("".join(
+            f"ERROR: shard {shard}: {exc}\n" for shard, exc in errors.items()
+        ))
+    return submitter.total
@@ -0,0 +1,737 @@
+"""Kernel CI database command-line tools"""
+
+import argparse
+import itertools
+import json
+import signal
+import sys
+import threading
+from importlib.util import find_spec
+from kcidb import backends
+from kcidb import columnar
+from kcidb import db_schema
+from kcidb import io_schema
+from kcidb import misc
+from kcidb import path_tree
+from kcidb import Client, SUBMIT_CHUNK_SIZE, QUERY_PAGE_SIZE, \
+    LOAD_CONCURRENCY
+
+# A map of kcidb-query output formats and the keyword arguments of the
+# JSON-writing functions producing them
+OUTPUT_FORMAT_MAP = dict(
+    pretty=dict(indent=4, sort_keys=True),
+    compact=dict(separators=(",", ":")),
+    ndjson=dict(separators=(",", ":")),
+)
+
+
+def _get_path_summaries(tests, path_prefix):
+    """
+    Summarize test runs of each build, for each node of their test path
+    tree at or below a path prefix.
+
+    Args:
+        tests:          An iterable of test runs, adhering to the schema of
+                        test runs in kcidb.io_schema.JSON.
+        path_prefix:    The normalized dot-separated path of the top node
+                        to summarize, empty for the root.
+
+    Returns:
+        A generator returning the summaries of the nodes, as returned by
+        kcidb.path_tree.PathTree.summary(), with the "build_origin" and
+        "build_origin_id" of their builds added, ordered by build.
+    """
+    trees = path_tree.from_tests_by_build(tests)
+    for (build_origin, build_origin_id), tree in sorted(trees.items()):
+        top = tree.get(path_prefix)
+        # Skip builds without test runs at or below the prefix
+        if top is None:
+            continue
+        for node in top.walk():
+            yield dict(build_origin=build_origin,
+                       build_origin_id=build_origin_id,
+                       **node.summary())
+
+
+def _query_since_state(client, since, state_file, **filters):
+    """
+    Query objects received by the database since a timestamp, or since the
+    watermark recorded in a state file, if it has one.
+
+    Args:
+        client:     The client (kcidb.Client) to query with.
+        since:      The timestamp (datetime) to query objects received at
+                    or after, if the state file has no watermark, or None
+                    to query from the beginning.
+        state_file: The path to the JSON state file with the watermark, or
+                    None to use the timestamp.
+        filters:    The filters to query with, as for Client.query_since().
+
+    Returns:
+        The new watermark, and the generator of the pages of the queried
+        data, as returned by Client.query_since().
+    """
+    watermark = since
+    if state_file is not None:
+        state = misc.json_load(state_file, {})
+        if "watermark" in state:
+            watermark = misc.parse_timestamp(state["watermark"])
+    return client.query_since(watermark, **filters)
+
+
+def query_main():
+    """Execute the kcidb-query command-line tool"""
+    description = 'kcidb-query - Query test results from kernelci.org database'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        '-d', '--dataset',
+        help='Dataset name, or sqlite:FILE for a local SQLite database',
+        required=True
+    )
+    parser.add_argument(
+        '-o', '--origin',
+        help='Only output objects submitted by this CI system'
+    )
+    parser.add_argument(
+        '-r', '--revision-id',
+        metavar='ID',
+        dest='revision_ids',
+        help='Only output the revision with this origin ID, and its builds '
+             'and tests. Can be repeated.',
+        action='append'
+    )
+    parser.add_argument(
+        '--discovered-after',
+        metavar='TIMESTAMP',
+        help='Only output revisions discovered at or after this ISO-8601 '
+             'time, and their builds and tests',
+        type=misc.parse_timestamp
+    )
+    parser.add_argument(
+        '--discovered-before',
+        metavar='TIMESTAMP',
+        help='Only output revisions discovered before this ISO-8601 time, '
+             'and their builds and tests',
+        type=misc.parse_timestamp
+    )
+    parser.add_argument(
+        '-p', '--path-prefix',
+        metavar='PATH',
+        help='Only output tests with this dot-separated path, '
+             'or with paths of nodes below it',
+        type=path_tree.normalize_path
+    )
+    parser.add_argument(
+        '--since',
+        metavar='TIMESTAMP',
+        help='Only output objects received by the database at or after this '
+             'ISO-8601 time, and not too recently to be reliably visible',
+        type=misc.parse_timestamp
+    )
+    parser.add_argument(
+        '--state-file',
+        metavar='FILE',
+        help='Only output objects received by the database since the '
+             'previous invocation with this state file, and record the '
+             'new watermark in it after the output is written. If the file '
+             'doesn\'t exist, start from --since, or from the beginning.'
+    )
+    parser.add_argument(
+        '--path-summary',
+        help='Instead of the data, output a JSON list of summaries of test '
+             'runs for each build, and each test path node at or below '
+             '--path-prefix: the numbers of test runs with each status, '
+             'the summary status, and the total duration',
+        action='store_true'
+    )
+    parser.add_argument(
+        '--page-size',
+        help=f'Maximum number of objects to retrieve at once '
+             f'(default: {QUERY_PAGE_SIZE})',
+        type=int,
+        default=QUERY_PAGE_SIZE
+    )
+    parser.add_argument(
+        '-f', '--output-format',
+        help='Output format: indented JSON with sorted keys ("pretty", '
+             'the default), JSON without whitespace ("compact"), or '
+             'newline-delimited JSON with one object per line, each in its '
+             'own I/O data document, or summary ("ndjson"), as accepted by '
+             '"kcidb-submit --ndjson"',
+        choices=OUTPUT_FORMAT_MAP.keys(),
+        default="pretty"
+    )
+    parser.add_argument(
+        '-z', '--compress',
+        help='Compress the output with gzip, or zstd (requires the '
+             '"zstandard" package)',
+        choices=misc.COMPRESSION_MAGIC_MAP.keys()
+    )
+    args = parser.parse_args()
+    if args.page_size <= 0:
+        parser.error("--page-size must be positive")
+    if args.compress == "zstd" and find_spec("zstandard") is None:
+        parser.error("--compress zstd requires the zstandard package")
+    client = Client(args.dataset)
+    filters = dict(origin=args.origin,
+                   revision_ids=args.revision_ids,
+                   discovered_after=args.discovered_after,
+                   discovered_before=args.discovered_before,
+                   path_prefix=args.path_prefix,
+                   page_size=args.page_size)
+    if args.path_summary:
+        filters["obj_list_names"] = ["tests"]
+    watermark = None
+    if args.since is None and args.state_file is None:
+        pages = client.query_iter(**filters)
+    else:
+        watermark, pages = _query_since_state(client, args.since,
+                                              args.state_file, **filters)
+    format_kwargs = OUTPUT_FORMAT_MAP[args.output_format]
+    sys.stdout.flush()
+    with misc.open_output(sys.stdout.buffer, args.compress) as output:
+        if args.path_summary:
+            summaries = _get_path_summaries(
+                (test for page in pages for test in page["tests"]),
+                args.path_prefix or ""
+            )
+            if args.output_format == "ndjson":
+                misc.json_dump_lines(summaries, output, **format_kwargs)
+            else:
+                json.dump(list(summaries), output, **format_kwargs)
+        elif args.output_format == "ndjson":
+            misc.json_dump_lines(
+                (
+                    {"version": page["version"], obj_list_name: [obj]}
+                    for page in pages
+                    for obj_list_name in db_schema.TABLE_MAP
+                    for obj in page.get(obj_list_name, [])
+                ),
+                output, **format_kwargs
+            )
+        else:
+            # Make sure version is output even if there are no pages
+            misc.json_dump_merged(
+                itertools.chain([dict(version="1")], pages),
+                output, **format_kwargs
+            )
+    # Only advance the watermark once the output is complete
+    if args.state_file is not None:
+        misc.json_save(args.state_file,
+                       dict(watermark=watermark.isoformat()))
+
+
+def export_main():
+    """Execute the kcidb-export command-line tool"""
+    description = 'kcidb-export - Export data from kernelci.org database ' \
+        'into Parquet or Arrow files'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        '-d', '--dataset',
+        help='Dataset name, or sqlite:FILE for a local SQLite database',
+        required=True
+    )
+    parser.add_argument(
+        '-f', '--format',
+        help='Format of the files to write: "parquet", or "arrow" for Arrow '
+             'IPC streams (default: parquet)',
+        choices=list(columnar.FILE_FORMAT_EXTENSIONS),
+        default="parquet"
+    )
+    parser.add_argument(
+        '-o', '--origin',
+        help='Only export objects submitted by this CI system'
+    )
+    parser.add_argument(
+        '-r', '--revision-id',
+        metavar='ID',
+        dest='revision_ids',
+        help='Only export the revision with this origin ID, and its builds '
+             'and tests. Can be repeated.',
+        action='append'
+    )
+    parser.add_argument(
+        '--page-size',
+        help=f'Maximum number of objects to retrieve at once '
+             f'(default: {QUERY_PAGE_SIZE})',
+        type=int,
+        default=QUERY_PAGE_SIZE
+    )
+    parser.add_argument(
+        'directory',
+        help='Directory to write the files to, one per table, '
+             'e.g. "tests.parquet"'
+    )
+    args = parser.parse_args()
+    if args.page_size <= 0:
+        parser.error("--page-size must be positive")
+    client = Client(args.dataset)
+    client.export_tables(args.directory, file_format=args.format,
+                         origin=args.origin, revision_ids=args.revision_ids,
+                         page_size=args.page_size)
+
+
+def import_main():
+    """Execute the kcidb-import command-line tool"""
+    description = 'kcidb-import - Import data into kernelci.org database ' \
+        'from Parquet or Arrow files'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        '-d', '--dataset',
+        help='Dataset name, or sqlite:FILE for a local SQLite database',
+        required=True
+    )
+    parser.add_argument(
+        '-f', '--format',
+        help='Format of the files to read: "parquet", or "arrow" for Arrow '
+             'IPC streams (default: parquet)',
+        choices=list(columnar.FILE_FORMAT_EXTENSIONS),
+        default="parquet"
+    )
+    parser.add_argument(
+        '--chunk-size',
+        help=f'Maximum number of objects to submit at once '
+             f'(default: {SUBMIT_CHUNK_SIZE})',
+        type=int,
+        default=SUBMIT_CHUNK_SIZE
+    )
+    parser.add_argument(
+        '--dedup',
+        help='Replace objects with the same origin and origin_id, '
+             'instead of adding duplicates, making re-import safe',
+        action='store_true'
+    )
+    parser.add_argument(
+        '--stream',
+        help='Make the data visible to queries within seconds, using '
+             'BigQuery streaming inserts instead of load jobs, '
+             'unless --dedup is specified. Repeated insertions of objects '
+             'with the same origin and origin_id within a few minutes are '
+             'dropped, on a best-effort basis.',
+        action='store_true'
+    )
+    parser.add_argument(
+        '--no-summaries',
+        help='Don\'t update the summaries of the affected revisions and '
+             'builds, e.g. to run "kcidb-summary --update" once afterwards',
+        dest='summarize',
+        action='store_false'
+    )
+    parser.add_argument(
+        'directory',
+        help='Directory to read the files from, written by kcidb-export'
+    )
+    args = parser.parse_args()
+    if args.chunk_size <= 0:
+        parser.error("--chunk-size must be positive")
+    client = Client(backends.from_spec(args.dataset, stream=args.stream),
+                    dedup=args.dedup, summarize=args.summarize)
+    client.import_tables(args.directory, file_format=args.format,
+                         chunk_size=args.chunk_size)
+
+
+def summary_main():
+    """Execute the kcidb-summary command-line tool"""
+    description = 'kcidb-summary - Output summaries of revisions and builds ' \
+        'from kernelci.org database'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        '-d', '--dataset',
+        help='Dataset name, or sqlite:FILE for a local SQLite database',
+        required=True
+    )
+    parser.add_argument(
+        '-o', '--origin',
+        help='Only output summaries of revisions and builds submitted by '
+             'this CI system'
+    )
+    parser.add_argument(
+        '-r', '--revision-id',
+        metavar='ID',
+        dest='revision_ids',
+        help='Only output summaries of the revision with this origin ID, '
+             'and its builds. Can be repeated.',
+        action='append'
+    )
+    parser.add_argument(
+        '--update',
+        help='Recompute all summaries from scratch before output',
+        action='store_true'
+    )
+    args = parser.parse_args()
+    client = Client(args.dataset)
+    if args.update:
+        client.update_summaries()
+    json.dump(client.query_summaries(origin=args.origin,
+                                     revision_ids=args.revision_ids),
+              sys.stdout, indent=4, sort_keys=True)
+
+
+def _submit_partial(client, data, jobs, quarantine):
+    """
+    Submit the valid objects of I/O data, reporting the errors in the
+    invalid ones to stderr, and optionally writing them to a file.
+
+    Args:
+        client:     The client (kcidb.Client) to submit with.
+        data:       The I/O data to submit, not validated.
+        jobs:       The number of processes to validate the objects in.
+        quarantine: The path to the file to write the invalid objects to,
+                    as JSON, or None to not write them.
+
+    Returns:
+        The exit status: 1 if any invalid objects were found, 0 otherwise.
+    """
+    invalid_data, errors = client.submit_valid(data, jobs=jobs)
+    for path, message in errors:
+        print(f"ERROR: {path}: {message}", file=sys.stderr)
+    if quarantine:
+        with open(quarantine, "w", encoding="utf-8") as quarantine_file:
+            json.dump(invalid_data, quarantine_file, indent=4, sort_keys=True)
+    return 1 if errors else 0
+
+
+def submit_main():
+    """Execute the kcidb-submit command-line tool"""
+    description = 'kcidb-submit - Submit test results to kernelci.org database'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        '-d', '--dataset',
+        help='Dataset name, or sqlite:FILE for a local SQLite database. '
+             'Required, unless --spool is specified.'
+    )
+    parser.add_argument(
+        '--spool',
+        metavar='DIR',
+        help='Validate and store the submission in a spool directory, for '
+             'kcidb-spool to submit later, instead of submitting it'
+    )
+    parser.add_argument(
+        '--ndjson',
+        help='Read newline-delimited JSON: one I/O data document per line, '
+             'submitted in chunks as it is read. Input compressed with gzip, '
+             'or zstd (requires the "zstandard" package) is decompressed '
+             'transparently in any mode.',
+        action='store_true'
+    )
+    parser.add_argument(
+        '--chunk-size',
+        help=f'Maximum number of objects to submit at once with --ndjson '
+             f'(default: {SUBMIT_CHUNK_SIZE})',
+        type=int,
+        default=SUBMIT_CHUNK_SIZE
+    )
+    parser.add_argument(
+        '--partial',
+        help='Validate each object separately, submit the valid ones, and '
+             'report all errors in the invalid ones. Exit with status 1 if '
+             'any were found.',
+        action='store_true'
+    )
+    parser.add_argument(
+        '--quarantine',
+        metavar='FILE',
+        help='With --partial, write the invalid objects to FILE as JSON',
+    )
+    parser.add_argument(
+        '-j', '--jobs',
+        help='With --partial, the number of processes to validate '
+             'objects in (default: 1)',
+        type=int,
+        default=1
+    )
+    parser.add_argument(
+        '--load-concurrency',
+        metavar='N',
+        help=f'Maximum number of tables to load data into concurrently '
+             f'(default: {LOAD_CONCURRENCY})',
+        type=int,
+        default=LOAD_CONCURRENCY
+    )
+    parser.add_argument(
+        '--dedup',
+        help='Replace objects with the same origin and origin_id, '
+             'both within the submission and in the database, '
+             'instead of adding duplicates, making resubmission safe',
+        action='store_true'
+    )
+    parser.add_argument(
+        '--stream',
+        help='Make the data visible to queries within seconds, using '
+             'BigQuery streaming inserts instead of load jobs, '
+             'unless --dedup is specified. Repeated insertions of objects '
+             'with the same origin and origin_id within a few minutes are '
+             'dropped, on a best-effort basis.',
+        action='store_true'
+    )
+    parser.add_argument(
+        '--no-summaries',
+        help='Don\'t update the summaries of the affected revisions and '
+             'builds, e.g. for a bulk load followed by "kcidb-summary '
+             '--update"',
+        dest='summarize',
+        action='store_false'
+    )
+    args = parser.parse_args()
+    if args.chunk_size <= 0:
+        parser.error("--chunk-size must be positive")
+    if args.jobs <= 0:
+        parser.error("--jobs must be positive")
+    if args.load_concurrency <= 0:
+        parser.error("--load-concurrency must be positive")
+    if args.ndjson and args.partial:
+        parser.error("--partial cannot be used with --ndjson")
+    if args.quarantine and not args.partial:
+        parser.error("--quarantine requires --partial")
+    if args.spool is None and args.dataset is None:
+        parser.error("--dataset is required, unless --spool is specified")
+    if args.spool is not None and args.partial:
+        parser.error("--partial cannot be used with --spool")
+    stdin = misc.open_input(sys.stdin.buffer)
+    if args.spool is not None:
+        # Only import the spool when it's used, to start faster
+        # pylint: disable=import-outside-toplevel
+        from kcidb import spool
+        submission_spool = spool.Spool(args.spool)
+        for data in misc.json_load_lines(stdin) if args.ndjson \
+                else [json.load(stdin)]:
+            submission_spool.put(data)
+        return 0
+    client = Client(backends.from_spec(args.dataset, stream=args.stream),
+                    load_concurrency=args.load_concurrency,
+                    dedup=args.dedup, summarize=args.summarize)
+    if args.partial:
+        return _submit_partial(client, json.load(stdin), args.jobs,
+                               args.quarantine)
+    if args.ndjson:
+        client.submit_stream(misc.json_load_lines(stdin),
+                             chunk_size=args.chunk_size)
+        return 0
+    data = json.load(stdin)
+    io_schema.validate(data)
+    client.submit(data, validate=False)
+    return 0
+
+
+def _parse_address(value):
+    """
+    Parse a network address argument.
+
+    Args:
+        value:  The "HOST:PORT" string to parse.
+
+    Returns:
+        The (host, port) tuple of the address.
+
+    Raises:
+        `argparse.ArgumentTypeError` if the address is invalid.
+    """
+    host, _, port = value.rpartition(":")
+    if not port.isdigit():
+        raise argparse.ArgumentTypeError("must be HOST:PORT")
+    return host, int(port)
+
+
+def spool_main():
+    """Execute the kcidb-spool command-line tool"""
+    # Only import the spool and logging when they're used, to start faster
+    # pylint: disable=import-outside-toplevel
+    import logging
+    from kcidb import spool
+    description = 'kcidb-spool - Submit spooled test results to ' \
+        'kernelci.org database in batches'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        '-d', '--dataset',
+        help='Dataset name, or sqlite:FILE for a local SQLite database',
+        required=True
+    )
+    parser.add_argument(
+        'directory',
+        help='The spool directory. Submissions are taken from its '
+             f'"{spool.INCOMING_DIR}" subdirectory, and invalid ones are '
+             f'moved to its "{spool.REJECTED_DIR}" subdirectory.'
+    )
+    parser.add_argument(
+        '-l', '--listen',
+        metavar='HOST:PORT',
+        help='Also accept submissions POSTed over HTTP at this address',
+        type=_parse_address
+    )
+    parser.add_argument(
+        '--batch-size',
+        metavar='N',
+        help=f'Number of objects to submit a batch at '
+             f'(default: {spool.BATCH_SIZE})',
+        type=int,
+        default=spool.BATCH_SIZE
+    )
+    parser.add_argument(
+        '--batch-age',
+        metavar='SECONDS',
+        help=f'Maximum time a submission waits for its batch to fill '
+             f'(default: {spool.BATCH_AGE})',
+        type=float,
+        default=spool.BATCH_AGE
+    )
+    parser.add_argument(
+        '--max-retry-delay',
+        metavar='SECONDS',
+        help=f'Maximum time to wait between retries of a failed batch, '
+             f'doubling from {spool.MIN_RETRY_DELAY} '
+             f'(default: {spool.MAX_RETRY_DELAY})',
+        type=float,
+        default=spool.MAX_RETRY_DELAY
+    )
+    parser.add_argument(
+        '--max-attempts',
+        metavar='N',
+        help=f'Number of attempts to submit a batch rejected by the '
+             f'database, before bisecting it to find the submissions which '
+             f'keep being rejected, and moving them to the '
+             f'"{spool.REJECTED_DIR}" subdirectory. Batches failing for other '
+             f'reasons, e.g. connection errors, are retried indefinitely '
+             f'(default: {spool.MAX_ATTEMPTS})',
+        type=int,
+        default=spool.MAX_ATTEMPTS
+    )
+    parser.add_argument(
+        '--once',
+        help='Submit all the spooled submissions and exit, '
+             'without retrying or waiting for new ones',
+        action='store_true'
+    )
+    parser.add_argument(
+        '--dedup',
+        help='Replace objects with the same origin and origin_id, '
+             'both within the batch and in the database, '
+             'instead of adding duplicates, making retries after '
+             'partially-failed submissions safe',
+        action='store_true'
+    )
+    parser.add_argument(
+        '--stream',
+        help='Make the data visible to queries within seconds, using '
+             'BigQuery streaming inserts instead of load jobs, '
+             'unless --dedup is specified. Repeated insertions of objects '
+             'with the same origin and origin_id within a few minutes are '
+             'dropped, on a best-effort basis.',
+        action='store_true'
+    )
+    parser.add_argument(
+        '--no-summaries',
+        help='Don\'t update the summaries of the affected revisions and '
+             'builds',
+        dest='summarize',
+        action='store_false'
+    )
+    args = parser.parse_args()
+    if args.batch_size <= 0:
+        parser.error("--batch-size must be positive")
+    if args.batch_age < 0:
+        parser.error("--batch-age must not be negative")
+    if args.max_retry_delay < spool.MIN_RETRY_DELAY:
+        parser.error(f"--max-retry-delay must be at least "
+                     f"{spool.MIN_RETRY_DELAY}")
+    if args.max_attempts <= 0:
+        parser.error("--max-attempts must be positive")
+    logging.basicConfig(level=logging.INFO,
+                        format="%(asctime)s %(levelname)s %(message)s")
+    client = Client(backends.from_spec(args.dataset, stream=args.stream),
+                    dedup=args.dedup, summarize=args.summarize)
+    submission_spool = spool.Spool(args.directory)
+    spooler = spool.Spooler(client, submission_spool,
+                            batch_size=args.batch_size,
+                            batch_age=args.batch_age,
+                            max_retry_delay=args.max_retry_delay)
+    if args.once:
+        spooler.run()
+        return 0
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    server = None
+    if args.listen is not None:
+        server = spool.serve(submission_spool, args.listen)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        spooler.run(stop_event, max_attempts=args.max_attempts)
+    except KeyboardInterrupt:
+        stop_event.set()
+        spooler.run(stop_event, max_attempts=args.max_attempts)
+    finally:
+        if server is not None:
+            server.shutdown()
+    return 0
+
+
+def init_main():
+    """Execute the kcidb-init command-line tool"""
+    description = 'kcidb-init - Initialize a kernelci.org database'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        '-d', '--dataset',
+        help='Dataset name, or sqlite:FILE for a local SQLite database',
+        required=True
+    )
+    args = parser.parse_args()
+    client = Client(args.dataset)
+    client.init()
+
+
+def cleanup_main():
+    """Execute the kcidb-cleanup command-line tool"""
+    description = 'kcidb-cleanup - Cleanup a kernelci.org database'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        '-d', '--dataset',
+        help='Dataset name, or sqlite:FILE for a local SQLite database',
+        required=True
+    )
+    args = parser.parse_args()
+    client = Client(args.dataset)
+    client.cleanup()
+
+
+def schema_main():
+    """Execute the kcidb-schema command-line tool"""
+    description = 'kcidb-schema - Output I/O JSON schema'
+    parser = argparse.ArgumentParser(description=description)
+    parser.parse_args()
+    json.dump(io_schema.JSON, sys.stdout, indent=4, sort_keys=True)
+
+
+# A map of kcidb subcommand names and the functions executing them
+SUBCOMMAND_MAP = dict(
+    init=init_main,
+    cleanup=cleanup_main,
+    schema=schema_main,
+    submit=submit_main,
+    spool=spool_main,
+    query=query_main,
+    summary=summary_main,
+    export=export_main,
+    **{"import": import_main},
+)
+
+
+def main():
+    """Execute the kcidb command-line tool, running a kcidb-* tool"""
+    description = 'kcidb - Run a kernelci.org database tool: ' \
+        '"kcidb COMMAND ARGS..." is the same as "kcidb-COMMAND ARGS..."'
+    parser = argparse.ArgumentParser(prog='kcidb', description=description)
+    parser.add_argument(
+        'command',
+        help='The tool to run: ' + ", ".join(SUBCOMMAND_MAP),
+        choices=SUBCOMMAND_MAP,
+        metavar='COMMAND'
+    )
+    parser.add_argument(
+        'args',
+        help='Arguments for the tool. Use "kcidb COMMAND --help" for '
+             'their description.',
+        nargs=argparse.REMAINDER,
+        metavar='ARGS'
+    )
+    args = parser.parse_args()
+    sys.argv = [f"kcidb-{args.command}", *args.args]
+    return SUBCOMMAND_MAP[args.command]()
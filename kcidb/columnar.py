@@ -0,0 +1,521 @@
+"""
+Kernel CI columnar data: a compact, in-memory representation of I/O data,
+with one array per field of the database tables, exportable to Apache Arrow
+and Parquet (requires the optional pyarrow package).
+"""
+
+import functools
+import json
+from array import array
+from datetime import datetime
+from kcidb import db_schema
+from kcidb import misc
+
+# Names of string fields with few distinct values, stored only once
+INTERNED_FIELD_NAMES = {
+    "origin", "revision_origin", "build_origin", "path", "status",
+    "architecture", "command", "git_repository_url", "git_repository_branch",
+}
+
+# The value representing a missing (None) boolean in a column
+_BOOL_NONE = -1
+
+
+def _is_encoded(field):
+    """
+    Check if values of a table field are stored JSON-encoded: the "misc"
+    fields, records, and repeated fields.
+    """
+    return field.name == "misc" or field.mode == "REPEATED" or \
+        field.field_type == "RECORD"
+
+
+def _get_decoder(field):
+    """
+    Create a function decoding a JSON-encoded stored value of a field
+    (or None) into the I/O value.
+    """
+    def decode(value):
+        if value is None:
+            return None
+        value = json.loads(value)
+        # Misc fields nested in records are stored encoded
+        if field.field_type == "RECORD":
+            value = _decode_record(field.fields, value) \
+                if field.mode != "REPEATED" else \
+                [_decode_record(field.fields, item) for item in value]
+        return value
+    return decode
+
+
+def _get_encoder(field):
+    """
+    Create a function encoding an I/O value of a field (or None) as stored:
+    as compact JSON.
+    """
+    def encode(value):
+        if value is None:
+            return None
+        if field.field_type == "RECORD":
+            # Encode nested misc fields too, to keep the decoding uniform
+            value = _encode_record(field.fields, value) \
+                if field.mode != "REPEATED" else \
+                [_encode_record(field.fields, item) for item in value]
+        return json.dumps(value, separators=(",", ":"))
+    return encode
+
+
+def _encode_number(value):
+    """Encode a number as stored, NaN meaning missing"""
+    return float("nan") if value is None else value
+
+
+def _encode_bool(value):
+    """Encode a boolean as stored"""
+    return _BOOL_NONE if value is None else int(value)
+
+
+def _decode_number(value):
+    """Decode a stored number, NaN meaning missing"""
+    # NaN is the only value not equal to itself
+    # pylint: disable=comparison-with-itself
+    return None if value != value else value
+
+
+def _decode_bool(value):
+    """Decode a stored boolean"""
+    return None if value == _BOOL_NONE else bool(value)
+
+
+def _as_is(value):
+    """Return a value as is"""
+    return value
+
+
+def _decode_record(fields, value):
+    """Decode nested "misc" fields of a record"""
+    for field in fields:
+        if field.name == "misc" and field.name in value:
+            value[field.name] = json.loads(value[field.name])
+    return value
+
+
+def _encode_record(fields, value):
+    """Encode nested "misc" fields of a record, without modifying it"""
+    for field in fields:
+        if field.name == "misc" and field.name in value:
+            value = dict(value)
+            value[field.name] = json.dumps(value[field.name],
+                                           separators=(",", ":"))
+    return value
+
+
+class Table:
+    """
+    A columnar table of objects of one type (an I/O object list), with one
+    array per field of the corresponding database table.
+
+    Numbers are stored in arrays of doubles (NaN for missing values),
+    booleans in arrays of bytes, strings in lists, with the strings of
+    INTERNED_FIELD_NAMES stored only once, and "misc" fields, records, and
+    repeated fields stored as compact JSON, decoded only when expanded.
+    """
+
+    def __init__(self, obj_list_name):
+        """
+        Initialize an empty columnar table.
+
+        Args:
+            obj_list_name:  The name of the object list (and the database
+                            table) the table stores.
+        """
+        assert obj_list_name in db_schema.TABLE_MAP
+        self.obj_list_name = obj_list_name
+        self.fields = [
+            field for field in db_schema.TABLE_MAP[obj_list_name]
+            if field.name != db_schema.INGESTION_TIME_FIELD_NAME
+        ]
+        # A map of field names to their columns
+        self.columns = {}
+        # Maps of field names to functions converting I/O values (or None)
+        # to stored values, and back
+        self.encoders = {}
+        self.decoders = {}
+        # A map of interned strings to themselves
+        self.strings = {}
+        for field in self.fields:
+            if _is_encoded(field):
+                column = []
+                encode = _get_encoder(field)
+                decode = _get_decoder(field)
+            elif field.field_type == "NUMERIC":
+                column = array("d")
+                encode = _encode_number
+                decode = _decode_number
+            elif field.field_type == "BOOL":
+                column = array("b")
+                encode = _encode_bool
+                decode = _decode_bool
+            elif field.name in INTERNED_FIELD_NAMES:
+                column = []
+                encode = self._intern
+                decode = _as_is
+            else:
+                column = []
+                encode = _as_is
+                decode = _as_is
+            self.columns[field.name] = column
+            self.encoders[field.name] = encode
+            self.decoders[field.name] = decode
+        self.length = 0
+
+    def _intern(self, value):
+        """Store only one copy of each string value (or None)"""
+        return None if value is None else self.strings.setdefault(value, value)
+
+    def __len__(self):
+        return self.length
+
+    def append(self, obj):
+        """
+        Append an object to the table.
+
+        Args:
+            obj:    The object to append, adhering to the schema of the
+                    object list in kcidb.io_schema.JSON.
+        """
+        for name, column in self.columns.items():
+            column.append(self.encoders[name](obj.get(name)))
+        self.length += 1
+
+    def extend(self, obj_list):
+        """
+        Append objects to the table.
+
+        Args:
+            obj_list:   An iterable of objects to append, adhering to the
+                        schema of the object list in kcidb.io_schema.JSON.
+        """
+        for obj in obj_list:
+            self.append(obj)
+
+    def get(self, field_name, index):
+        """
+        Retrieve the I/O value of a field of an object in the table,
+        decoding it, if necessary.
+
+        Args:
+            field_name: The name of the field.
+            index:      The index of the object in the table.
+
+        Returns:
+            The value, or None, if missing.
+        """
+        return self.decoders[field_name](self.columns[field_name][index])
+
+    def __iter__(self):
+        """
+        Expand the table into I/O objects, one at a time.
+
+        Returns:
+            A generator returning objects adhering to the schema of the
+            object list in kcidb.io_schema.JSON.
+        """
+        decoders = [
+            (field.name, self.columns[field.name], self.decoders[field.name])
+            for field in self.fields
+        ]
+        for index in range(self.length):
+            obj = {}
+            for name, column, decode in decoders:
+                value = decode(column[index])
+                if value is not None:
+                    obj[name] = value
+            yield obj
+
+    def to_arrow(self):
+        """
+        Export the table to an Apache Arrow table, with the schema returned
+        by arrow_schema(). Requires pyarrow.
+
+        Returns:
+            The pyarrow.Table.
+        """
+        # Only require pyarrow, if we're exporting
+        # pylint: disable=import-outside-toplevel
+        import pyarrow
+        schema = arrow_schema(self.obj_list_name)
+        arrays = []
+        for field in self.fields:
+            column = self.columns[field.name]
+            arrow_type = schema.field(field.name).type
+            if field.field_type == "NUMERIC":
+                arrays.append(pyarrow.array(column, type=arrow_type,
+                                            from_pandas=True))
+            elif _is_encoded(field) and field.name != "misc":
+                # Nested misc fields stay encoded, as in the schema
+                arrays.append(pyarrow.array(
+                    [None if value is None else json.loads(value)
+                     for value in column],
+                    type=arrow_type))
+            elif field.field_type == "BOOL":
+                arrays.append(pyarrow.array(
+                    [None if value == _BOOL_NONE else bool(value)
+                     for value in column],
+                    type=arrow_type))
+            elif field.field_type == "TIMESTAMP":
+                arrays.append(pyarrow.array(
+                    [None if value is None else misc.parse_timestamp(value)
+                     for value in column],
+                    type=arrow_type))
+            else:
+                arrays.append(pyarrow.array(column, type=arrow_type))
+        return pyarrow.Table.from_arrays(arrays, schema=schema)
+
+    def to_parquet(self, path):
+        """
+        Export the table to a Parquet file. Requires pyarrow.
+
+        Args:
+            path:   The path to the file to write.
+        """
+        # Only require pyarrow, if we're exporting
+        # pylint: disable=import-outside-toplevel
+        import pyarrow.parquet
+        pyarrow.parquet.write_table(self.to_arrow(), path)
+
+
+class Data:
+    """
+    Columnar I/O data: a columnar table per object list.
+    """
+
+    def __init__(self):
+        """Initialize empty columnar I/O data"""
+        # A map of object list names to their columnar tables
+        self.tables = {
+            obj_list_name: Table(obj_list_name)
+            for obj_list_name in db_schema.TABLE_MAP
+        }
+
+    def extend(self, data):
+        """
+        Add objects from I/O data.
+
+        Args:
+            data:   The JSON data to add objects from, adhering to the I/O
+                    schema (kcidb.io_schema.JSON).
+        """
+        for obj_list_name, table in self.tables.items():
+            table.extend(data.get(obj_list_name, []))
+
+    def to_json(self):
+        """
+        Expand the columnar data back into I/O data.
+
+        Returns:
+            The JSON data adhering to the I/O schema (kcidb.io_schema.JSON).
+        """
+        data = dict(version="1")
+        for obj_list_name, table in self.tables.items():
+            data[obj_list_name] = list(table)
+        return data
+
+
+def _arrow_type(field):
+    """
+    Get the Apache Arrow type of a table field. Requires pyarrow.
+
+    Args:
+        field:  The table field (kcidb.db_schema Field).
+
+    Returns:
+        The pyarrow.DataType.
+    """
+    # Only require pyarrow, if we're exporting
+    # pylint: disable=import-outside-toplevel
+    import pyarrow
+    if field.field_type == "RECORD":
+        arrow_type = pyarrow.struct([
+            pyarrow.field(subfield.name, _arrow_type(subfield))
+            for subfield in field.fields
+        ])
+    elif field.name == "misc" or field.field_type == "STRING":
+        arrow_type = pyarrow.string()
+    elif field.field_type == "TIMESTAMP":
+        arrow_type = pyarrow.timestamp("us", tz="UTC")
+    elif field.field_type == "NUMERIC":
+        arrow_type = pyarrow.float64()
+    elif field.field_type == "BOOL":
+        arrow_type = pyarrow.bool_()
+    elif field.field_type == "INTEGER":
+        arrow_type = pyarrow.int64()
+    else:
+        raise ValueError(f"Unsupported field type: {field.field_type}")
+    if field.mode == "REPEATED":
+        arrow_type = pyarrow.list_(arrow_type)
+    return arrow_type
+
+
+@functools.lru_cache(maxsize=None)
+def arrow_schema(table_name):
+    """
+    Get the Apache Arrow schema of a database table, derived from
+    kcidb.db_schema.TABLE_MAP, without the ingestion time. "Misc" fields
+    are JSON strings. The schema is only built once per table.
+    Requires pyarrow.
+
+    Args:
+        table_name: The name of the table.
+
+    Returns:
+        The pyarrow.Schema.
+    """
+    # Only require pyarrow, if we're exporting
+    # pylint: disable=import-outside-toplevel
+    import pyarrow
+    return pyarrow.schema([
+        pyarrow.field(field.name, _arrow_type(field))
+        for field in db_schema.TABLE_MAP[table_name]
+        if field.name != db_schema.INGESTION_TIME_FIELD_NAME
+    ])
+
+
+# A map of supported file formats to their file name extensions
+FILE_FORMAT_EXTENSIONS = dict(
+    parquet=".parquet",
+    arrow=".arrows",
+)
+
+
+def _repeat(convert):
+    """Create a function converting each item of a list with another one"""
+    return lambda value: [convert(item) for item in value]
+
+
+def _get_arrow_value_converter(field):
+    """
+    Create a function converting a non-None Python value of a table field
+    retrieved from Arrow data, to the I/O value.
+
+    Args:
+        field:  The table field (kcidb.db_schema Field).
+
+    Returns:
+        The conversion function, or None, if no conversion is needed.
+    """
+    if field.name == "misc":
+        convert = json.loads
+    elif field.field_type == "TIMESTAMP":
+        convert = datetime.isoformat
+    elif field.field_type == "NUMERIC":
+        convert = float
+    elif field.field_type == "RECORD":
+        convert = _get_arrow_obj_converter(field.fields)
+    else:
+        return None
+    if field.mode == "REPEATED":
+        convert = _repeat(convert)
+    return convert
+
+
+def _get_arrow_obj_converter(fields):
+    """
+    Create a function converting a dictionary retrieved from Arrow data
+    (a row, or a record), to the I/O object, omitting None values.
+
+    Args:
+        fields: The sequence of table fields of the dictionary.
+
+    Returns:
+        The conversion function.
+    """
+    converters = [
+        (field.name, _get_arrow_value_converter(field)) for field in fields
+    ]
+
+    def convert(value):
+        obj = {}
+        for name, convert_value in converters:
+            item = value.get(name)
+            if item is not None:
+                obj[name] = item if convert_value is None \
+                    else convert_value(item)
+        return obj
+    return convert
+
+
+def iter_arrow_objects(table_name, batch):
+    """
+    Convert Arrow data with the schema returned by arrow_schema() to I/O
+    objects, one at a time. Timestamps are converted to UTC.
+
+    Args:
+        table_name: The name of the table the data belongs to.
+        batch:      The pyarrow.RecordBatch, or pyarrow.Table to convert.
+
+    Returns:
+        A generator returning objects adhering to the schema of the object
+        list in kcidb.io_schema.JSON.
+    """
+    convert = _get_arrow_obj_converter([
+        field for field in db_schema.TABLE_MAP[table_name]
+        if field.name != db_schema.INGESTION_TIME_FIELD_NAME
+    ])
+    for row in batch.to_pylist():
+        yield convert(row)
+
+
+def open_writer(path, table_name, file_format):
+    """
+    Open a file for writing Arrow data of a table, with the schema returned
+    by arrow_schema(). Requires pyarrow.
+
+    Args:
+        path:           The path to the file to write.
+        table_name:     The name of the table to write the data of.
+        file_format:    The format of the file, one of
+                        FILE_FORMAT_EXTENSIONS: "parquet", or "arrow" (for
+                        Arrow IPC stream).
+
+    Returns:
+        The writer, with write_table() and close() methods, usable as a
+        context manager.
+    """
+    # Only require pyarrow, if we're exporting
+    # pylint: disable=import-outside-toplevel
+    import pyarrow.ipc
+    import pyarrow.parquet
+    assert file_format in FILE_FORMAT_EXTENSIONS
+    schema = arrow_schema(table_name)
+    if file_format == "parquet":
+        return pyarrow.parquet.ParquetWriter(path, schema)
+    return pyarrow.ipc.new_stream(path, schema)
+
+
+def iter_batches(path, file_format, batch_size):
+    """
+    Read Arrow data from a file, batch by batch. Requires pyarrow.
+
+    Args:
+        path:           The path to the file to read.
+        file_format:    The format of the file, one of
+                        FILE_FORMAT_EXTENSIONS: "parquet", or "arrow" (for
+                        Arrow IPC stream).
+        batch_size:     The maximum number of rows in a batch. Arrow IPC
+                        streams are returned in batches as written.
+
+    Returns:
+        A generator returning pyarrow.RecordBatch objects.
+    """
+    # Only require pyarrow, if we're importing
+    # pylint: disable=import-outside-toplevel
+    import pyarrow.ipc
+    import pyarrow.parquet
+    assert file_format in FILE_FORMAT_EXTENSIONS
+    if file_format == "parquet":
+        yield from pyarrow.parquet.ParquetFile(path).iter_batches(
+            batch_size=batch_size)
+    else:
+        with pyarrow.ipc.open_stream(path) as reader:
+            yield from reader
@@ -1,5 +1,47 @@
 """Database schema"""
-from google.cloud.bigquery.schema import SchemaField as Field
+from kcidb import io_schema
+
+
+class Field:
+    """
+    A description of a table field (column), with the same attributes as
+    google.cloud.bigquery.SchemaField, so it can be converted to one, but
+    without requiring the BigQuery library to be imported.
+    """
+
+    __slots__ = ("name", "field_type", "mode", "description", "fields")
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, name, field_type, mode="NULLABLE", description=None,
+                 fields=()):
+        """
+        Initialize a field description.
+
+        Args:
+            name:           The name of the field.
+            field_type:     The BigQuery type of the field, e.g. "STRING",
+                            or "RECORD".
+            mode:           The BigQuery mode of the field: "NULLABLE",
+                            "REQUIRED", or "REPEATED".
+            description:    The description of the field, or None.
+            fields:         A sequence of descriptions of the record
+                            fields, for the "RECORD" type.
+        """
+        assert isinstance(name, str)
+        assert isinstance(field_type, str)
+        assert mode in ("NULLABLE", "REQUIRED", "REPEATED")
+        assert description is None or isinstance(description, str)
+        assert all(isinstance(field, Field) for field in fields)
+        self.name = name
+        self.field_type = field_type
+        self.mode = mode
+        self.description = description
+        self.fields = tuple(fields)
+
+    def __repr__(self):
+        return f"Field({self.name!r}, {self.field_type!r}, " \
+            f"mode={self.mode!r})"
+
 
 # Resource record fields
 RESOURCE_FIELDS = (
@@ -20,7 +62,17 @@ ENVIRONMENT_FIELDS = (
     ),
 )
 
-# A map of table names to their BigQuery schemas
+# Name of the field storing the time an object was received by the database.
+# Present in every table, but not in the I/O data.
+INGESTION_TIME_FIELD_NAME = "ingestion_time"
+
+# Field storing the time an object was received by the database
+INGESTION_TIME_FIELD = Field(
+    INGESTION_TIME_FIELD_NAME, "TIMESTAMP",
+    description="The time the object was received by the database",
+)
+
+# A map of table names to their schemas: lists of field descriptions
 TABLE_MAP = dict(
     revisions=[
         Field(
@@ -104,6 +156,7 @@ TABLE_MAP = dict(
             description="Miscellaneous extra data about the revision "
                         "in JSON format",
         ),
+        INGESTION_TIME_FIELD,
     ],
     builds=[
         Field(
@@ -167,6 +220,7 @@ TABLE_MAP = dict(
             description="Miscellaneous extra data about the build "
                         "in JSON format",
         ),
+        INGESTION_TIME_FIELD,
     ],
     tests=[
         Field(
@@ -241,5 +295,95 @@ TABLE_MAP = dict(
             description="Miscellaneous extra data about the test run "
                         "in JSON format",
         ),
+        INGESTION_TIME_FIELD,
     ]
 )
+
+# Fields summarizing test runs, common to revision and build summaries
+TEST_SUMMARY_FIELDS = (
+    Field(
+        "test_count", "INTEGER",
+        description="The number of test runs",
+    ),
+    *(
+        Field(
+            f"{status.lower()}_count", "INTEGER",
+            description=f"The number of test runs with "
+                        f"the \"{status}\" status, including waived ones",
+        )
+        for status in io_schema.TEST_STATUS_PRIORITY
+    ),
+    Field(
+        "waived_count", "INTEGER",
+        description="The number of waived test runs",
+    ),
+    Field(
+        "test_duration", "NUMERIC",
+        description="The total number of seconds it took to run the tests",
+    ),
+    Field(
+        "status", "STRING",
+        description="The summary test status: the highest priority status "
+                    "of the test runs which are not waived, "
+                    "if there are any with a status",
+    ),
+)
+
+# A map of summary table names to their schemas. Summaries are updated
+# for the affected revisions and builds on each submission.
+SUMMARY_TABLE_MAP = dict(
+    revision_summaries=[
+        Field(
+            "origin", "STRING",
+            description="The name of the CI system which submitted "
+                        "the revision",
+        ),
+        Field(
+            "origin_id", "STRING",
+            description="Origin-unique revision ID",
+        ),
+        Field(
+            "build_count", "INTEGER",
+            description="The number of builds of the revision",
+        ),
+        Field(
+            "valid_build_count", "INTEGER",
+            description="The number of valid builds of the revision",
+        ),
+        Field(
+            "build_duration", "NUMERIC",
+            description="The total number of seconds it took to complete "
+                        "the builds",
+        ),
+        *TEST_SUMMARY_FIELDS,
+    ],
+    build_summaries=[
+        Field(
+            "origin", "STRING",
+            description="The name of the CI system which submitted "
+                        "the build",
+        ),
+        Field(
+            "origin_id", "STRING",
+            description="Origin-unique build ID",
+        ),
+        Field(
+            "revision_origin", "STRING",
+            description="The name of the CI system which submitted "
+                        "the built revision",
+        ),
+        Field(
+            "revision_origin_id", "STRING",
+            description="Origin-unique ID of the built revision",
+        ),
+        Field(
+            "valid", "BOOL",
+            description="True if the build is valid, False if not",
+        ),
+        Field(
+            "duration", "NUMERIC",
+            description="The number of seconds it took to complete the build",
+        ),
+        *TEST_SUMMARY_FIELDS,
+    ],
+)
@@ -0,0 +1,325 @@
+"""
+A fake, local, in-memory stand-in for the BigQuery client, supporting the
+operations used by kcidb.Client for managing tables and loading data, for
+testing and benchmarking without network access or credentials.
+
+Queries are not executed: they're recorded, along with their parameters,
+and return no rows. So, with the fake client, queries return no data, and
+deduplicating loads (merging a staging table into the target one) and
+summary updates don't modify the tables, but can be checked in the record.
+"""
+
+import copy
+import json
+import threading
+import time
+from datetime import datetime
+from decimal import Decimal
+from google.cloud import bigquery
+from google.api_core.exceptions import BadRequest, Conflict, NotFound
+
+
+def _to_json_row(value):
+    """
+    Convert a value read from a Parquet file to a JSON-compatible one,
+    as would be loaded from JSON, omitting None values of dictionaries.
+    """
+    if isinstance(value, dict):
+        return {
+            key: _to_json_row(item)
+            for key, item in value.items() if item is not None
+        }
+    if isinstance(value, list):
+        return [_to_json_row(item) for item in value]
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+class Job:
+    """
+    A fake load or query job. Query jobs return no rows, and the job serves
+    as its own (empty) result.
+    """
+
+    def __init__(self, description, latency, error):
+        """
+        Initialize a fake job.
+
+        Args:
+            description:    The description of the job's action, for the
+                            failure message, e.g. "loading into <TABLE>".
+            latency:        The number of seconds the job takes to complete.
+            error:          The error message to fail the job with,
+                            or None to succeed.
+        """
+        self.description = description
+        self.latency = latency
+        self.errors = None if error is None else [dict(message=error)]
+
+    def result(self, page_size=None):
+        """
+        Wait for the job to complete.
+
+        Args:
+            page_size:  The maximum number of rows in each page of the
+                        result (ignored, as there are no rows).
+
+        Returns:
+            The job itself.
+
+        Raises:
+            `google.api_core.exceptions.BadRequest` if the job has failed.
+        """
+        del page_size
+        time.sleep(self.latency)
+        if self.errors:
+            raise BadRequest(f"Failed {self.description}",
+                             errors=self.errors)
+        return self
+
+    @property
+    def pages(self):
+        """An iterator over the pages of the result's rows: none"""
+        return iter(())
+
+    def __iter__(self):
+        """Iterate over the result's rows: none"""
+        return iter(())
+
+
+class Client:
+    """A fake BigQuery client"""
+
+    def __init__(self, project="fake-project", load_latency=0,
+                 load_errors=None):
+        """
+        Initialize a fake BigQuery client.
+
+        Args:
+            project:        The name of the fake project containing the
+                            datasets.
+            load_latency:   The number of seconds each load job takes to
+                            complete.
+            load_errors:    A dictionary of names of tables and error
+                            messages to fail load jobs into those tables
+                            with, or None to never fail.
+        """
+        assert isinstance(project, str)
+        assert isinstance(load_latency, (int, float)) and load_latency >= 0
+        self.project = project
+        self.load_latency = load_latency
+        self.load_errors = load_errors or {}
+        # A list of (query, parameters) tuples of the queries started, with
+        # dictionaries of parameter names and their API representations
+        self.queries = []
+        # A dictionary of full table IDs and lists of their rows
+        self.tables = {}
+        # A dictionary of full table IDs and sets of IDs of rows inserted
+        # into them
+        self.insert_ids = {}
+        self.lock = threading.Lock()
+
+    def dataset(self, dataset_name):
+        """
+        Create a reference to a dataset.
+
+        Args:
+            dataset_name:   The name of the dataset.
+
+        Returns:
+            The dataset reference.
+        """
+        return bigquery.DatasetReference(self.project, dataset_name)
+
+    @staticmethod
+    def _table_id(table):
+        """Get the full ID of a table, table reference, or a table ID"""
+        if isinstance(table, str):
+            return table
+        return f"{table.project}.{table.dataset_id}.{table.table_id}"
+
+    def create_table(self, table):
+        """
+        Create a table.
+
+        Args:
+            table:  The table to create.
+
+        Raises:
+            `google.api_core.exceptions.Conflict` if the table exists.
+        """
+        table_id = self._table_id(table)
+        with self.lock:
+            if table_id in self.tables:
+                raise Conflict(f"Already exists: Table {table_id}")
+            self.tables[table_id] = []
+
+    def delete_table(self, table, not_found_ok=False):
+        """
+        Delete a table.
+
+        Args:
+            table:          The table, or a reference to the table to
+                            delete.
+            not_found_ok:   True if a missing table should be ignored.
+
+        Raises:
+            `google.api_core.exceptions.NotFound` if the table doesn't exist,
+                and not_found_ok is False.
+        """
+        table_id = self._table_id(table)
+        with self.lock:
+            if table_id in self.tables:
+                del self.tables[table_id]
+            elif not not_found_ok:
+                raise NotFound(f"Not found: Table {table_id}")
+
+    def load_table_from_json(self, json_rows, destination, job_config=None):
+        """
+        Load rows into a table. The rows are appended right away, unless the
+        table is configured to fail loading.
+
+        Args:
+            json_rows:      The list of rows (dictionaries) to load.
+            destination:    The table, or a reference to the table to load
+                            the rows into.
+            job_config:     The load job configuration (ignored).
+
+        Returns:
+            The (fake) load job.
+
+        Raises:
+            `google.api_core.exceptions.NotFound` if the table doesn't exist.
+        """
+        del job_config
+        table_id = self._table_id(destination)
+        table_name = table_id.rsplit(".", 1)[-1]
+        error = self.load_errors.get(table_name)
+        # Make sure the rows are serializable, as they would be uploaded
+        rows = json.loads(json.dumps(json_rows))
+        with self.lock:
+            if table_id not in self.tables:
+                raise NotFound(f"Not found: Table {table_id}")
+            if error is None:
+                self.tables[table_id].extend(rows)
+        return Job(f"loading into {table_id}", self.load_latency, error)
+
+    def load_table_from_file(self, file_obj, destination, job_config=None):
+        """
+        Load rows from a Parquet file into a table. The rows are appended
+        right away, unless the table is configured to fail loading.
+        Requires pyarrow.
+
+        Args:
+            file_obj:       The file object to read the Parquet data from.
+            destination:    The table, or a reference to the table to load
+                            the rows into.
+            job_config:     The load job configuration. Only the PARQUET
+                            source format is supported.
+
+        Returns:
+            The (fake) load job.
+
+        Raises:
+            `google.api_core.exceptions.NotFound` if the table doesn't exist.
+        """
+        # Only require pyarrow, if we're loading Parquet
+        # pylint: disable=import-outside-toplevel
+        import pyarrow.parquet
+        assert job_config is not None and \
+            job_config.source_format == bigquery.SourceFormat.PARQUET
+        rows = _to_json_row(pyarrow.parquet.read_table(file_obj).to_pylist())
+        return self.load_table_from_json(rows, destination)
+
+    def insert_rows_json(self, table, json_rows, row_ids=None,
+                         skip_invalid_rows=False):
+        """
+        Insert rows into a table, as with streaming inserts. The rows are
+        appended right away, unless the table is configured to fail
+        loading, in which case every row fails. Rows with IDs already
+        inserted into the table are dropped.
+
+        Args:
+            table:              The table, or a reference to the table to
+                                insert the rows into.
+            json_rows:          The list of rows (dictionaries) to insert.
+            row_ids:            A list of unique IDs of the rows, one per
+                                row, or None for no IDs.
+            skip_invalid_rows:  Ignored, as rows are only invalid when the
+                                table is configured to fail loading.
+
+        Returns:
+            A list of row errors: dictionaries with the "index" of the
+            row, and the list of its "errors", each with a "message".
+
+        Raises:
+            `google.api_core.exceptions.NotFound` if the table doesn't exist.
+        """
+        del skip_invalid_rows
+        assert row_ids is None or len(row_ids) == len(json_rows)
+        table_id = self._table_id(table)
+        table_name = table_id.rsplit(".", 1)[-1]
+        error = self.load_errors.get(table_name)
+        # Make sure the rows are serializable, as they would be uploaded
+        rows = json.loads(json.dumps(json_rows))
+        with self.lock:
+            if table_id not in self.tables:
+                raise NotFound(f"Not found: Table {table_id}")
+            if error is not None:
+                return [
+                    dict(index=index,
+                         errors=[dict(reason="invalid", location="",
+                                      message=error)])
+                    for index in range(len(rows))
+                ]
+            insert_ids = self.insert_ids.setdefault(table_id, set())
+            for index, row in enumerate(rows):
+                if row_ids is not None:
+                    if row_ids[index] in insert_ids:
+                        continue
+                    insert_ids.add(row_ids[index])
+                self.tables[table_id].append(row)
+        return []
+
+    def list_rows(self, table):
+        """
+        Retrieve all rows of a table.
+
+        Args:
+            table:  The table, or a reference to the table to retrieve the
+                    rows of.
+
+        Returns:
+            A list of the table's rows (dictionaries).
+
+        Raises:
+            `google.api_core.exceptions.NotFound` if the table doesn't exist.
+        """
+        table_id = self._table_id(table)
+        with self.lock:
+            if table_id not in self.tables:
+                raise NotFound(f"Not found: Table {table_id}")
+            return copy.deepcopy(self.tables[table_id])
+
+    def query(self, query, job_config=None):
+        """
+        Start a query job. The query is not executed, only recorded, along
+        with its parameters, and returns no rows.
+
+        Args:
+            query:      The SQL query string.
+            job_config: The query job configuration, or None.
+
+        Returns:
+            The (fake) query job, serving as its own empty result.
+        """
+        params = {
+            param.name: param.to_api_repr()
+            for param in (job_config.query_parameters if job_config else [])
+        }
+        with self.lock:
+            self.queries.append((query, params))
+        return Job("running a query", 0, None)
@@ -1,6 +1,8 @@
 """I/O schema"""
 
-import jsonschema
+import functools
+import numbers
+import re
 
 # JSON schema for a named remote resource
 JSON_RESOURCE = {
@@ -400,6 +402,10 @@ JSON_TEST = {
     ],
 }
 
+# Test statuses, from the highest priority to the lowest. The summary status
+# of a collection of test runs is the highest priority status among them.
+TEST_STATUS_PRIORITY = tuple(JSON_TEST["properties"]["status"]["enum"])
+
 # JSON schema for I/O data
 JSON = {
     "title": "kcidb",
@@ -475,12 +481,130 @@ JSON = {
 }
 
 
-def validate(io_data):
+def _compile(schema):
+    """
+    Compile a JSON schema into a function checking if an instance is valid,
+    without reporting the reason. Only supports the subset of JSON schema
+    used by the I/O schema, and is much faster than jsonschema for it.
+
+    Args:
+        schema: The JSON schema to compile.
+
+    Returns:
+        A function accepting an instance and returning True if it is valid
+        against the schema, and False if not.
+
+    Raises:
+        `NotImplementedError` if the schema uses an unsupported keyword.
+    """
+    # Annotations and keywords not asserted by jsonschema.validate()
+    ignored = {"title", "description", "examples", "format"}
+    unsupported = set(schema) - ignored - {
+        "type", "pattern", "enum", "properties", "additionalProperties",
+        "required", "items",
+    }
+    if unsupported:
+        raise NotImplementedError(
+            f"Unsupported schema keywords: {', '.join(sorted(unsupported))}"
+        )
+    checks = []
+    if "type" in schema:
+        type_check = dict(
+            string=lambda i: isinstance(i, str),
+            number=lambda i: isinstance(i, numbers.Number) and
+            not isinstance(i, bool),
+            boolean=lambda i: isinstance(i, bool),
+            object=lambda i: isinstance(i, dict),
+            array=lambda i: isinstance(i, list),
+        )[schema["type"]]
+        checks.append(type_check)
+    if "pattern" in schema:
+        search = re.compile(schema["pattern"]).search
+        checks.append(lambda i: not isinstance(i, str) or
+                      search(i) is not None)
+    if "enum" in schema:
+        enum = schema["enum"]
+        checks.append(lambda i: i in enum)
+    if "properties" in schema:
+        property_checks = {
+            name: _compile(property_schema)
+            for name, property_schema in schema["properties"].items()
+        }
+
+        def check_properties(instance):
+            if not isinstance(instance, dict):
+                return True
+            for name, value in instance.items():
+                check = property_checks.get(name)
+                if check is not None and not check(value):
+                    return False
+            return True
+        checks.append(check_properties)
+    if schema.get("additionalProperties", True) is not True:
+        assert schema["additionalProperties"] is False
+        names = frozenset(schema.get("properties", {}))
+        checks.append(lambda i: not isinstance(i, dict) or
+                      names.issuperset(i))
+    if "required" in schema:
+        required = schema["required"]
+        checks.append(lambda i: not isinstance(i, dict) or
+                      all(name in i for name in required))
+    if "items" in schema:
+        item_check = _compile(schema["items"])
+        checks.append(lambda i: not isinstance(i, list) or
+                      all(map(item_check, i)))
+    if len(checks) == 1:
+        return checks[0]
+
+    def check_all(instance):
+        for check in checks:
+            if not check(instance):
+                return False
+        return True
+    return check_all
+
+
+@functools.lru_cache(maxsize=None)
+def get_validator():
+    """
+    Get the validator for I/O data, created, and with the schema checked,
+    only once.
+
+    Returns:
+        The jsonschema validator for the I/O schema (JSON).
+    """
+    # Only import jsonschema when it's needed, as it's slow to import
+    # pylint: disable=import-outside-toplevel
+    import jsonschema
+    cls = jsonschema.validators.validator_for(JSON)
+    cls.check_schema(JSON)
+    return cls(JSON)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_is_valid():
+    """
+    Get the compiled function checking if I/O data is valid, compiled only
+    once.
+
+    Returns:
+        The function accepting I/O data and returning True if it is valid,
+        and False if not.
+    """
+    return _compile(JSON)
+
+
+def validate(io_data, fast=True):
     """
     Validate I/O data with its schema.
 
     Args:
         io_data:    The I/O data to validate.
+        fast:       True if the data should be checked with the fast,
+                    specialized validator first, and only passed to the
+                    (slow) jsonschema validator to find the error, if it's
+                    invalid. False if only the jsonschema validator should
+                    be used. The raised errors are the same either way.
 
     Return:
         The validated I/O data.
@@ -489,5 +613,181 @@ def validate(io_data):
         `jsonschema.exceptions.ValidationError` if the instance
             is invalid
     """
-    jsonschema.validate(instance=io_data, schema=JSON)
+    if not (fast and _get_is_valid()(io_data)):
+        # Only import jsonschema when it's needed, as it's slow to import
+        # pylint: disable=import-outside-toplevel
+        import jsonschema
+        error = jsonschema.exceptions.best_match(
+            get_validator().iter_errors(io_data)
+        )
+        if error is not None:
+            raise error
     return io_data
+
+
+# I/O schema without the schemas for the listed objects
+_JSON_SHALLOW = dict(JSON, properties={
+    name: {key: value for key, value in schema.items() if key != "items"}
+    for name, schema in JSON["properties"].items()
+})
+
+# Names of the I/O data object lists
+OBJ_LIST_NAMES = tuple(
+    name for name, schema in JSON["properties"].items() if "items" in schema
+)
+
+# Number of objects validated at once by a worker process
+_VALIDATE_CHUNK_SIZE = 1000
+
+
+@functools.lru_cache(maxsize=None)
+def _get_obj_validators(obj_list_name):
+    """
+    Get the (fast) compiled function and the jsonschema validator for
+    objects of the specified list, created only once.
+
+    Args:
+        obj_list_name:  The name of the object list.
+
+    Returns:
+        The function accepting an object and returning True if it's valid
+        and False if not, and the jsonschema validator for the object.
+    """
+    schema = JSON["properties"][obj_list_name]["items"]
+    return _compile(schema), get_validator().evolve(schema=schema)
+
+
+def _format_path(path):
+    """
+    Format a JSON path as a string.
+
+    Args:
+        path:   An iterable of path elements: property names and indexes.
+
+    Returns:
+        The path formatted as a string, e.g. "$.tests[5].status".
+    """
+    return "$" + "".join(
+        f"[{element}]" if isinstance(element, int) else f".{element}"
+        for element in path
+    )
+
+
+def _validate_obj_chunk(obj_list_name, start, objs):
+    """
+    Validate a chunk of objects from an object list.
+
+    Args:
+        obj_list_name:  The name of the object list.
+        start:          The index of the first object of the chunk within
+                        the list.
+        objs:           The list of objects to validate.
+
+    Returns:
+        A list of tuples, one per each invalid object, each containing the
+        object's index within the list, and a list of tuples, one per each
+        error, containing its JSON path and message.
+    """
+    is_valid, validator = _get_obj_validators(obj_list_name)
+    invalid = []
+    for index, obj in enumerate(objs, start):
+        if is_valid(obj):
+            continue
+        invalid.append((index, [
+            (
+                _format_path([obj_list_name, index, *error.absolute_path]),
+                error.message
+            )
+            for error in validator.iter_errors(obj)
+        ]))
+    return invalid
+
+
+def _find_invalid_objs(io_data, jobs):
+    """
+    Validate the objects of I/O data, chunk by chunk, optionally in
+    parallel processes, and collect the invalid ones.
+
+    Args:
+        io_data:    The I/O data with the objects to validate.
+        jobs:       The number of processes to validate objects in
+                    parallel, or 1 to validate them in the current process.
+
+    Returns:
+        A dictionary of object list names and sets of indexes of invalid
+        objects in them, and a list of errors found in the invalid objects,
+        each a tuple of the error's JSON path and its message.
+    """
+    chunks = [
+        (name, start, io_data[name][start:start + _VALIDATE_CHUNK_SIZE])
+        for name in OBJ_LIST_NAMES if name in io_data
+        for start in range(0, len(io_data[name]), _VALIDATE_CHUNK_SIZE)
+    ]
+    if jobs > 1 and len(chunks) > 1:
+        # Only import multiprocessing support when it's needed
+        # pylint: disable=import-outside-toplevel
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(_validate_obj_chunk, *zip(*chunks)))
+    else:
+        results = [_validate_obj_chunk(*chunk) for chunk in chunks]
+
+    invalid_indexes = {}
+    errors = []
+    for (name, _, _), invalid in zip(chunks, results):
+        for index, obj_errors in invalid:
+            invalid_indexes.setdefault(name, set()).add(index)
+            errors.extend(obj_errors)
+    return invalid_indexes, errors
+
+
+def validate_objects(io_data, jobs=1):
+    """
+    Validate I/O data with its schema, object by object, separating invalid
+    objects and collecting all their errors, instead of stopping at the
+    first error.
+
+    Args:
+        io_data:    The I/O data to validate.
+        jobs:       The number of processes to validate objects in
+                    parallel, or 1 to validate them in the current process.
+                    Only worth it for large amounts of data, as the objects
+                    have to be transferred to the processes.
+
+    Return:
+        A tuple of: the I/O data with only the valid objects left, the
+        I/O data with only the invalid objects left (not complying to the
+        schema), and a list of errors found in the invalid objects, each a
+        tuple of the error's JSON path (e.g. "$.tests[5].status") and its
+        message.
+
+    Raises:
+        `jsonschema.exceptions.ValidationError` if the data is invalid
+            outside the objects, e.g. if its version is unsupported.
+    """
+    assert isinstance(jobs, int) and jobs >= 1
+    # Only import jsonschema when it's needed, as it's slow to import
+    # pylint: disable=import-outside-toplevel
+    import jsonschema
+    error = jsonschema.exceptions.best_match(
+        get_validator().evolve(schema=_JSON_SHALLOW).iter_errors(io_data)
+    )
+    if error is not None:
+        raise error
+
+    invalid_indexes, errors = _find_invalid_objs(io_data, jobs)
+
+    valid_data = dict(io_data)
+    invalid_data = {
+        key: value for key, value in io_data.items()
+        if key not in OBJ_LIST_NAMES
+    }
+    for name, indexes in invalid_indexes.items():
+        valid_data[name] = [
+            obj for index, obj in enumerate(io_data[name])
+            if index not in indexes
+        ]
+        invalid_data[name] = [
+            io_data[name][index] for index in sorted(indexes)
+        ]
+    return valid_data, invalid_data, errors
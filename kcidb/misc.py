@@ -0,0 +1,307 @@
+"""Miscellaneous utilities"""
+
+import contextlib
+import gzip
+import io
+import itertools
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+
+# Supported stream compression formats, and their magic numbers
+COMPRESSION_MAGIC_MAP = dict(
+    gzip=b"\x1f\x8b",
+    zstd=b"\x28\xb5\x2f\xfd",
+)
+
+# Size of the chunks to read and write compressed streams in, bytes
+IO_CHUNK_SIZE = 1024 * 1024
+
+
+def json_load_lines(fp):
+    """
+    Load JSON values from a text file containing one value per line
+    (newline-delimited JSON), lazily, one at a time. Empty lines are skipped.
+
+    Args:
+        fp: The file object to read from.
+
+    Returns:
+        A generator returning loaded JSON values.
+
+    Raises:
+        `json.JSONDecodeError` if a line doesn't contain a valid JSON value,
+            with the line number noted in the message.
+    """
+    for line_number, line in enumerate(fp, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as exc:
+            raise json.JSONDecodeError(
+                f"Line {line_number}: {exc.msg}", exc.doc, exc.pos
+            ) from exc
+
+
+def parse_timestamp(string):
+    """
+    Parse an ISO-8601 timestamp string into a timezone-aware datetime
+    object. Timestamps without a timezone are assumed to be in UTC.
+    Suitable as an argparse argument type.
+
+    Args:
+        string: The timestamp string to parse.
+
+    Returns:
+        The parsed, timezone-aware datetime object.
+
+    Raises:
+        `ValueError` if the string is not a valid timestamp.
+    """
+    if string.endswith(("Z", "z")):
+        string = string[:-1] + "+00:00"
+    timestamp = datetime.fromisoformat(string)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp
+
+
+def open_input(fp):
+    """
+    Open a binary input stream for reading text, transparently
+    decompressing it, if it's compressed in one of the formats from
+    COMPRESSION_MAGIC_MAP, as detected by its magic number. Reading zstd
+    requires the "zstandard" package.
+
+    Args:
+        fp: The binary file object to read from, e.g. sys.stdin.buffer.
+
+    Returns:
+        The text file object reading the (decompressed) stream.
+    """
+    if not hasattr(fp, "peek"):
+        fp = io.BufferedReader(fp, IO_CHUNK_SIZE)
+    magic = fp.peek(4)
+    if magic.startswith(COMPRESSION_MAGIC_MAP["gzip"]):
+        fp = gzip.GzipFile(fileobj=fp, mode="rb")
+    elif magic.startswith(COMPRESSION_MAGIC_MAP["zstd"]):
+        # Only require zstandard, if we're reading zstd
+        # pylint: disable=import-outside-toplevel
+        import zstandard
+        fp = zstandard.ZstdDecompressor().stream_reader(
+            fp, read_size=IO_CHUNK_SIZE, read_across_frames=True
+        )
+    return io.TextIOWrapper(fp, encoding="utf-8")
+
+
+@contextlib.contextmanager
+def open_output(fp, compression=None):
+    """
+    Open a binary output stream for writing text, optionally compressing
+    it, as a context manager. The text is written to the stream in chunks,
+    and the compressed stream is finished on exit, leaving the binary
+    stream open. Writing zstd requires the "zstandard" package.
+
+    Args:
+        fp:             The binary file object to write to,
+                        e.g. sys.stdout.buffer.
+        compression:    The compression format to use, one of
+                        COMPRESSION_MAGIC_MAP keys, or None for no
+                        compression.
+
+    Returns:
+        The context manager returning the text file object writing to
+        the stream.
+    """
+    assert compression is None or compression in COMPRESSION_MAGIC_MAP
+    if compression == "gzip":
+        stream = gzip.GzipFile(fileobj=fp, mode="wb", compresslevel=6)
+    elif compression == "zstd":
+        # Only require zstandard, if we're writing zstd
+        # pylint: disable=import-outside-toplevel
+        import zstandard
+        stream = zstandard.ZstdCompressor().stream_writer(
+            fp, write_size=IO_CHUNK_SIZE, closefd=False
+        )
+    else:
+        stream = fp
+    text = io.TextIOWrapper(io.BufferedWriter(stream, IO_CHUNK_SIZE),
+                            encoding="utf-8")
+    try:
+        yield text
+    finally:
+        # Flush, but don't close the underlying streams
+        text.flush()
+        text.detach().detach()
+        if stream is not fp:
+            stream.close()
+        fp.flush()
+
+
+def json_dump_lines(values, fp, separators=None, sort_keys=False):
+    """
+    Write JSON values to a text file, one value per line
+    (newline-delimited JSON), as they are retrieved.
+
+    Args:
+        values:     An iterable returning the JSON values to write.
+        fp:         The file object to write to.
+        separators: The item and key separators to use,
+                    same as for json.dump().
+        sort_keys:  True if keys of objects should be sorted, false if not.
+    """
+    for value in values:
+        fp.write(json.dumps(value, separators=separators,
+                            sort_keys=sort_keys) + "\n")
+
+
+def _get_json_separators(indent, separators):
+    """
+    Get the strings json.dump() would separate and indent JSON with.
+
+    Args:
+        indent:     The indentation to use, same as for json.dump().
+        separators: The item and key separators to use,
+                    same as for json.dump().
+
+    Returns:
+        The item separator, the key separator, and the prefix of each
+        line: a newline followed by the indentation, or an empty string,
+        if the output is not indented.
+    """
+    if indent is None:
+        item_sep, key_sep, prefix = ", ", ": ", ""
+    else:
+        if isinstance(indent, int):
+            indent = " " * indent
+        item_sep, key_sep, prefix = ",", ": ", "\n" + indent
+    if separators is not None:
+        item_sep, key_sep = separators
+    return item_sep, key_sep, prefix
+
+
+def _json_dump_items(items, item_sep, item_prefix, dump_kwargs):
+    """
+    Format JSON list items, to be written into a list, without brackets.
+
+    Args:
+        items:          The list of items to format.
+        item_sep:       The item separator.
+        item_prefix:    The prefix of each item: a newline followed by the
+                        indentation of the items, or an empty string, if
+                        the output is not indented.
+        dump_kwargs:    The keyword arguments to format each item with,
+                        for json.dumps().
+
+    Returns:
+        The formatted items, separated, and each prefixed.
+    """
+    return item_sep.join(
+        item_prefix + json.dumps(item, **dump_kwargs).replace(
+            "\n", item_prefix or "\n"
+        )
+        for item in items
+    )
+
+
+def json_dump_merged(data_stream, fp, indent=None, sort_keys=False,
+                     separators=None):
+    """
+    Merge a stream of JSON objects and write the result to a file as it is
+    being merged, as a single JSON object, without keeping it in memory.
+    List values of the same keys are concatenated, and for other values,
+    only the first one encountered for each key is output. All lists for
+    each key must come together, not interleaved with lists for other keys.
+
+    Args:
+        data_stream:    An iterable returning the JSON objects to merge.
+        fp:             The file object to write the merged object to.
+        indent:         The indentation to use, same as for json.dump().
+        sort_keys:      True if keys of objects within the lists should be
+                        sorted, false if not.
+        separators:     The item and key separators to use,
+                        same as for json.dump().
+    """
+    item_sep, key_sep, prefix = _get_json_separators(indent, separators)
+    item_prefix = prefix + (" " * indent if isinstance(indent, int)
+                            else indent or "")
+    dump_kwargs = dict(indent=indent, separators=separators,
+                       sort_keys=sort_keys)
+    seen_keys = set()
+    list_key = None
+    list_empty = True
+    fp.write("{")
+    for key, value in itertools.chain.from_iterable(
+        data.items() for data in data_stream
+    ):
+        if key == list_key:
+            if value:
+                fp.write(("" if list_empty else item_sep) +
+                         _json_dump_items(value, item_sep, item_prefix,
+                                          dump_kwargs))
+                list_empty = False
+            continue
+        if key in seen_keys:
+            if isinstance(value, list) and value:
+                raise ValueError(
+                    f"List for key {key!r} is interleaved with others")
+            continue
+        if list_key is not None:
+            fp.write((prefix if not list_empty else "") + "]")
+        fp.write((item_sep if seen_keys else "") + prefix +
+                 json.dumps(key) + key_sep)
+        seen_keys.add(key)
+        if isinstance(value, list):
+            fp.write("[" + _json_dump_items(value, item_sep, item_prefix,
+                                            dump_kwargs))
+            list_key = key
+            list_empty = not value
+        else:
+            list_key = None
+            fp.write(json.dumps(value, **dump_kwargs))
+    if list_key is not None:
+        fp.write((prefix if not list_empty else "") + "]")
+    fp.write((prefix[:1] if seen_keys else "") + "}")
+
+
+def json_save(path, data):
+    """
+    Write JSON data to a file atomically: either the complete new data is
+    written, or the file is left unchanged.
+
+    Args:
+        path:   The path to the file to write.
+        data:   The JSON data to write.
+    """
+    dir_path = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=dir_path, prefix=".",
+                                    suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as tmp_file:
+            json.dump(data, tmp_file)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def json_load(path, default=None):
+    """
+    Read JSON data from a file, if it exists.
+
+    Args:
+        path:       The path to the file to read.
+        default:    The data to return if the file doesn't exist.
+
+    Returns:
+        The JSON data read from the file, or the default.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as json_file:
+            return json.load(json_file)
+    except FileNotFoundError:
+        return default
@@ -0,0 +1,196 @@
+"""
+Kernel CI test path tree: an in-memory index of test runs by their
+dot-separated paths, summarizing the test runs in each subtree
+"""
+
+from kcidb import io_schema
+
+# A map of test statuses to their priorities, zero being the highest
+_STATUS_PRIORITY_MAP = {
+    status: priority
+    for priority, status in enumerate(io_schema.TEST_STATUS_PRIORITY)
+}
+
+
+class PathTree:
+    """
+    A node of a test path tree, summarizing the test runs with its path,
+    and with paths of the nodes below it. The root node has the empty path.
+    """
+
+    __slots__ = ("path", "children", "test_count", "status_counts",
+                 "waived_count", "test_duration", "status")
+
+    def __init__(self, path=""):
+        """
+        Initialize an empty test path tree node.
+
+        Args:
+            path:   The dot-separated path of the node.
+        """
+        assert isinstance(path, str)
+        self.path = path
+        # A map of child names to child nodes
+        self.children = {}
+        self.test_count = 0
+        # A map of statuses to the numbers of test runs having them
+        self.status_counts = dict.fromkeys(io_schema.TEST_STATUS_PRIORITY, 0)
+        self.waived_count = 0
+        self.test_duration = None
+        # The highest priority status of the test runs which are not waived
+        self.status = None
+
+    def account(self, test):
+        """Account a test run in the summary of this node only"""
+        self.test_count += 1
+        status = test.get("status")
+        if status is not None:
+            self.status_counts[status] += 1
+        if test.get("waived"):
+            self.waived_count += 1
+        elif status is not None and (
+                self.status is None or
+                _STATUS_PRIORITY_MAP[status] <
+                _STATUS_PRIORITY_MAP[self.status]):
+            self.status = status
+        duration = test.get("duration")
+        if duration is not None:
+            self.test_duration = duration if self.test_duration is None \
+                else self.test_duration + duration
+
+    def add(self, test):
+        """
+        Add a test run to the tree, creating nodes for its path as needed,
+        and accounting it in the summaries of the nodes along the path.
+
+        Args:
+            test:   The test run to add, adhering to the schema of test runs
+                    in kcidb.io_schema.JSON. Tests without a path are
+                    accounted only in the root node. Empty names in the
+                    path are skipped, same as by normalize_path().
+        """
+        self.account(test)
+        node = self
+        path = test.get("path", "")
+        if path:
+            for name in path.split("."):
+                if not name:
+                    continue
+                child = node.children.get(name)
+                if child is None:
+                    child = PathTree(
+                        name if not node.path else node.path + "." + name)
+                    node.children[name] = child
+                node = child
+                node.account(test)
+
+    def get(self, path):
+        """
+        Find the node with the specified path, in time proportional to the
+        path's depth.
+
+        Args:
+            path:   The dot-separated path of the node to find, relative to
+                    this node. The empty string means this node. Empty
+                    names in the path are skipped.
+
+        Returns:
+            The found node, or None, if there were no tests with this path,
+            or paths of nodes below it.
+        """
+        assert isinstance(path, str)
+        node = self
+        if path:
+            for name in path.split("."):
+                if not name:
+                    continue
+                node = node.children.get(name)
+                if node is None:
+                    break
+        return node
+
+    def walk(self):
+        """
+        Iterate over this node and all the nodes below it, depth-first,
+        with children in the order of their names.
+
+        Returns:
+            A generator returning the nodes.
+        """
+        yield self
+        for name in sorted(self.children):
+            yield from self.children[name].walk()
+
+    def summary(self):
+        """
+        Summarize the test runs in the subtree.
+
+        Returns:
+            A dictionary with "path", and the same fields as
+            kcidb.db_schema.TEST_SUMMARY_FIELDS, omitting the ones
+            without values.
+        """
+        summary = dict(path=self.path, test_count=self.test_count)
+        for status, count in self.status_counts.items():
+            summary[f"{status.lower()}_count"] = count
+        summary["waived_count"] = self.waived_count
+        if self.test_duration is not None:
+            summary["test_duration"] = self.test_duration
+        if self.status is not None:
+            summary["status"] = self.status
+        return summary
+
+
+def normalize_path(path):
+    """
+    Normalize a dot-separated test path, removing empty names, e.g. left
+    by leading, trailing, or repeated dots.
+
+    Args:
+        path:   The test path to normalize.
+
+    Returns:
+        The normalized test path, empty for the root node.
+    """
+    assert isinstance(path, str)
+    return ".".join(name for name in path.split(".") if name)
+
+
+def from_tests(tests):
+    """
+    Build a test path tree from test runs.
+
+    Args:
+        tests:  An iterable of test runs, adhering to the schema of test
+                runs in kcidb.io_schema.JSON.
+
+    Returns:
+        The root node of the built tree.
+    """
+    tree = PathTree()
+    for test in tests:
+        tree.add(test)
+    return tree
+
+
+def from_tests_by_build(tests):
+    """
+    Build a test path tree for each build, from test runs.
+
+    Args:
+        tests:  An iterable of test runs, adhering to the schema of test
+                runs in kcidb.io_schema.JSON.
+
+    Returns:
+        A dictionary of (build_origin, build_origin_id) tuples and the
+        root nodes of the trees of their test runs.
+    """
+    trees = {}
+    for test in tests:
+        key = (test["build_origin"], test["build_origin_id"])
+        tree = trees.get(key)
+        if tree is None:
+            tree = PathTree()
+            trees[key] = tree
+        tree.add(test)
+    return trees
@@ -0,0 +1,449 @@
+"""
+Kernel CI submission spool: durable local storage for I/O data
+submissions, and a spooler submitting them to the database in batches,
+retrying on failures, and rejecting the submissions the database keeps
+rejecting
+"""
+
+import http.server
+import io
+import json
+import logging
+import os
+import random
+import time
+import uuid
+import kcidb
+from kcidb import db_schema
+from kcidb import io_schema
+from kcidb import misc
+
+# Module's logger
+LOGGER = logging.getLogger(__name__)
+
+# Name of the spool subdirectory holding the submissions to be submitted
+INCOMING_DIR = "incoming"
+
+# Name of the spool subdirectory holding the invalid submissions
+REJECTED_DIR = "rejected"
+
+# Default maximum number of objects in a batch
+BATCH_SIZE = 10000
+
+# Default maximum number of seconds a submission waits for its batch to fill
+BATCH_AGE = 60
+
+# Default minimum and maximum number of seconds to wait before retrying a
+# failed batch submission
+MIN_RETRY_DELAY = 1
+MAX_RETRY_DELAY = 600
+
+# Default number of attempts to submit a batch failing permanently, before
+# narrowing down the submission making it fail, by bisecting the batch
+MAX_ATTEMPTS = 10
+
+# Names of the exception classes, other than kcidb.SubmitError, signifying
+# the submitted data is at fault, and submitting it again would fail again.
+# Named, so their (slow) modules aren't imported just to check them.
+PERMANENT_ERRORS = {
+    "jsonschema.exceptions.ValidationError",
+    "google.api_core.exceptions.BadRequest",
+}
+
+# Maximum number of seconds to wait for new submissions in one go
+POLL_INTERVAL = 1
+
+
+def is_permanent(exc):
+    """
+    Check if an exception raised by a submission is permanent, that is if
+    the data is at fault, as opposed to e.g. a connection error, or a
+    database outage.
+
+    Args:
+        exc:    The exception to check.
+
+    Returns:
+        True if submitting the same data again would fail again, False if
+        it could succeed.
+    """
+    return isinstance(exc, kcidb.SubmitError) or any(
+        f"{cls.__module__}.{cls.__qualname__}" in PERMANENT_ERRORS
+        for cls in type(exc).__mro__
+    )
+
+
+class Spool:
+    """
+    A spool directory storing I/O data submissions durably, one file per
+    submission, in the "incoming" subdirectory, until they are submitted,
+    or moved to the "rejected" subdirectory, if invalid, or failing to be
+    submitted. Rejected submissions can be moved back to the "incoming"
+    subdirectory to have them submitted again. Other processes can
+    spool submissions by writing JSON files to a temporary file with a name
+    starting with a dot in the "incoming" subdirectory, and then renaming it
+    to a name ending with ".json".
+    """
+
+    def __init__(self, directory):
+        """
+        Initialize a spool, creating its directories, if they don't exist.
+
+        Args:
+            directory:  The path to the spool directory.
+        """
+        assert isinstance(directory, str)
+        self.directory = directory
+        self.incoming_dir = os.path.join(directory, INCOMING_DIR)
+        self.rejected_dir = os.path.join(directory, REJECTED_DIR)
+        os.makedirs(self.incoming_dir, exist_ok=True)
+        os.makedirs(self.rejected_dir, exist_ok=True)
+
+    def put(self, data):
+        """
+        Validate and store a submission durably.
+
+        Args:
+            data:   The JSON data to store, adhering to the I/O schema
+                    (kcidb.io_schema.JSON).
+
+        Returns:
+            The name of the stored submission.
+
+        Raises:
+            `jsonschema.exceptions.ValidationError` if the data is invalid.
+        """
+        io_schema.validate(data)
+        name = f"{time.time_ns():020d}-{uuid.uuid4().hex}.json"
+        misc.json_save(os.path.join(self.incoming_dir, name), data)
+        return name
+
+    def list(self):
+        """
+        List the stored submissions, in the order they were stored.
+
+        Returns:
+            A list of (name, mtime) tuples of the stored submissions: their
+            names and modification times in seconds since the epoch.
+        """
+        submissions = []
+        for name in os.listdir(self.incoming_dir):
+            if name.startswith(".") or not name.endswith(".json"):
+                continue
+            try:
+                mtime = os.stat(os.path.join(self.incoming_dir,
+                                             name)).st_mtime
+            except FileNotFoundError:
+                continue
+            submissions.append((name, mtime))
+        submissions.sort(key=lambda submission: (submission[1],
+                                                 submission[0]))
+        return submissions
+
+    def get(self, name):
+        """
+        Load a stored submission.
+
+        Args:
+            name:   The name of the submission to load.
+
+        Returns:
+            The loaded JSON data, not validated.
+
+        Raises:
+            `json.JSONDecodeError` if the submission is not valid JSON.
+        """
+        with open(os.path.join(self.incoming_dir, name), "r",
+                  encoding="utf-8") as json_file:
+            return json.load(json_file)
+
+    def remove(self, name):
+        """
+        Remove a submitted submission.
+
+        Args:
+            name:   The name of the submission to remove.
+        """
+        os.unlink(os.path.join(self.incoming_dir, name))
+
+    def reject(self, name):
+        """
+        Move an invalid, or a failing submission to the "rejected"
+        subdirectory.
+
+        Args:
+            name:   The name of the submission to reject.
+        """
+        os.replace(os.path.join(self.incoming_dir, name),
+                   os.path.join(self.rejected_dir, name))
+
+
+class Spooler:
+    """
+    A spooler, merging stored submissions into batches limited in size and
+    age, submitting them to the database, and removing them from the spool
+    once submitted, retrying failed submissions with exponential backoff,
+    and rejecting the submissions the database keeps rejecting.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, client, spool,
+                 batch_size=BATCH_SIZE, batch_age=BATCH_AGE,
+                 min_retry_delay=MIN_RETRY_DELAY,
+                 max_retry_delay=MAX_RETRY_DELAY):
+        """
+        Initialize a spooler.
+
+        Args:
+            client:             The client (kcidb.Client) to submit the
+                                batches with.
+            spool:              The spool (Spool) to take the submissions
+                                from.
+            batch_size:         The number of objects (revisions, builds,
+                                and tests together) to submit a batch at.
+                                Batches can be larger, if a single
+                                submission is.
+            batch_age:          The maximum number of seconds a submission
+                                waits for its batch to fill, before the
+                                batch is submitted anyway.
+            min_retry_delay:    The number of seconds to wait before the
+                                first retry of a failed batch submission.
+            max_retry_delay:    The maximum number of seconds to wait
+                                between retries, doubling the wait until
+                                it's reached.
+        """
+        assert isinstance(spool, Spool)
+        assert isinstance(batch_size, int) and batch_size > 0
+        assert isinstance(batch_age, (int, float)) and batch_age >= 0
+        assert isinstance(min_retry_delay, (int, float)) and \
+            min_retry_delay > 0
+        assert isinstance(max_retry_delay, (int, float)) and \
+            max_retry_delay >= min_retry_delay
+        self.client = client
+        self.spool = spool
+        self.batch_size = batch_size
+        self.batch_age = batch_age
+        self.min_retry_delay = min_retry_delay
+        self.max_retry_delay = max_retry_delay
+        # A dictionary of names of stored submissions, and the numbers of
+        # objects in them
+        self.sizes = {}
+
+    def _size(self, name):
+        """
+        Get the number of objects in a stored submission, rejecting it if
+        it's invalid.
+
+        Args:
+            name:   The name of the submission.
+
+        Returns:
+            The number of objects in the submission, or None if it was
+            rejected.
+        """
+        if name not in self.sizes:
+            try:
+                data = self.spool.get(name)
+                io_schema.validate(data)
+            except Exception as exc:  # pylint: disable=broad-except
+                LOGGER.error("Rejecting invalid submission %s: %s",
+                             name, exc)
+                self.spool.reject(name)
+                return None
+            self.sizes[name] = sum(
+                len(data.get(obj_list_name, []))
+                for obj_list_name in db_schema.TABLE_MAP
+            )
+        return self.sizes[name]
+
+    def collect(self, force=False):
+        """
+        Collect the next batch of stored submissions, if it's due: if it
+        has reached the batch size, or its oldest submission has reached
+        the batch age.
+
+        Args:
+            force:  True if the batch should be collected even if it's not
+                    due yet, False otherwise.
+
+        Returns:
+            A list of names of the submissions in the batch, or an empty
+            list, if the batch is not due, or there are no submissions.
+        """
+        names = []
+        batch_size = 0
+        oldest_mtime = None
+        full = False
+        for name, mtime in self.spool.list():
+            size = self._size(name)
+            if size is None:
+                continue
+            if names and batch_size + size > self.batch_size:
+                full = True
+                break
+            names.append(name)
+            batch_size += size
+            if oldest_mtime is None:
+                oldest_mtime = mtime
+            if batch_size >= self.batch_size:
+                full = True
+                break
+        if names and (force or full or
+                      time.time() - oldest_mtime >= self.batch_age):
+            return names
+        return []
+
+    def reject(self, names):
+        """
+        Handle a batch of stored submissions failing to be submitted too
+        many times: reject its submission, if it's the only one, or start
+        narrowing down the failing submissions in it otherwise.
+
+        Args:
+            names:  A list of names of the submissions in the failing batch.
+
+        Returns:
+            A list of names of the submissions to narrow down the failing
+            ones in, an empty list, if the submission was rejected.
+        """
+        assert names
+        if len(names) > 1:
+            LOGGER.error("Bisecting the failing batch of %u submissions",
+                         len(names))
+            return list(names)
+        LOGGER.error("Rejecting failing submission %s", names[0])
+        self.spool.reject(names[0])
+        del self.sizes[names[0]]
+        return []
+
+    def submit(self, names):
+        """
+        Merge stored submissions into a batch, submit it, and remove the
+        submissions from the spool.
+
+        Args:
+            names:  A list of names of the submissions to submit.
+        """
+        batch = dict(version="1")
+        for name in names:
+            data = self.spool.get(name)
+            batch["version"] = data["version"]
+            for obj_list_name in db_schema.TABLE_MAP:
+                if obj_list_name in data:
+                    batch.setdefault(obj_list_name, []). \
+                        extend(data[obj_list_name])
+        self.client.submit(batch, validate=False)
+        for name in names:
+            self.spool.remove(name)
+            del self.sizes[name]
+        LOGGER.info("Submitted %u objects from %u submissions",
+                    sum(len(batch.get(obj_list_name, []))
+                        for obj_list_name in db_schema.TABLE_MAP),
+                    len(names))
+
+    def run(self, stop_event=None, max_attempts=MAX_ATTEMPTS):
+        """
+        Submit the stored submissions in batches as they become due, until
+        stopped, retrying failed batches with exponential backoff. Once a
+        batch fails permanently (see is_permanent()) the maximum number of
+        attempts, bisect it: submit the first half of its submissions,
+        narrowing down to the half which keeps failing, until a single
+        failing submission is left, and reject it, so it doesn't block the
+        others. Batches failing otherwise, e.g. due to a database outage,
+        are retried indefinitely, and never rejected. Once stopped, try to
+        submit all the remaining submissions once.
+
+        Args:
+            stop_event:     A threading.Event to stop on, when set, or None
+                            to only stop when the spool is empty.
+            max_attempts:   The number of attempts to submit a batch failing
+                            permanently, before bisecting it, or rejecting
+                            its only submission.
+        """
+        assert isinstance(max_attempts, int) and max_attempts > 0
+        delay = self.min_retry_delay
+        attempts = 0
+        # Names of the submissions the failing one is being narrowed
+        # down in
+        suspects = []
+        while True:
+            stopping = stop_event is None or stop_event.is_set()
+            names = []
+            try:
+                if suspects:
+                    names = suspects[:max(len(suspects) // 2, 1)]
+                else:
+                    names = self.collect(force=stopping)
+                if names:
+                    self.submit(names)
+                    # The failing submission is among the rest, if any
+                    del suspects[:len(names)]
+                    delay = self.min_retry_delay
+                    attempts = 0
+                    continue
+            except Exception as exc:  # pylint: disable=broad-except
+                if stopping:
+                    raise
+                if is_permanent(exc):
+                    attempts += 1
+                    if names and attempts >= max_attempts:
+                        suspects = self.reject(names)
+                        attempts = 0
+                LOGGER.error("Failed submitting a batch, retrying in %.1fs: "
+                             "%s", delay, exc)
+                # Wait with jitter, so multiple spoolers don't retry in sync
+                stop_event.wait(delay * random.uniform(0.5, 1))
+                delay = min(delay * 2, self.max_retry_delay)
+                continue
+            if stopping:
+                break
+            stop_event.wait(POLL_INTERVAL)
+
+
+class _RequestHandler(http.server.BaseHTTPRequestHandler):
+    """HTTP request handler spooling POSTed submissions"""
+
+    # pylint: disable=invalid-name
+    def do_POST(self):
+        """Spool a submission from the request body"""
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            data = json.load(misc.open_input(
+                io.BytesIO(self.rfile.read(length))
+            ))
+            name = self.server.spool.put(data)
+        except Exception as exc:  # pylint: disable=broad-except
+            self.send_error(400, explain=str(exc))
+            return
+        body = json.dumps(dict(name=name)).encode()
+        self.send_response(202)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # pylint: disable=redefined-builtin
+        LOGGER.info("%s: %s", self.address_string(), format % args)
+
+
+def serve(spool, address):
+    """
+    Create an HTTP server accepting submissions POSTed to any path, as JSON
+    adhering to the I/O schema (kcidb.io_schema.JSON), optionally compressed
+    with gzip or zstd, and storing them in a spool. Responds with status 202
+    and a JSON object with the stored submission's "name", or with status
+    400, if the submission is invalid. Call serve_forever() on the returned
+    server to start serving.
+
+    Args:
+        spool:      The spool (Spool) to store the submissions in.
+        address:    The (host, port) tuple of the address to listen on.
+
+    Returns:
+        The created server (http.server.ThreadingHTTPServer).
+    """
+    assert isinstance(spool, Spool)
+    server = http.server.ThreadingHTTPServer(address, _RequestHandler)
+    server.spool = spool
+    return server
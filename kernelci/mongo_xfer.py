@@ -0,0 +1,528 @@
+#!/usr/bin/env python3
+"""
+Transfer KernelCI test data from a MongoDB database (e.g. a local copy of
+the KernelCI backend's database) to the Kernel CI database, in bulk
+"""
+
+import argparse
+import logging
+import re
+import sys
+from datetime import timezone
+import pymongo
+from bson.objectid import ObjectId
+import kcidb
+from kcidb import backfill
+
+# Module's logger
+LOGGER = logging.getLogger(__name__)
+
+# The origin of the transferred objects
+ORIGIN = "kernelci"
+
+# Default MongoDB database name
+DATABASE = "kernel-ci"
+
+# Default number of test groups to transfer in one go, and the cursor batch
+# size to retrieve them with
+BATCH_SIZE = 1000
+
+# Maximum number of IDs to look up with one "$in" query
+LOOKUP_SIZE = 10000
+
+# Fields of test groups needed for the transfer
+TEST_GROUP_PROJECTION = dict.fromkeys(
+    ("name", "build_id", "test_cases", "lab_name", "board",
+     "board_instance", "boot_log"),
+    True
+)
+
+# Fields of test cases needed for the transfer
+TEST_CASE_PROJECTION = dict.fromkeys(
+    ("name", "status", "created_on", "time"),
+    True
+)
+
+# Build fields copied to the "misc" of the transferred builds, if present
+BUILD_MISC_FIELDS = (
+    "compiler", "compiler_version", "cross_compile", "defconfig_full",
+    "kernel_version", "kernel_config", "kconfig_fragments", "kernel_image",
+    "kernel_image_size", "vmlinux_bss_size", "vmlinux_data_size",
+    "vmlinux_file_size", "vmlinux_text_size", "modules_size", "errors",
+    "warnings",
+)
+
+# Fields of builds needed for the transfer
+BUILD_PROJECTION = dict.fromkeys(
+    ("job", "git_branch", "git_describe", "git_url", "git_commit", "arch",
+     "defconfig_full", "build_environment", "status", "build_time",
+     "created_on") + BUILD_MISC_FIELDS,
+    True
+)
+
+# Build fields making up the revision ID, without which builds are skipped
+REVISION_ID_FIELDS = ("job", "git_branch", "git_describe")
+
+# A map of KernelCI test case statuses and kcidb test statuses
+STATUS_MAP = dict(PASS="PASS", FAIL="FAIL", SKIP="SKIP")
+
+
+def format_time(value):
+    """
+    Format a datetime retrieved from MongoDB as an ISO-8601 string.
+
+    Args:
+        value:  The datetime to format. Naive datetimes are assumed to be
+                in UTC, as MongoDB stores them.
+
+    Returns:
+        The formatted datetime string.
+    """
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.isoformat()
+
+
+def get_revision_id(build):
+    """
+    Get the kcidb revision ID of a KernelCI build.
+
+    Args:
+        build:  The KernelCI build document.
+
+    Returns:
+        The revision ID: the build's tree, branch, and "git describe"
+        output, separated by slashes, or None if the build is missing any
+        of them.
+    """
+    values = [build.get(field) for field in REVISION_ID_FIELDS]
+    if not all(values):
+        return None
+    return "/".join(str(value) for value in values)
+
+
+def transform_revision(build):
+    """
+    Transform a KernelCI build into the kcidb revision it was built from.
+
+    Args:
+        build:  The KernelCI build document, with a revision ID (see
+                get_revision_id()).
+
+    Returns:
+        The kcidb revision.
+    """
+    revision = dict(
+        origin=ORIGIN,
+        origin_id=get_revision_id(build),
+        git_repository_branch=build["git_branch"],
+        git_repository_commit_name=build["git_describe"],
+    )
+    if build.get("git_url"):
+        revision["git_repository_url"] = build["git_url"]
+    if build.get("git_commit"):
+        revision["git_repository_commit_hash"] = build["git_commit"]
+    return revision
+
+
+def transform_build(build):
+    """
+    Transform a KernelCI build into a kcidb build.
+
+    Args:
+        build:  The KernelCI build document, with a revision ID (see
+                get_revision_id()).
+
+    Returns:
+        The kcidb build.
+    """
+    kci_build = dict(
+        origin=ORIGIN,
+        origin_id=str(build["_id"]),
+        revision_origin=ORIGIN,
+        revision_origin_id=get_revision_id(build),
+        description="/".join(
+            str(build.get(key, "")) for key in
+            ("arch", "defconfig_full", "build_environment")
+        ),
+        valid=build.get("status") == "PASS",
+        misc={key: build[key] for key in BUILD_MISC_FIELDS
+              if build.get(key) is not None},
+    )
+    if build.get("arch"):
+        kci_build["architecture"] = re.sub(r"[^a-z0-9_]", "_",
+                                           build["arch"].lower())
+    if build.get("build_time") is not None:
+        kci_build["duration"] = float(build["build_time"])
+    if build.get("created_on") is not None:
+        kci_build["start_time"] = format_time(build["created_on"])
+    return kci_build
+
+
+def transform_test(test_case, test_group):
+    """
+    Transform a KernelCI test case into a kcidb test.
+
+    Args:
+        test_case:  The KernelCI test case document.
+        test_group: The KernelCI test group document the case belongs to.
+
+    Returns:
+        The kcidb test.
+    """
+    test = dict(
+        build_origin=ORIGIN,
+        build_origin_id=str(test_group["build_id"]),
+        origin=ORIGIN,
+        origin_id=str(test_case["_id"]),
+        description=f"{test_group['name']}/{test_case['name']}",
+        path=re.sub(r"[^.a-zA-Z0-9_-]", "_",
+                    f"{test_group['name']}.{test_case['name']}"),
+        status=STATUS_MAP.get(str(test_case.get("status")).upper(),
+                              "ERROR"),
+        misc={key: test_group[key]
+              for key in ("lab_name", "board", "board_instance", "boot_log")
+              if test_group.get(key) is not None},
+    )
+    if test_group.get("board"):
+        test["environment"] = dict(description=test_group["board"])
+    if test_case.get("created_on") is not None:
+        test["start_time"] = format_time(test_case["created_on"])
+    if isinstance(test_case.get("time"), (int, float)):
+        test["duration"] = float(test_case["time"])
+    return test
+
+
+def find_by_ids(collection, ids, projection):
+    """
+    Retrieve documents by their IDs, with a "$in" query per LOOKUP_SIZE
+    IDs, instead of a query per ID.
+
+    Args:
+        collection: The collection to retrieve the documents from.
+        ids:        A list of the document IDs.
+        projection: The projection specifying the fields to retrieve.
+
+    Returns:
+        A generator returning the retrieved documents, in no particular
+        order.
+    """
+    for start in range(0, len(ids), LOOKUP_SIZE):
+        yield from collection.find(
+            {"_id": {"$in": ids[start:start + LOOKUP_SIZE]}},
+            projection, batch_size=LOOKUP_SIZE
+        )
+
+
+# pylint: disable=too-many-arguments
+def iter_test_group_batches(db, low=None, high=None, after=None,
+                            batch_size=BATCH_SIZE):
+    """
+    Retrieve test groups in an ObjectId range, in batches, in the order of
+    their IDs.
+
+    Args:
+        db:         The KernelCI MongoDB database.
+        low:        The lowest ObjectId of the test groups to retrieve
+                    (inclusive), or None for no lower bound.
+        high:       The highest ObjectId of the test groups to retrieve
+                    (exclusive), or None for no upper bound.
+        after:      The ObjectId of the test group to start after, or None
+                    to start from the lowest one.
+        batch_size: The maximum number of test groups in a batch.
+
+    Returns:
+        A generator returning lists of test group documents.
+    """
+    # Skip the top-level LAVA groups, only holding sub-groups
+    query = {"name": {"$ne": "lava"}}
+    id_query = {}
+    if low is not None:
+        id_query["$gte"] = low
+    if high is not None:
+        id_query["$lt"] = high
+    if after is not None:
+        id_query["$gt"] = after
+    if id_query:
+        query["_id"] = id_query
+    batch = []
+    for test_group in db["test_group"].find(
+            query, TEST_GROUP_PROJECTION,
+            sort=[("_id", pymongo.ASCENDING)], batch_size=batch_size):
+        batch.append(test_group)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def lookup_builds(db, test_groups, build_ids):
+    """
+    Look up the builds of test groups not looked up before, in bulk,
+    skipping and logging the builds without a revision ID, and the missing
+    builds.
+
+    Args:
+        db:             The KernelCI MongoDB database.
+        test_groups:    A list of test group documents with build IDs.
+        build_ids:      A dictionary of IDs of builds looked up before,
+                        and True if they can be converted, or False if they
+                        were skipped, updated with the builds looked up now.
+
+    Returns:
+        A list of the build documents looked up now, which can be
+        converted.
+    """
+    new_build_ids = list({
+        ObjectId(test_group["build_id"]) for test_group in test_groups
+    } - build_ids.keys())
+    # Only the builds found, and having a revision ID can be converted
+    missing_build_ids = set(new_build_ids)
+    build_ids.update(dict.fromkeys(new_build_ids, False))
+    builds = []
+    for build in find_by_ids(db["build"], new_build_ids, BUILD_PROJECTION):
+        missing_build_ids.discard(build["_id"])
+        if get_revision_id(build) is None:
+            LOGGER.warning("Skipping build %s without %s, and its tests",
+                           build["_id"], ", ".join(REVISION_ID_FIELDS))
+        else:
+            build_ids[build["_id"]] = True
+            builds.append(build)
+    for build_id in missing_build_ids:
+        LOGGER.warning("Skipping missing build %s, and its tests", build_id)
+    return builds
+
+
+def convert_test_groups(db, test_groups, build_ids, revision_ids):
+    """
+    Convert a batch of test groups, their test cases, and their builds not
+    converted before, into kcidb I/O data, looking up the test cases and
+    the builds in bulk. Skip the builds without a revision ID, and the
+    test groups and test cases without a name, or a build.
+
+    Args:
+        db:             The KernelCI MongoDB database.
+        test_groups:    A list of test group documents to convert.
+        build_ids:      A dictionary of IDs of builds looked up before,
+                        and True if they were converted, or False if they
+                        were skipped, to not look them up again, updated
+                        with the builds looked up now.
+        revision_ids:   A set of IDs of revisions converted before, to
+                        skip, updated with the revisions converted now.
+
+    Returns:
+        The kcidb I/O data with the converted revisions, builds, and tests.
+    """
+    test_groups = [test_group for test_group in test_groups
+                   if test_group.get("build_id") is not None and
+                   test_group.get("name")]
+    builds = lookup_builds(db, test_groups, build_ids)
+    test_groups = [test_group for test_group in test_groups
+                   if build_ids[ObjectId(test_group["build_id"])]]
+    test_cases = {
+        test_case["_id"]: test_case
+        for test_case in find_by_ids(
+            db["test_case"],
+            [ObjectId(test_case_id)
+             for test_group in test_groups
+             for test_case_id in test_group.get("test_cases") or []],
+            TEST_CASE_PROJECTION
+        )
+        if test_case.get("name")
+    }
+    revisions = []
+    for build in builds:
+        revision = transform_revision(build)
+        if revision["origin_id"] not in revision_ids:
+            revision_ids.add(revision["origin_id"])
+            revisions.append(revision)
+    return dict(
+        version="1",
+        revisions=revisions,
+        builds=[transform_build(build) for build in builds],
+        tests=[
+            transform_test(test_cases[ObjectId(test_case_id)], test_group)
+            for test_group in test_groups
+            for test_case_id in test_group.get("test_cases") or []
+            if ObjectId(test_case_id) in test_cases
+        ],
+    )
+
+
+class Source(backfill.Source):
+    """
+    A source of KernelCI test groups, their test cases and builds, split
+    into shards by test group ObjectId ranges, named "LOW-HIGH" after their
+    lowest (inclusive) and highest (exclusive) ObjectIds in hex. The last
+    shard has no highest ObjectId, and takes any test groups added later.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, uri=None, database=DATABASE, db=None, shards=1,
+                 batch_size=BATCH_SIZE):
+        """
+        Initialize the source.
+
+        Args:
+            uri:        The MongoDB connection URI to connect to, in each
+                        fetching process. Cannot be used with "db".
+            database:   The name of the database to use with "uri".
+            db:         The KernelCI MongoDB database to use instead of
+                        connecting, e.g. a mongomock one. Can only be
+                        fetched from in one process.
+            shards:     The number of shards to split the test groups
+                        into, when not resuming a previous transfer.
+            batch_size: The number of test groups to retrieve and convert
+                        at once.
+        """
+        assert (uri is None) != (db is None)
+        assert isinstance(shards, int) and shards > 0
+        assert isinstance(batch_size, int) and batch_size > 0
+        self.uri = uri
+        self.database = database
+        self.db = db
+        self.shards = shards
+        self.batch_size = batch_size
+
+    def __getstate__(self):
+        """Get the state for pickling, without the connected database"""
+        state = self.__dict__.copy()
+        if self.uri is not None:
+            state["db"] = None
+        return state
+
+    def get_db(self):
+        """Get the database, connecting to it, if not connected yet"""
+        if self.db is None:
+            self.db = pymongo.MongoClient(self.uri)[self.database]
+        return self.db
+
+    def get_shards(self, known):
+        """
+        Get the names of the shards to fetch: the known shards, if
+        resuming, or the test group ObjectId range split into the
+        configured number of shards.
+        """
+        if known:
+            return known
+        test_groups = self.get_db()["test_group"]
+        ends = [
+            test_groups.find_one({}, {"_id": True},
+                                 sort=[("_id", direction)])
+            for direction in (pymongo.ASCENDING, pymongo.DESCENDING)
+        ]
+        if ends[0] is None:
+            return []
+        return [
+            f"{low}-{high or ''}"
+            for low, high in backfill.split_object_id_range(
+                str(ends[0]["_id"]), str(ends[1]["_id"]), self.shards
+            )
+        ]
+
+    def fetch(self, shard, progress):
+        """
+        Fetch the test groups of a shard, after the test group with the
+        ObjectId in the progress, if any, a batch at a time, with the
+        ObjectId of the batch's last test group as the progress.
+        """
+        db = self.get_db()
+        low, high = shard.split("-")
+        build_ids = {}
+        revision_ids = set()
+        for test_groups in iter_test_group_batches(
+                db, low=ObjectId(low), high=ObjectId(high) if high else None,
+                after=ObjectId(progress) if progress else None,
+                batch_size=self.batch_size):
+            yield convert_test_groups(db, test_groups, build_ids,
+                                      revision_ids), \
+                str(test_groups[-1]["_id"])
+
+
+def main():
+    """Execute the mongo-xfer command-line tool"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '-d', '--dataset',
+        help='Dataset name, or sqlite:FILE for a local SQLite database',
+        required=True
+    )
+    parser.add_argument(
+        '--mongo',
+        help='MongoDB connection URI (default: mongodb://localhost)',
+        default='mongodb://localhost'
+    )
+    parser.add_argument(
+        '--database',
+        help=f'MongoDB database name (default: {DATABASE})',
+        default=DATABASE
+    )
+    parser.add_argument(
+        '--checkpoint',
+        metavar='FILE',
+        help='Remember the shards and the last transferred test group of '
+             'each in this file, and resume after them on later runs'
+    )
+    parser.add_argument(
+        '-j', '--jobs',
+        help=f'Number of shards to transfer in parallel processes '
+             f'(default: {backfill.JOBS})',
+        type=int,
+        default=backfill.JOBS
+    )
+    parser.add_argument(
+        '--shards',
+        help='Number of ObjectId ranges to split the test groups into, '
+             'unless resuming (default: four per job)',
+        type=int
+    )
+    parser.add_argument(
+        '--batch-size',
+        help=f'Number of test groups to retrieve at once '
+             f'(default: {BATCH_SIZE})',
+        type=int,
+        default=BATCH_SIZE
+    )
+    parser.add_argument(
+        '--chunk-size',
+        help=f'Number of objects to submit at once '
+             f'(default: {kcidb.SUBMIT_CHUNK_SIZE})',
+        type=int,
+        default=kcidb.SUBMIT_CHUNK_SIZE
+    )
+    parser.add_argument(
+        '--dedup',
+        help='Replace objects with the same origin and origin_id in the '
+             'database, making resuming and re-transferring safe',
+        action='store_true'
+    )
+    parser.add_argument(
+        '--no-summaries',
+        help='Don\'t update the summaries of the affected revisions and '
+             'builds, to be followed by "kcidb-summary --update"',
+        dest='summarize',
+        action='store_false'
+    )
+    args = parser.parse_args()
+    if args.batch_size <= 0:
+        parser.error("--batch-size must be positive")
+    if args.chunk_size <= 0:
+        parser.error("--chunk-size must be positive")
+    if args.jobs <= 0:
+        parser.error("--jobs must be positive")
+    if args.shards is not None and args.shards <= 0:
+        parser.error("--shards must be positive")
+    source = Source(uri=args.mongo, database=args.database,
+                    shards=args.shards or args.jobs * 4,
+                    batch_size=args.batch_size)
+    client = kcidb.Client(args.dataset, dedup=args.dedup,
+                          summarize=args.summarize)
+    total = backfill.run(source, client, state_path=args.checkpoint,
+                         jobs=args.jobs, chunk_size=args.chunk_size)
+    print(f"Submitted {total} objects", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
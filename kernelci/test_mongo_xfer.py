@@ -0,0 +1,97 @@
+"""Test transferring KernelCI MongoDB data, using mongomock"""
+
+from datetime import datetime
+import pytest
+from bson.objectid import ObjectId
+import kcidb
+from kcidb import backfill
+from kcidb import io_schema
+
+mongomock = pytest.importorskip("mongomock")
+mongo_xfer = pytest.importorskip("mongo_xfer")
+
+# Number of test groups in the synthetic database
+TEST_GROUPS = 12
+
+# Number of test cases in each test group
+TEST_CASES = 5
+
+
+def create_db():
+    """
+    Create a mock KernelCI database, with test groups of a complete build,
+    of builds missing fields needed for their revisions, and of a missing
+    build.
+    """
+    db = mongomock.MongoClient()[mongo_xfer.DATABASE]
+    complete = dict(job="mainline", git_branch="master",
+                    git_describe="v5.4-rc1", git_commit="1" * 40,
+                    git_url="https://git.kernel.org/linux.git",
+                    arch="x86_64", defconfig_full="defconfig",
+                    status="PASS", build_time=12.5,
+                    created_on=datetime(2019, 9, 1))
+    build_ids = [
+        db["build"].insert_one(build).inserted_id
+        for build in (
+            complete,
+            {key: value for key, value in complete.items()
+             if key != "git_describe"},
+            dict(complete, job=None),
+        )
+    ]
+    for index in range(TEST_GROUPS):
+        test_case_ids = db["test_case"].insert_many([
+            dict(name=f"case{case}", status="PASS")
+            for case in range(TEST_CASES)
+        ] + [dict(status="FAIL")]).inserted_ids
+        db["test_group"].insert_one(dict(
+            name=f"group{index}", board="qemu",
+            build_id=build_ids[index % len(build_ids)],
+            test_cases=test_case_ids,
+        ))
+    # A group without a name, the top-level LAVA group, and a group of a
+    # missing build
+    for name, build_id in ((None, build_ids[0]), ("lava", build_ids[0]),
+                           ("missing", ObjectId())):
+        db["test_group"].insert_one(dict(
+            name=name, build_id=build_id,
+            test_cases=db["test_case"].insert_many([
+                dict(name="case", status="PASS")
+            ]).inserted_ids,
+        ))
+    return db, build_ids[0]
+
+
+def test_get_revision_id():
+    """Check revision IDs are only made of complete builds"""
+    assert mongo_xfer.get_revision_id(
+        dict(job="mainline", git_branch="master", git_describe="v5.4")
+    ) == "mainline/master/v5.4"
+    assert mongo_xfer.get_revision_id(
+        dict(job="mainline", git_branch="master")
+    ) is None
+
+
+def test_transfer():
+    """Check transferring skips incomplete builds, without failing"""
+    db, build_id = create_db()
+    client = kcidb.Client("sqlite::memory:")
+    client.init()
+    total = backfill.run(mongo_xfer.Source(db=db, shards=3, batch_size=2),
+                         client, jobs=1, chunk_size=10)
+    data = client.query()
+    io_schema.validate(data)
+    complete_groups = len(range(0, TEST_GROUPS, 3))
+    assert total == 2 + complete_groups * TEST_CASES
+    assert data["revisions"] == [dict(
+        origin="kernelci", origin_id="mainline/master/v5.4-rc1",
+        git_repository_url="https://git.kernel.org/linux.git",
+        git_repository_commit_hash="1" * 40,
+        git_repository_branch="master",
+        git_repository_commit_name="v5.4-rc1",
+    )]
+    assert [build["origin_id"] for build in data["builds"]] == \
+        [str(build_id)]
+    assert len(data["tests"]) == complete_groups * TEST_CASES
+    assert {test["build_origin_id"] for test in data["tests"]} == \
+        {str(build_id)}
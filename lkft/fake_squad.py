@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+A fake SQUAD API server, serving synthetic data from memory over HTTP on
+the local host, for testing squad_client and lkft.py offline
+"""
+
+import argparse
+import collections
+import hashlib
+import json
+import random
+import sys
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+# Statuses of SQUAD tests
+STATUSES = ("pass", "fail", "skip", "xfail")
+
+# Names of test environments
+ENVIRONMENTS = ("x86", "i386", "juno-r2", "hi6220-hikey")
+
+# Names of test suites
+SUITES = ("ltp-syscalls-tests", "kselftest", "libhugetlbfs", "ltp-fs-tests")
+
+# A map of list filter lookups and the functions checking object field
+# values against filter values with them
+LOOKUP_MAP = dict(
+    exact=lambda value, filter_value: value == filter_value,
+    lt=lambda value, filter_value: value < filter_value,
+    lte=lambda value, filter_value: value <= filter_value,
+    gt=lambda value, filter_value: value > filter_value,
+    gte=lambda value, filter_value: value >= filter_value,
+)
+
+
+def _filter(objs, query):
+    """
+    Filter a list of objects with "FIELD__LOOKUP" query parameters, like
+    SQUAD does, comparing the field values as strings.
+
+    Args:
+        objs:   The list of objects (dictionaries) to filter.
+        query:  A dictionary of query parameter names and lists of values,
+                as returned by urllib.parse.parse_qs().
+
+    Returns:
+        The list of objects matching all the filters.
+    """
+    filters = []
+    for name, values in query.items():
+        if name != "page":
+            field, _, lookup = name.partition("__")
+            filters.append((field, LOOKUP_MAP[lookup or "exact"], values[0]))
+    return [
+        obj for obj in objs
+        if all(field in obj and check(str(obj[field]), value)
+               for field, check, value in filters)
+    ]
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    """HTTP request handler serving the fake SQUAD's routes"""
+
+    # pylint: disable=invalid-name
+    def do_GET(self):
+        """Serve a route, paginating lists, and revalidating by ETag"""
+        fake = self.server.fake
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        with fake.lock:
+            fake.requests[url.path] += 1
+            failing = fake.requests[url.path] <= fake.failures
+            value = fake.routes.get(url.path)
+        if failing:
+            self.send_response(503)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if value is None:
+            self.send_error(404)
+            return
+        if isinstance(value, list):
+            value = _filter(value, query)
+            page = int(query.pop("page", ["1"])[0])
+            start = (page - 1) * fake.page_size
+            end = start + fake.page_size
+            value = dict(
+                count=len(value),
+                next=f"{fake.url}{url.path}?" +
+                urlencode(dict(query, page=page + 1), doseq=True)
+                if end < len(value) else None,
+                previous=f"{fake.url}{url.path}?" +
+                urlencode(dict(query, page=page - 1), doseq=True)
+                if page > 1 else None,
+                results=value[start:end],
+            )
+        body = json.dumps(value).encode()
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            with fake.lock:
+                fake.not_modified[url.path] += 1
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # pylint: disable=redefined-builtin
+        pass
+
+
+class FakeSquad:
+    """
+    A fake SQUAD API server, serving JSON values at URL paths ("routes"),
+    filtering lists with "FIELD__LOOKUP" query parameters, paginating them,
+    tagging responses with ETags and responding with status 304 to requests
+    with a matching "If-None-Match" header, and optionally failing the
+    first requests for each path with status 503, to exercise retries.
+    """
+
+    def __init__(self, page_size=50, failures=0):
+        """
+        Initialize and bind the server to a free port on the local host.
+
+        Args:
+            page_size:  The maximum number of objects in a page of a list.
+            failures:   The number of requests to fail for each path,
+                        before serving it.
+        """
+        assert isinstance(page_size, int) and page_size > 0
+        assert isinstance(failures, int) and failures >= 0
+        self.page_size = page_size
+        self.failures = failures
+        # A dictionary of URL paths and JSON values served at them
+        self.routes = {}
+        # A counter of requests per URL path
+        self.requests = collections.Counter()
+        # A counter of "not modified" (304) responses per URL path
+        self.not_modified = collections.Counter()
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _RequestHandler)
+        self.server.fake = self
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = None
+
+    def start(self):
+        """Start serving in a background thread, and return self"""
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving"""
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def add(self, path, value):
+        """
+        Serve a JSON value at a URL path.
+
+        Args:
+            path:   The URL path, e.g. "/api/builds/1/".
+            value:  The JSON value to serve. Lists are paginated.
+
+        Returns:
+            The full URL of the path.
+        """
+        with self.lock:
+            self.routes[path] = value
+        return self.url + path
+
+    # pylint: disable=too-many-arguments,too-many-locals
+    def generate(self, branches=("5.3",), builds=3, testruns=2, tests=10,
+                 seed=0, start=datetime(2019, 9, 1)):
+        """
+        Generate synthetic SQUAD projects, builds, their metadata,
+        testruns, environments, and tests.
+
+        Args:
+            branches:   A sequence of names of the branches to generate a
+                        project for each.
+            builds:     The number of builds to generate for each project,
+                        one per day since start, listed newest first.
+            testruns:   The number of testruns to generate for each build.
+            tests:      The number of tests to generate for each testrun.
+            seed:       The seed of the random test statuses.
+            start:      The datetime of the first build of each project.
+
+        Returns:
+            A dictionary of branch names and URLs of their projects, as
+            returned by squad_client.get_projects_by_branch().
+        """
+        rand = random.Random(seed)
+        environment_urls = [
+            self.add(f"/api/environments/{index}/",
+                     dict(id=index, slug=slug,
+                          url=f"{self.url}/api/environments/{index}/"))
+            for index, slug in enumerate(ENVIRONMENTS, start=1)
+        ]
+        projects = {}
+        build_id = testrun_id = test_id = 0
+        for project_id, branch in enumerate(branches, start=1):
+            project_url = self.add(
+                f"/api/projects/{project_id}/",
+                dict(id=project_id, slug=f"linux-stable-rc-{branch}-oe",
+                     url=f"{self.url}/api/projects/{project_id}/")
+            )
+            projects[branch] = project_url
+            build_list = []
+            for build_index in range(builds):
+                build_id += 1
+                build_url = f"{self.url}/api/builds/{build_id}/"
+                commit = hashlib.sha1(
+                    f"{branch}/{build_index}".encode()).hexdigest()
+                version = f"v{branch}.{build_index}-g{commit[:12]}"
+                timestamp = (start + timedelta(days=build_index)). \
+                    strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+                build = dict(
+                    id=build_id, url=build_url, version=version,
+                    datetime=timestamp, created_at=timestamp,
+                    finished=True, project=project_url,
+                    testruns=build_url + "testruns/",
+                    metadata=build_url + "metadata/",
+                )
+                self.add(f"/api/builds/{build_id}/", build)
+                self.add(f"/api/builds/{build_id}/metadata/", dict(
+                    git_repo="https://git.kernel.org/pub/scm/linux/kernel/"
+                             "git/stable/linux-stable-rc.git",
+                    git_branch=f"linux-{branch}.y",
+                    git_commit=commit,
+                    git_describe=version,
+                    make_kernelversion=f"{branch}.{build_index}",
+                ))
+                build_list.insert(0, build)
+                testrun_list = []
+                for _ in range(testruns):
+                    testrun_id += 1
+                    testrun_url = f"{self.url}/api/testruns/{testrun_id}/"
+                    testrun_list.append(dict(
+                        id=testrun_id, url=testrun_url, build=build_url,
+                        tests=testrun_url + "tests/",
+                        environment=rand.choice(environment_urls),
+                        datetime=timestamp, completed=True,
+                        job_id=str(testrun_id),
+                        job_url=f"https://lkft.validation.linaro.org/"
+                                f"scheduler/job/{testrun_id}",
+                    ))
+                    test_list = []
+                    for test_index in range(tests):
+                        test_id += 1
+                        suite = SUITES[test_index % len(SUITES)]
+                        status = rand.choice(STATUSES)
+                        test_list.append(dict(
+                            id=test_id, name=f"{suite}/test{test_index}",
+                            short_name=f"test{test_index}",
+                            status=status, result=status == "pass",
+                            log="", metadata=test_index,
+                            suite=test_index % len(SUITES),
+                            has_known_issues=status == "xfail",
+                            known_issues=[],
+                        ))
+                    self.add(f"/api/testruns/{testrun_id}/tests/",
+                             test_list)
+                self.add(f"/api/builds/{build_id}/testruns/", testrun_list)
+            self.add(f"/api/projects/{project_id}/builds/", build_list)
+        return projects
+
+
+def main():
+    """Run a fake SQUAD server with synthetic data until interrupted"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '-b', '--branch', action='append',
+        help='Generate a project for this branch. Can be repeated. '
+             'Default is "5.3".'
+    )
+    parser.add_argument(
+        '--builds', type=int, default=3,
+        help='Number of builds per project (default: 3)'
+    )
+    parser.add_argument(
+        '--testruns', type=int, default=2,
+        help='Number of testruns per build (default: 2)'
+    )
+    parser.add_argument(
+        '--tests', type=int, default=10,
+        help='Number of tests per testrun (default: 10)'
+    )
+    args = parser.parse_args()
+    fake = FakeSquad()
+    projects = fake.generate(branches=args.branch or ("5.3",),
+                             builds=args.builds, testruns=args.testruns,
+                             tests=args.tests)
+    json.dump(projects, sys.stdout, indent=4)
+    print()
+    sys.stdout.flush()
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
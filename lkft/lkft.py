@@ -1,17 +1,134 @@
 #!/usr/bin/env python3
+"""
+Import LKFT test results from SQUAD into the Kernel CI database: SQUAD
+builds become kcidb revisions and builds, and the tests of their testruns
+become kcidb tests, fetched by shards of branches, optionally in parallel,
+and submitted in batches of whole builds
+"""
 
 import argparse
-from google.cloud import bigquery
 import datetime
+import re
 import sys
+import kcidb
+from kcidb import backfill
 import squad_client
 
+# The origin of the submitted objects
+ORIGIN = "lkft"
 
-def transform_lkft_to_kci(test, build_version):
+# The format of SQUAD datetimes
+DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+# The format of datetimes in SQUAD list filters
+FILTER_DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+# A map of SQUAD test statuses and kcidb test statuses
+STATUS_MAP = {
+    "pass": "PASS",
+    "fail": "FAIL",
+    "skip": "SKIP",
+    # Failures of known issues, submitted as waived
+    "xfail": "FAIL",
+}
+
+
+def transform_revision(build, metadata):
     """
-        transform an lkft test record into a kernelci test record
+        transform a SQUAD build and its metadata into a kcidb revision
 
-        kci schema: https://api.kernelci.org/schema-test-case.html#post
+        IN:
+            build: {
+                'id': 22006,
+                'version': 'v5.3-rc8',
+                'created_at': '2019-09-09T17:21:05.398420Z',
+                ...
+            }
+            metadata: {
+                'git_repo': 'https://git.kernel.org/pub/scm/linux/kernel/'
+                            'git/torvalds/linux.git',
+                'git_branch': 'master',
+                'git_commit': 'f74c2bb98776e2de508f4d607cd519873065118e',
+                'git_describe': 'v5.3-rc8',
+                'make_kernelversion': '5.3.0-rc8',
+                ...
+            }
+
+        OUT:
+            {
+                'origin': 'lkft',
+                'origin_id': 'f74c2bb98776e2de508f4d607cd519873065118e',
+                'git_repository_url': 'https://git.kernel.org/pub/scm/...',
+                'git_repository_commit_hash': 'f74c2bb98776e2de...',
+                'git_repository_commit_name': 'v5.3-rc8',
+                'git_repository_branch': 'master',
+                'discovery_time': '2019-09-09T17:21:05.398420Z',
+                'valid': True,
+                'misc': {'make_kernelversion': '5.3.0-rc8'}
+            }
+    """
+    revision = dict(
+        origin=ORIGIN,
+        origin_id=get_revision_id(build, metadata),
+        discovery_time=build["created_at"],
+        valid=True,
+        misc=dict(),
+    )
+    for field, key in (("git_repository_url", "git_repo"),
+                       ("git_repository_commit_hash", "git_commit"),
+                       ("git_repository_commit_name", "git_describe"),
+                       ("git_repository_branch", "git_branch")):
+        if metadata.get(key):
+            revision[field] = metadata[key]
+    if metadata.get("make_kernelversion"):
+        revision["misc"]["make_kernelversion"] = \
+            metadata["make_kernelversion"]
+    return revision
+
+
+def get_revision_id(build, metadata):
+    """
+        get the kcidb revision ID of a SQUAD build: its git commit hash,
+        or its version, if the commit is unknown
+    """
+    return metadata.get("git_commit") or build["version"]
+
+
+def transform_build(build, metadata, branch):
+    """
+        transform a SQUAD build and its metadata into a kcidb build
+
+        OUT:
+            {
+                'revision_origin': 'lkft',
+                'revision_origin_id': 'f74c2bb98776e2de...',
+                'origin': 'lkft',
+                'origin_id': '22006',
+                'description': 'v5.3-rc8',
+                'start_time': '2019-09-09T17:21:05.398420Z',
+                'valid': True,
+                'misc': {
+                    'branch': '5.3',
+                    'url': 'https://qa-reports.linaro.org/api/builds/22006/'
+                }
+            }
+    """
+    return dict(
+        revision_origin=ORIGIN,
+        revision_origin_id=get_revision_id(build, metadata),
+        origin=ORIGIN,
+        origin_id=str(build["id"]),
+        description=build["version"],
+        start_time=build["datetime"],
+        # SQUAD only receives results for kernels which did build
+        valid=True,
+        misc=dict(branch=branch, url=build["url"]),
+    )
+
+
+def transform_lkft_to_kci(test, build, testrun, environment):
+    """
+        transform an lkft test record into a kcidb test record
 
         IN:
             test: {
@@ -27,28 +144,201 @@ def transform_lkft_to_kci(test, build_version):
                 'status': 'pass',
                 'suite': 142
             }
-            build_version: 'v5.3-rc8'
+            build: the SQUAD build of the testrun
+            testrun: the SQUAD testrun the test belongs to
+            environment: the SQUAD environment of the testrun
 
         OUT:
             {
-                'name': 'ltp-syscalls-tests/fcntl10_64',
-                'status': 'PASS'
-                'vcs_commit': build_vers
+                'build_origin': 'lkft',
+                'build_origin_id': '22006',
+                'origin': 'lkft',
+                'origin_id': '216221035',
+                'path': 'ltp-syscalls-tests.fcntl10_64',
+                'status': 'PASS',
+                'waived': False,
+                'environment': {'description': 'juno-r2'},
+                'start_time': '2019-09-09T17:46:48.674914Z',
+                'misc': {...}
             }
     """
-    #return {
-    #    "name": test["name"],
-    #    "status": test[
-    #        "status"
-    #    ].upper(),  # XXX do all squad statuses map to kci status?
-    #    "vcs_commit": build_version,
-    #}
-    return {
-        "name": test["name"],
-        "result": test[
-            "status"
-        ].upper(),  # XXX do all squad statuses map to kci status?
-    }
+    kci_test = dict(
+        build_origin=ORIGIN,
+        build_origin_id=str(build["id"]),
+        origin=ORIGIN,
+        origin_id=str(test["id"]),
+        path=re.sub(r"[^.a-zA-Z0-9_-]", "_",
+                    test["name"].replace("/", ".")),
+        status=STATUS_MAP.get(test["status"], "ERROR"),
+        waived=test["status"] == "xfail",
+        environment=dict(description=environment["slug"]),
+        misc=dict(testrun_id=testrun["id"]),
+    )
+    if testrun.get("datetime"):
+        kci_test["start_time"] = testrun["datetime"]
+    if testrun.get("job_url"):
+        kci_test["misc"]["job_url"] = testrun["job_url"]
+    return kci_test
+
+
+def get_build_data(fetcher, build, branch, environments):
+    """
+        fetch a finished SQUAD build's metadata, testruns, and tests, and
+        transform them into kcidb I/O data with one revision, one build,
+        and the tests of all the testruns
+
+        environments: a dictionary of environment URLs and environments,
+                      updated with the fetched environments
+    """
+    metadata = fetcher.get(build["metadata"], immutable=True)
+    # Testruns and tests of finished builds never change
+    testruns = list(fetcher.iter_objects(build["testruns"],
+                                         immutable=True))
+    tests = []
+    # Fetch tests of all the testruns concurrently
+    for testrun, (_, testrun_tests) in zip(
+            testruns,
+            fetcher.iter_lists((testrun["tests"] for testrun in testruns),
+                               immutable=True)):
+        environment_url = testrun["environment"]
+        if environment_url not in environments:
+            environments[environment_url] = \
+                fetcher.get(environment_url, immutable=True)
+        environment = environments[environment_url]
+        tests.extend(
+            transform_lkft_to_kci(test, build, testrun, environment)
+            for test in testrun_tests
+        )
+    return dict(
+        version="1",
+        revisions=[transform_revision(build, metadata)],
+        builds=[transform_build(build, metadata, branch)],
+        tests=tests,
+    )
+
+
+def get_new_builds(fetcher, project_url, since, until, last_id):
+    """
+        get the builds of a SQUAD project started since a date, and before
+        another date (if not None), and newer than the build with the
+        specified ID (if not None), oldest first, only listing the builds
+        started in the date range, so shards of a branch don't list the
+        builds of each other
+    """
+    parameters = dict(datetime__gte=since.strftime(FILTER_DATETIME_FORMAT))
+    if until is not None:
+        parameters["datetime__lt"] = until.strftime(FILTER_DATETIME_FORMAT)
+    builds = []
+    # Check the range anyway, in case the filters are ignored
+    for build in squad_client.Builds(project_url + "builds/", fetcher,
+                                     parameters):
+        started = datetime.datetime.strptime(build["datetime"],
+                                             DATETIME_FORMAT)
+        if since > started:
+            break
+        if last_id is not None and build["id"] <= last_id:
+            break
+        if until is None or started < until:
+            builds.append(build)
+    builds.reverse()
+    return builds
+
+
+class Source(backfill.Source):
+    """
+        a backfill source of the builds of LKFT branches' SQUAD projects,
+        with their revisions and tests, sharded by branch (shards named
+        after the branch), or by branch and period of time (shards named
+        "BRANCH@START..END", where END is empty for the last period). The
+        progress of a shard is the "id" and "datetime" of its last build.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, branches, since, shard_days=None, cache_path=None):
+        """
+            branches: a dictionary of branch names and their projects' URLs
+            since: the datetime of the earliest builds to import
+            shard_days: the number of days in each shard of a branch, or
+                        None to have a single shard per branch
+            cache_path: the path to the SQUAD response cache file, or None
+        """
+        self.branches = branches
+        self.since = since
+        self.shard_days = shard_days
+        self.cache_path = cache_path
+        # The fetcher of this process, created on first use
+        self.fetcher = None
+
+    def __getstate__(self):
+        """get the state for pickling, without the fetcher"""
+        state = self.__dict__.copy()
+        state["fetcher"] = None
+        return state
+
+    def get_fetcher(self):
+        """get the fetcher of this process, creating it if needed"""
+        if self.fetcher is None:
+            if self.cache_path:
+                self.fetcher = squad_client.Fetcher(
+                    cache=squad_client.ResponseCache(self.cache_path)
+                )
+            else:
+                self.fetcher = squad_client.get_fetcher()
+        return self.fetcher
+
+    def get_shards(self, known):
+        """
+            get the shards of the branches, keeping the known shards of
+            each branch, if any, so their progress stays meaningful
+        """
+        shards = []
+        for branch in self.branches:
+            branch_shards = [shard for shard in known
+                             if shard.split("@")[0] == branch]
+            if not branch_shards:
+                if self.shard_days:
+                    branch_shards = [
+                        f"{branch}@{start:%Y-%m-%d}.."
+                        f"{'' if end is None else f'{end:%Y-%m-%d}'}"
+                        for start, end in backfill.split_date_range(
+                            self.since,
+                            max(datetime.datetime.utcnow(),
+                                self.since + datetime.timedelta(days=1)),
+                            datetime.timedelta(days=self.shard_days)
+                        )
+                    ]
+                else:
+                    branch_shards = [branch]
+            shards.extend(branch_shards)
+        return shards
+
+    def fetch(self, shard, progress):
+        """
+            fetch the finished builds of a shard not imported yet, oldest
+            first, each with its revision and tests, stopping at the first
+            unfinished build, to import it on a later run
+        """
+        fetcher = self.get_fetcher()
+        branch, _, period = shard.partition("@")
+        since = self.since
+        until = None
+        if period:
+            start, end = period.split("..")
+            since = max(since, datetime.datetime.strptime(start, "%Y-%m-%d"))
+            until = datetime.datetime.strptime(end, "%Y-%m-%d") \
+                if end else None
+        environments = {}
+        for build in get_new_builds(fetcher, self.branches[branch], since,
+                                    until, progress and progress["id"]):
+            if not build["finished"]:
+                print(f"{shard}: {build['version']}: not finished, stopping",
+                      file=sys.stderr)
+                break
+            data = get_build_data(fetcher, build, branch, environments)
+            print(f"{shard}: {build['version']}: "
+                  f"fetched {len(data['tests'])} tests", file=sys.stderr)
+            yield data, dict(id=build["id"], datetime=build["datetime"])
+
 
 def valid_date_type(arg_date_str):
     """custom argparse *date* type for user dates values given from the command line"""
@@ -66,44 +356,73 @@ def valid_date_type(arg_date_str):
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(
-        description="Generate report of branches tested recently"
+        description="Import LKFT test results from SQUAD into the "
+                    "Kernel CI database"
     )
     parser.add_argument(
         dest="date",
         type=valid_date_type,
-        help='Report on builds that occured since date given (inclusive) "YYYY-MM-DD"',
+        help='Import builds that occured since date given (inclusive) "YYYY-MM-DD"',
+    )
+    parser.add_argument(
+        "-d", "--dataset",
+        help="Dataset name, or sqlite:FILE for a local SQLite database",
+        required=True,
+    )
+    parser.add_argument(
+        "-b", "--branch",
+        action="append",
+        help="Import this branch only. Can be repeated. "
+             "Default is all the branches.",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        metavar="FILE",
+        help="Remember the shards and the last imported build of each in "
+             "this file, and resume after them on later runs",
+    )
+    parser.add_argument(
+        "-j", "--jobs",
+        help="Number of shards to import in parallel processes "
+             "(default: 1)",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--shard-days",
+        metavar="DAYS",
+        help="Split each branch into shards of this many days, "
+             "unless resuming. Default is one shard per branch.",
+        type=int,
+    )
+    parser.add_argument(
+        "--dedup",
+        help="Replace objects with the same origin and origin_id in the "
+             "database, making re-imports safe",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--cache",
+        metavar="FILE",
+        help="Cache SQUAD responses in this file, revalidating them on "
+             "later runs, and reusing those of finished builds as is",
     )
     args = parser.parse_args()
-    date = args.date
-
-    client = bigquery.Client()
-    dataset_ref = client.dataset('kernelci01')
-    table_ref = dataset_ref.table("tests")
 
     branches = squad_client.get_projects_by_branch()
-    for branch, branch_url in branches.items():
-        builds_url = branch_url+"builds/"
-        for build in squad_client.Builds(builds_url):
-            if date > datetime.datetime.strptime(
-                build["datetime"], "%Y-%m-%dT%H:%M:%S.%fZ"
-            ):
-                break
-            build_version = build["version"]
-            for testrun in squad_client.get_objects(build.get("testruns")):
-                data = []
-                for index, test in enumerate(squad_client.get_objects(testrun.get("tests"))):
-                    data.append(transform_lkft_to_kci(test, build_version))
-                    print(transform_lkft_to_kci(test, build_version))
+    for branch in args.branch or []:
+        if branch not in branches:
+            parser.error(f"Unknown branch {branch!r}")
 
-                    if index > 10:
-                        print("Bailing out after 10 test results")
-                        break
-                job = client.load_table_from_json(data, table_ref)
-                job.result()
-
-
-
-    #build_url = "https://qa-aep rts.linaro.org/api/builds/22006/"  # v5.3-rc8
-    #build = squad_client.Build(build_url)
-    #build_version = build.build["version"]
+    if args.jobs <= 0:
+        parser.error("--jobs must be positive")
+    if args.shard_days is not None and args.shard_days <= 0:
+        parser.error("--shard-days must be positive")
 
+    client = kcidb.Client(args.dataset, dedup=args.dedup)
+    source = Source(
+        {branch: branch_url for branch, branch_url in branches.items()
+         if not args.branch or branch in args.branch},
+        args.date, shard_days=args.shard_days, cache_path=args.cache
+    )
+    backfill.run(source, client, state_path=args.checkpoint, jobs=args.jobs)
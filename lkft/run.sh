@@ -1 +1 @@
-GOOGLE_APPLICATION_CREDENTIALS=~/Downloads/third-apex-252711-ac46283d4201.json python3 lkft.py 2019-09-11
+GOOGLE_APPLICATION_CREDENTIALS=~/Downloads/third-apex-252711-ac46283d4201.json python3 lkft.py -d kernelci01 --checkpoint lkft-checkpoint.json --cache lkft-cache.sqlite 2019-09-11
@@ -1,6 +1,39 @@
+import collections
+import json
 import re
+import sqlite3
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 import requests
 
+# Default maximum number of concurrent requests to a single host
+MAX_PER_HOST = 4
+
+# Default maximum number of concurrent requests overall
+MAX_WORKERS = 16
+
+# Default number of attempts to make for each request
+ATTEMPTS = 5
+
+# Default number of seconds to wait before the first retry of a request,
+# doubled for every further retry, up to MAX_RETRY_DELAY
+RETRY_DELAY = 0.5
+MAX_RETRY_DELAY = 30
+
+# Number of seconds to wait for a response
+TIMEOUT = 60
+
+# HTTP statuses of responses to retry requests on
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Default maximum size of the response cache, bytes
+MAX_CACHE_SIZE = 1024 * 1024 * 1024
+
+# Number of seconds to wait for the response cache to be unlocked
+CACHE_LOCK_TIMEOUT = 60
+
 
 def get_projects_by_branch():
     return {
@@ -63,51 +96,472 @@ def urljoiner(*args):
     return "/".join(map(lambda x: str(x).rstrip("/"), args))
 
 
-def get_objects(endpoint_url, expect_one=False, parameters={}):
+class ResponseCache:
+    """
+    A persistent cache of JSON responses, keyed by URL and query
+    parameters, stored compressed in an SQLite database, with the least
+    recently used responses evicted when its size exceeds the limit. Keeps
+    the responses' ETag and Last-Modified headers for revalidation, and
+    whether they're immutable and can be reused without it. Can be used
+    from multiple threads.
+    """
+
+    def __init__(self, path, max_size=MAX_CACHE_SIZE):
+        """
+        Open (and create, if needed) a response cache.
+
+        Args:
+            path:       The path to the cache database file.
+            max_size:   The maximum total size of the stored (compressed)
+                        responses, bytes.
+        """
+        assert isinstance(path, str)
+        assert isinstance(max_size, int) and max_size > 0
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        # Wait for other processes using the cache to finish writing
+        self.conn = sqlite3.connect(path, timeout=CACHE_LOCK_TIMEOUT,
+                                    check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, "
+                "immutable INTEGER NOT NULL, body BLOB NOT NULL, "
+                "size INTEGER NOT NULL, accessed REAL NOT NULL)"
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed "
+                "ON responses (accessed)"
+            )
+            self.size = self.conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()[0]
+
+    @staticmethod
+    def get_key(url, params=None):
+        """
+        Get the cache key of a request.
+
+        Args:
+            url:    The URL of the request.
+            params: A dictionary of query parameters, or None.
+
+        Returns:
+            The key string.
+        """
+        return json.dumps([url, sorted((params or {}).items())])
+
+    def get(self, key):
+        """
+        Retrieve a cached response, marking it as used.
+
+        Args:
+            key:    The key of the response.
+
+        Returns:
+            A dictionary with the response's "value" (the JSON value),
+            "etag", "last_modified", and "immutable", or None if not cached.
+        """
+        with self.lock, self.conn:
+            row = self.conn.execute(
+                "SELECT etag, last_modified, immutable, body "
+                "FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self.conn.execute(
+                "UPDATE responses SET accessed = ? WHERE key = ?",
+                (time.time(), key)
+            )
+        etag, last_modified, immutable, body = row
+        return dict(value=json.loads(zlib.decompress(body)), etag=etag,
+                    last_modified=last_modified, immutable=bool(immutable))
+
+    # pylint: disable=too-many-arguments
+    def put(self, key, value, etag=None, last_modified=None,
+            immutable=False):
+        """
+        Store a response, evicting the least recently used responses, if
+        the cache grows over its size limit.
+
+        Args:
+            key:            The key of the response.
+            value:          The JSON value of the response.
+            etag:           The value of the response's ETag header, or
+                            None.
+            last_modified:  The value of the response's Last-Modified
+                            header, or None.
+            immutable:      True if the response never changes, and can be
+                            reused without revalidation, False otherwise.
+        """
+        body = zlib.compress(json.dumps(value).encode())
+        with self.lock, self.conn:
+            row = self.conn.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                self.size -= row[0]
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES "
+                "(?, ?, ?, ?, ?, ?, ?)",
+                (key, etag, last_modified, int(immutable), body, len(body),
+                 time.time())
+            )
+            self.size += len(body)
+            if self.size > self.max_size:
+                self._evict()
+
+    def _evict(self):
+        """
+        Remove the least recently used responses, until the cache fits its
+        size limit. Must be called with the lock taken, in a transaction.
+        """
+        keys = []
+        for key, size in self.conn.execute(
+                "SELECT key, size FROM responses ORDER BY accessed"):
+            if self.size <= self.max_size:
+                break
+            keys.append((key,))
+            self.size -= size
+        self.conn.executemany("DELETE FROM responses WHERE key = ?", keys)
+
+    def mark_immutable(self, key):
+        """
+        Mark a cached response as immutable, so it's reused without
+        revalidation from now on.
+
+        Args:
+            key:    The key of the response.
+        """
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE responses SET immutable = 1 WHERE key = ?", (key,)
+            )
+
+    def close(self):
+        """Close the cache database"""
+        with self.lock:
+            self.conn.close()
+
+
+class Fetcher:
+    """
+    A SQUAD API client fetching over a shared keep-alive session, with
+    bounded concurrency per host, prefetching of the next page of lists,
+    retries with exponential backoff, and optional response caching. Can
+    be used from multiple threads.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, max_per_host=MAX_PER_HOST, max_workers=MAX_WORKERS,
+                 attempts=ATTEMPTS, retry_delay=RETRY_DELAY,
+                 max_retry_delay=MAX_RETRY_DELAY, session=None,
+                 cache=None):
+        """
+        Initialize a fetcher.
+
+        Args:
+            max_per_host:       The maximum number of concurrent requests
+                                to a single host.
+            max_workers:        The maximum number of concurrent requests
+                                overall.
+            attempts:           The number of attempts to make for each
+                                request, before giving up.
+            retry_delay:        The number of seconds to wait before the
+                                first retry, doubled for each next one.
+            max_retry_delay:    The maximum number of seconds to wait
+                                before a retry.
+            session:            The requests.Session to use, or None to
+                                create one.
+            cache:              The ResponseCache to store the retrieved
+                                JSON values in, and to revalidate and
+                                reuse them from, or None to not cache.
+        """
+        assert isinstance(max_per_host, int) and max_per_host > 0
+        assert isinstance(max_workers, int) and max_workers > 0
+        assert isinstance(attempts, int) and attempts > 0
+        self.max_per_host = max_per_host
+        self.max_workers = max_workers
+        self.attempts = attempts
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_maxsize=max(max_per_host, max_workers))
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        self.session = session
+        self.cache = cache
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        # A dictionary of host names and semaphores limiting concurrent
+        # requests to them, and the lock protecting it
+        self.host_semaphores = {}
+        self.host_semaphores_lock = threading.Lock()
+
+    def _get_host_semaphore(self, url):
+        """Get the semaphore limiting concurrent requests to a URL's host"""
+        host = get_domain_from_url(url)
+        with self.host_semaphores_lock:
+            semaphore = self.host_semaphores.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.max_per_host)
+                self.host_semaphores[host] = semaphore
+            return semaphore
+
+    def get_response(self, url, params=None, headers=None):
+        """
+        Send a GET request, retrying on connection errors, timeouts, and
+        responses with RETRY_STATUSES, with exponential backoff, honoring
+        the "Retry-After" header.
+
+        Args:
+            url:        The URL to get.
+            params:     A dictionary of query parameters, or None.
+            headers:    A dictionary of extra request headers, or None.
+
+        Returns:
+            The successful response (requests.Response).
+
+        Raises:
+            `requests.RequestException` if the request failed for good.
+        """
+        delay = self.retry_delay
+        semaphore = self._get_host_semaphore(url)
+        for attempt in range(1, self.attempts + 1):
+            retry_after = None
+            try:
+                with semaphore:
+                    response = self.session.get(url, params=params,
+                                                headers=headers,
+                                                timeout=TIMEOUT)
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    return response
+                if attempt == self.attempts:
+                    response.raise_for_status()
+                retry_after = response.headers.get("Retry-After")
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.attempts:
+                    raise
+            wait = delay
+            if retry_after is not None and retry_after.isdigit():
+                wait = max(wait, int(retry_after))
+            time.sleep(min(wait, self.max_retry_delay))
+            delay = min(delay * 2, self.max_retry_delay)
+        raise AssertionError("Unreachable")
+
+    def get(self, url, params=None, immutable=False):
+        """
+        Get a JSON value, retrying as get_response() does. If the fetcher
+        has a cache, reuse the cached value without a request, if it's
+        immutable, or if the server confirms it's not modified, and cache
+        the retrieved values which can be revalidated, or are immutable.
+        A value cached before it became immutable is revalidated once,
+        before it's marked immutable.
+
+        Args:
+            url:        The URL to get.
+            params:     A dictionary of query parameters, or None.
+            immutable:  True if the value never changes, and can be reused
+                        from the cache without revalidation, e.g. the tests
+                        of a finished SQUAD build. False otherwise.
+
+        Returns:
+            The retrieved JSON value.
+        """
+        if self.cache is None:
+            return self.get_response(url, params).json()
+        key = self.cache.get_key(url, params)
+        cached = self.cache.get(key)
+        headers = {}
+        if cached is not None:
+            if cached["immutable"]:
+                return cached["value"]
+            if cached["etag"] is not None:
+                headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"] is not None:
+                headers["If-Modified-Since"] = cached["last_modified"]
+        response = self.get_response(url, params, headers=headers)
+        if response.status_code == 304 and cached is not None:
+            # Only reuse a value cached before it became immutable without
+            # revalidation once it's confirmed to be the final one
+            if immutable:
+                self.cache.mark_immutable(key)
+            return cached["value"]
+        value = response.json()
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if immutable or etag is not None or last_modified is not None:
+            self.cache.put(key, value, etag=etag,
+                           last_modified=last_modified, immutable=immutable)
+        return value
+
+    def iter_pages(self, url, params=None, immutable=False):
+        """
+        Get a paginated list, page by page, fetching each next page while
+        the previous one is processed.
+
+        Args:
+            url:        The URL of the list.
+            params:     A dictionary of query parameters for the first
+                        page, or None.
+            immutable:  True if the list never changes, and its cached
+                        pages can be reused without revalidation.
+
+        Returns:
+            A generator returning pages: lists of objects.
+        """
+        future = self.executor.submit(self.get, url, params, immutable)
+        while future is not None:
+            page = future.result()
+            future = None
+            if page.get("next"):
+                future = self.executor.submit(self.get, page["next"], None,
+                                              immutable)
+            yield page["results"]
+
+    def iter_objects(self, url, params=None, immutable=False):
+        """
+        Get the objects from a paginated list, one by one, as they are
+        fetched.
+
+        Args:
+            url:        The URL of the list.
+            params:     A dictionary of query parameters for the first
+                        page, or None.
+            immutable:  True if the list never changes, and its cached
+                        pages can be reused without revalidation.
+
+        Returns:
+            A generator returning the objects.
+        """
+        for page in self.iter_pages(url, params, immutable):
+            yield from page
+
+    def get_all(self, url, params=None, immutable=False):
+        """
+        Get all the objects from a paginated list, without prefetching.
+
+        Args:
+            url:        The URL of the list.
+            params:     A dictionary of query parameters for the first
+                        page, or None.
+            immutable:  True if the list never changes, and its cached
+                        pages can be reused without revalidation.
+
+        Returns:
+            The list of the objects.
+        """
+        objs = []
+        while url:
+            page = self.get(url, params, immutable)
+            objs.extend(page["results"])
+            url = page.get("next")
+            params = None
+        return objs
+
+    def iter_lists(self, urls, immutable=False):
+        """
+        Get multiple paginated lists concurrently, limiting the number of
+        lists being fetched at once to the number of workers.
+
+        Args:
+            urls:       An iterable of the lists' URLs.
+            immutable:  True if the lists never change, and their cached
+                        pages can be reused without revalidation.
+
+        Returns:
+            A generator returning (url, objects) tuples, for each list,
+            in the order of the URLs.
+        """
+        pending = collections.deque()
+        for url in urls:
+            if len(pending) >= self.max_workers:
+                done_url, future = pending.popleft()
+                yield done_url, future.result()
+            pending.append((url, self.executor.submit(self.get_all, url,
+                                                      None, immutable)))
+        while pending:
+            done_url, future = pending.popleft()
+            yield done_url, future.result()
+
+    def close(self):
+        """Stop the workers, and close the session and the cache"""
+        self.executor.shutdown(wait=True)
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+
+
+# The fetcher shared by the module's functions, created on first use
+_FETCHER = None
+_FETCHER_LOCK = threading.Lock()
+
+
+def get_fetcher():
+    """
+    Get the fetcher shared by the module's functions, creating it on the
+    first call.
+
+    Returns:
+        The shared fetcher (Fetcher).
+    """
+    global _FETCHER  # pylint: disable=global-statement
+    with _FETCHER_LOCK:
+        if _FETCHER is None:
+            _FETCHER = Fetcher()
+        return _FETCHER
+
+
+def iter_objects(endpoint_url, parameters=None):
+    """
+    Get objects from a paginated list endpoint, one by one, as they are
+    fetched, prefetching the next page.
+
+    Args:
+        endpoint_url:   The URL of the list endpoint.
+        parameters:     A dictionary of query parameters for filtering,
+                        or None.
+
+    Returns:
+        A generator returning the objects.
+    """
+    return get_fetcher().iter_objects(endpoint_url, parameters)
+
+
+def get_objects(endpoint_url, expect_one=False, parameters=None):
     """
     gets list of objects from endpoint_url
     optional parameters allow for filtering
     expect_count
+
+    Returns a single object, if the endpoint is not a list, or if
+    expect_one is True and the list has exactly one object. Use
+    iter_objects() to stream objects instead of collecting them.
     """
-    obj_r = requests.get(endpoint_url, parameters)
-    if obj_r.status_code == 200:
-        objs = obj_r.json()
-        if "count" in objs.keys():
-            if expect_one and objs["count"] == 1:
-                return objs["results"][0]
-            else:
-                ret_obj = []
-                while True:
-                    for obj in objs["results"]:
-                        ret_obj.append(obj)
-                    if objs["next"] is None:
-                        break
-                    else:
-                        obj_r = requests.get(objs["next"])
-                        if obj_r.status_code == 200:
-                            objs = obj_r.json()
-                return ret_obj
-        else:
-            return objs
+    fetcher = get_fetcher()
+    objs = fetcher.get(endpoint_url, parameters)
+    if "count" not in objs:
+        return objs
+    if expect_one and objs["count"] == 1:
+        return objs["results"][0]
+    ret_obj = list(objs["results"])
+    if objs["next"]:
+        ret_obj.extend(fetcher.iter_objects(objs["next"]))
+    return ret_obj
 
 
 class Builds(object):
-    def __init__(self, builds_url):
+    def __init__(self, builds_url, fetcher=None, parameters=None):
         self.builds_url = builds_url
+        self.fetcher = fetcher
+        self.parameters = parameters
 
     def __iter__(self):
-        obj_r = requests.get(self.builds_url)
-        obj_r.raise_for_status()
-        objs = obj_r.json()
-        while True:
-            for obj in objs["results"]:
-                yield obj
-            if objs["next"] is None:
-                break
-            else:
-                obj_r = requests.get(objs["next"])
-                obj_r.raise_for_status()
-                objs = obj_r.json()
+        fetcher = self.fetcher or get_fetcher()
+        return fetcher.iter_objects(self.builds_url, self.parameters)
 
 
 class Build(object):
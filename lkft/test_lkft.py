@@ -0,0 +1,54 @@
+"""Test importing LKFT results from a fake SQUAD server"""
+
+import datetime
+import pytest
+import squad_client
+import lkft
+from fake_squad import FakeSquad
+
+
+@pytest.fixture(name="fake")
+def fake_fixture():
+    """A fake SQUAD server with twenty daily builds of a branch"""
+    fake = FakeSquad(page_size=5).start()
+    fake.projects = fake.generate(builds=20, testruns=1, tests=2)
+    yield fake
+    fake.stop()
+
+
+def test_get_new_builds(fake):
+    """Check only the builds of the requested period are listed"""
+    fetcher = squad_client.Fetcher()
+    builds = lkft.get_new_builds(fetcher, fake.projects["5.3"],
+                                 datetime.datetime(2019, 9, 6),
+                                 datetime.datetime(2019, 9, 11), None)
+    assert [build["datetime"][:10] for build in builds] == [
+        f"2019-09-{day:02d}" for day in range(6, 11)
+    ]
+    # A single page, instead of paging through the newer builds
+    assert fake.requests["/api/projects/1/builds/"] == 1
+    # Newer than the last imported build, with the open-ended last period
+    builds = lkft.get_new_builds(fetcher, fake.projects["5.3"],
+                                 datetime.datetime(2019, 9, 16), None,
+                                 builds[-1]["id"] + 8)
+    assert [build["datetime"][:10] for build in builds] == [
+        f"2019-09-{day:02d}" for day in range(19, 21)
+    ]
+    fetcher.close()
+
+
+def test_fetch_shards(fake):
+    """Check the shards of a branch fetch each build once"""
+    source = lkft.Source(fake.projects, datetime.datetime(2019, 9, 1),
+                         shard_days=7)
+    shards = source.get_shards([])
+    assert shards[:3] == ["5.3@2019-09-01..2019-09-08",
+                          "5.3@2019-09-08..2019-09-15",
+                          "5.3@2019-09-15..2019-09-22"]
+    build_ids = [
+        data["builds"][0]["origin_id"]
+        for shard in shards[:3]
+        for data, _ in source.fetch(shard, None)
+    ]
+    assert len(build_ids) == len(set(build_ids)) == 20
+    assert fake.requests["/api/projects/1/builds/"] == 6
@@ -0,0 +1,166 @@
+"""Test the SQUAD fetcher against a fake SQUAD server"""
+
+import threading
+import time
+import pytest
+import requests
+import squad_client
+from fake_squad import FakeSquad
+
+
+class CountingSession(requests.Session):
+    """A session recording the maximum number of concurrent requests"""
+
+    def __init__(self, delay=0.05):
+        """Initialize the session, delaying each request"""
+        super().__init__()
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+
+    # pylint: disable=arguments-differ
+    def get(self, *args, **kwargs):
+        """Send a GET request, counting the concurrent ones"""
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+            return super().get(*args, **kwargs)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+@pytest.fixture(name="fake")
+def fake_fixture():
+    """A fake SQUAD server failing the first request for each path"""
+    fake = FakeSquad(page_size=5, failures=1).start()
+    yield fake
+    fake.stop()
+
+
+def get_fetcher(**kwargs):
+    """Create a fetcher retrying without delays"""
+    return squad_client.Fetcher(retry_delay=0, max_retry_delay=0, **kwargs)
+
+
+def wait_for(condition, timeout=5):
+    """Wait for a condition to become true, and return it"""
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_retries(fake):
+    """Check failed requests are retried, until the attempts run out"""
+    url = fake.add("/api/builds/1/", dict(id=1))
+    fetcher = get_fetcher()
+    assert fetcher.get(url) == dict(id=1)
+    assert fake.requests["/api/builds/1/"] == 2
+    fetcher.close()
+
+    fake.failures = 3
+    url = fake.add("/api/builds/2/", dict(id=2))
+    fetcher = get_fetcher(attempts=2)
+    with pytest.raises(requests.HTTPError):
+        fetcher.get(url)
+    assert fake.requests["/api/builds/2/"] == 2
+    fetcher.close()
+
+
+def test_per_host_limit(fake):
+    """Check concurrent requests to a host are limited"""
+    urls = [
+        fake.add(f"/api/testruns/{index}/tests/", list(range(index)))
+        for index in range(1, 9)
+    ]
+    session = CountingSession()
+    fetcher = get_fetcher(max_per_host=2, max_workers=8, session=session)
+    lists = list(fetcher.iter_lists(urls))
+    fetcher.close()
+    assert lists == [
+        (url, list(range(index))) for index, url in enumerate(urls, start=1)
+    ]
+    assert session.max_active == 2
+    # Each list of up to two pages is requested once per page, after the
+    # failed first request
+    for index in range(1, 9):
+        assert fake.requests[f"/api/testruns/{index}/tests/"] == \
+            1 + (index + 4) // 5
+
+
+def test_prefetch(fake):
+    """Check pages come in order, and the next one is fetched in advance"""
+    fake.add("/api/projects/1/builds/", list(range(23)))
+    fetcher = get_fetcher()
+    pages = fetcher.iter_pages(fake.url + "/api/projects/1/builds/")
+    assert next(pages) == list(range(5))
+    # The second page is fetched before it's requested, after the failed
+    # first request, and the first page
+    assert wait_for(lambda: fake.requests["/api/projects/1/builds/"] == 3)
+    time.sleep(0.1)
+    # But not the third one
+    assert fake.requests["/api/projects/1/builds/"] == 3
+    assert [next(pages) for _ in range(4)] == [
+        list(range(start, min(start + 5, 23))) for start in range(5, 23, 5)
+    ]
+    assert next(pages, None) is None
+    assert fake.requests["/api/projects/1/builds/"] == 6
+    fetcher.close()
+
+
+def test_revalidation(fake, tmp_path):
+    """Check cached values are revalidated, and immutable ones reused"""
+    url = fake.add("/api/builds/1/", dict(id=1))
+    cache_path = str(tmp_path / "cache.sqlite")
+    fetcher = get_fetcher(cache=squad_client.ResponseCache(cache_path))
+    # Failed, and then retrieved
+    assert fetcher.get(url) == dict(id=1)
+    assert fake.requests["/api/builds/1/"] == 2
+    assert fake.not_modified["/api/builds/1/"] == 0
+    # Revalidated with the ETag
+    assert fetcher.get(url) == dict(id=1)
+    assert fake.requests["/api/builds/1/"] == 3
+    assert fake.not_modified["/api/builds/1/"] == 1
+    # Retrieved again once modified
+    fake.add("/api/builds/1/", dict(id=1, finished=True))
+    assert fetcher.get(url) == dict(id=1, finished=True)
+    assert fake.requests["/api/builds/1/"] == 4
+    assert fake.not_modified["/api/builds/1/"] == 1
+    fetcher.close()
+
+    # Immutable values are reused from the cache without requests
+    url = fake.add("/api/testruns/1/tests/", [dict(id=1)])
+    fetcher = get_fetcher(cache=squad_client.ResponseCache(cache_path))
+    assert fetcher.get_all(url, immutable=True) == [dict(id=1)]
+    assert fetcher.get_all(url, immutable=True) == [dict(id=1)]
+    assert fake.requests["/api/testruns/1/tests/"] == 2
+    assert fake.not_modified["/api/testruns/1/tests/"] == 0
+    fetcher.close()
+
+
+def test_revalidation_before_immutable(fake, tmp_path):
+    """Check values cached as mutable are revalidated once immutable"""
+    url = fake.add("/api/testruns/1/tests/", [dict(id=1)])
+    cache_path = str(tmp_path / "cache.sqlite")
+    fetcher = get_fetcher(cache=squad_client.ResponseCache(cache_path))
+    assert fetcher.get_all(url) == [dict(id=1)]
+    assert fake.requests["/api/testruns/1/tests/"] == 2
+    # Revalidated, and then marked immutable
+    assert fetcher.get_all(url, immutable=True) == [dict(id=1)]
+    assert fake.requests["/api/testruns/1/tests/"] == 3
+    assert fake.not_modified["/api/testruns/1/tests/"] == 1
+    assert fetcher.get_all(url, immutable=True) == [dict(id=1)]
+    assert fake.requests["/api/testruns/1/tests/"] == 3
+    # Modified before becoming immutable: retrieved, and stored immutable
+    url = fake.add("/api/testruns/2/tests/", [dict(id=2)])
+    assert fetcher.get_all(url) == [dict(id=2)]
+    fake.add("/api/testruns/2/tests/", [dict(id=2), dict(id=3)])
+    assert fetcher.get_all(url, immutable=True) == [dict(id=2), dict(id=3)]
+    assert fetcher.get_all(url, immutable=True) == [dict(id=2), dict(id=3)]
+    assert fake.requests["/api/testruns/2/tests/"] == 3
+    assert fake.not_modified["/api/testruns/2/tests/"] == 0
+    fetcher.close()
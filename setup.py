@@ -21,7 +21,7 @@ with open("README.md", "r") as fh:
 setuptools.setup(
     name="kcidb",
     version="1",
-    python_requires=">=3.6",
+    python_requires=">=3.7",
     author="kernelci.org",
     author_email="kernelci@groups.io",
     description="KCIDB = kernelci.org database tools",
@@ -34,7 +34,7 @@ setuptools.setup(
         "Intended Audience :: Developers",
         "License :: OSI Approved :: GPLv2+",
         "Operating System :: OS Independent",
-        "Programming Language :: Python :: 3.6",
+        "Programming Language :: Python :: 3.7",
         "Topic :: Database :: Front-Ends",
     ],
     install_requires=[
@@ -42,18 +42,30 @@ setuptools.setup(
         "jsonschema",
     ],
     extras_require=dict(
+        arrow=[
+            "pyarrow",
+        ],
         dev=[
             "flake8",
             "pylint",
+            "pytest",
+        ],
+        zstd=[
+            "zstandard",
         ],
     ),
     entry_points=dict(
         console_scripts=[
-            "kcidb-init = kcidb:init_main",
-            "kcidb-cleanup = kcidb:cleanup_main",
-            "kcidb-schema = kcidb:schema_main",
-            "kcidb-submit = kcidb:submit_main",
-            "kcidb-query = kcidb:query_main",
+            "kcidb = kcidb.cli:main",
+            "kcidb-init = kcidb.cli:init_main",
+            "kcidb-cleanup = kcidb.cli:cleanup_main",
+            "kcidb-schema = kcidb.cli:schema_main",
+            "kcidb-submit = kcidb.cli:submit_main",
+            "kcidb-spool = kcidb.cli:spool_main",
+            "kcidb-query = kcidb.cli:query_main",
+            "kcidb-summary = kcidb.cli:summary_main",
+            "kcidb-export = kcidb.cli:export_main",
+            "kcidb-import = kcidb.cli:import_main",
         ]
     )
 )
@@ -0,0 +1,114 @@
+"""Test the backfill runner's batching submitter"""
+
+import pytest
+import kcidb
+from kcidb import backfill
+
+
+def get_data(index):
+    """Get I/O data with a build of a revision, and a test of the build"""
+    return dict(
+        version="1",
+        revisions=[dict(origin="ci", origin_id="r1")],
+        builds=[dict(origin="ci", origin_id=f"b{index // 2}",
+                     revision_origin="ci", revision_origin_id="r1")],
+        tests=[dict(origin="ci", origin_id=f"t{index}",
+                    build_origin="ci", build_origin_id=f"b{index // 2}")],
+    )
+
+
+def test_submitter(tmp_path):
+    """Check chunks are submitted without repeated objects, saving state"""
+    client = kcidb.Client("sqlite::memory:")
+    client.init()
+    state_path = str(tmp_path / "state.json")
+    state = {}
+    submitter = backfill.Submitter(client, state, state_path=state_path,
+                                   chunk_size=5)
+    for index in range(3):
+        submitter.add("shard", get_data(index), index)
+    # One revision, two builds, and three tests
+    assert submitter.chunk_len == 0
+    assert submitter.total == 6
+    assert state == dict(shard=2)
+    assert backfill.misc.json_load(state_path) == state
+    # Only a build, and a test are new
+    submitter.add("shard", get_data(3), 3)
+    assert submitter.chunk_len == 1
+    submitter.flush()
+    assert submitter.total == 7
+    assert backfill.misc.json_load(state_path) == dict(shard=3)
+    data = client.query()
+    assert len(data["revisions"]) == 1
+    assert len(data["builds"]) == 2
+    assert len(data["tests"]) == 4
+
+
+def test_submitter_keys_size(monkeypatch):
+    """Check the submitter only remembers the most recent objects"""
+    monkeypatch.setattr(backfill, "KEYS_SIZE", 2)
+    client = kcidb.Client("sqlite::memory:")
+    client.init()
+    submitter = backfill.Submitter(client, {}, chunk_size=100)
+    for index in (0, 1, 2, 4, 2):
+        submitter.add("shard", get_data(index), index)
+    assert len(submitter.keys) == 2
+    submitter.flush()
+    data = client.query()
+    # The revision stays recent, but the second build is forgotten by the
+    # time it's repeated the second time
+    assert len(data["revisions"]) == 1
+    assert sorted(build["origin_id"] for build in data["builds"]) == \
+        ["b0", "b1", "b1", "b2"]
+
+
+class ListSource(backfill.Source):
+    """A source of two shards, with data of two builds each"""
+
+    def get_shards(self, known):
+        return ["a", "b"]
+
+    def fetch(self, shard, progress):
+        offset = 0 if shard == "a" else 2
+        for index in range(offset, offset + 2):
+            yield get_data(index), index
+
+
+class FailingClient(kcidb.Client):
+    """A client failing its first submission"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.failures = 1
+
+    def submit(self, data, validate=True):
+        if self.failures:
+            self.failures -= 1
+            raise Exception("transient DB error")
+        super().submit(data, validate=validate)
+
+
+def test_submit_failure(tmp_path):
+    """Check submission failures are raised, keeping the chunk and state"""
+    client = FailingClient("sqlite::memory:")
+    client.init()
+    state_path = str(tmp_path / "state.json")
+    with pytest.raises(Exception, match="transient DB error"):
+        backfill.run(ListSource(), client, state_path=state_path, jobs=1,
+                     chunk_size=3)
+    assert backfill.misc.json_load(state_path, None) is None
+    # The failed chunk can be submitted again, with its progress
+    state = {}
+    submitter = backfill.Submitter(client, state, chunk_size=3)
+    client.failures = 1
+    with pytest.raises(Exception, match="transient DB error"):
+        submitter.add("a", get_data(0), 0)
+    assert state == {}
+    assert submitter.chunk["progress"] == dict(a=0)
+    submitter.flush()
+    assert state == dict(a=0)
+    assert submitter.total == 3
+    # A whole run succeeds once the database recovers
+    assert backfill.run(ListSource(), client, state_path=state_path,
+                        jobs=1, chunk_size=3) == 7
+    assert backfill.misc.json_load(state_path) == dict(a=1, b=3)
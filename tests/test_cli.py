@@ -0,0 +1,62 @@
+"""Test the command-line tools"""
+
+import json
+import os
+import subprocess
+import sys
+import pytest
+from kcidb import io_schema
+
+ROOT_DIR = os.path.join(os.path.dirname(__file__), "..")
+
+# A script running the kcidb tool with the JSON list of arguments in its
+# first argument, and writing the JSON list of imported modules to stderr
+SCRIPT = """
+import json
+import sys
+from kcidb import cli
+args = json.loads(sys.argv[1])
+sys.argv = ["kcidb", *args]
+try:
+    cli.main()
+except SystemExit:
+    pass
+json.dump(sorted(sys.modules), sys.stderr)
+"""
+
+
+def run_kcidb(*args):
+    """
+    Run the kcidb tool with the specified arguments in a separate process.
+
+    Returns:
+        The tool's output, and the set of names of the modules imported.
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [ROOT_DIR] + ([env["PYTHONPATH"]] if env.get("PYTHONPATH") else [])
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", SCRIPT, json.dumps(args)],
+        env=env, capture_output=True, check=True, text=True
+    )
+    return result.stdout, set(json.loads(result.stderr))
+
+
+@pytest.mark.parametrize("args", [
+    ("schema",),
+    ("schema", "--help"),
+    ("query", "--help"),
+    ("submit", "--help"),
+])
+def test_no_database_imports(args):
+    """Check tools not accessing the database don't import its libraries"""
+    _, modules = run_kcidb(*args)
+    assert "google.cloud.bigquery" not in modules
+    assert "jsonschema" not in modules
+
+
+def test_schema():
+    """Check kcidb-schema outputs the I/O schema"""
+    output, _ = run_kcidb("schema")
+    assert json.loads(output) == io_schema.JSON
@@ -0,0 +1,124 @@
+"""Test the columnar I/O data representation"""
+
+import pytest
+import kcidb
+from kcidb import columnar
+from kcidb import io_schema
+
+DATA = dict(
+    version="1",
+    revisions=[
+        dict(origin="ci", origin_id="r1",
+             git_repository_url="https://git.kernel.org/linux.git",
+             patch_mboxes=[dict(name="1.patch",
+                                url="https://example.com/1.patch")],
+             discovery_time="2020-01-01T12:00:00+00:00",
+             contacts=["a@example.com", "b@example.com"],
+             valid=True, misc=dict(nested=dict(list=[1, "two", None]))),
+        dict(origin="ci", origin_id="r2", valid=False),
+    ],
+    builds=[
+        dict(origin="ci", origin_id="b1",
+             revision_origin="ci", revision_origin_id="r1",
+             duration=12.5, architecture="x86_64",
+             output_files=[dict(name="bzImage",
+                                url="https://example.com/bzImage")]),
+        dict(origin="ci", origin_id="b2",
+             revision_origin="ci", revision_origin_id="r1"),
+    ],
+    tests=[
+        dict(origin="ci", origin_id="t1",
+             build_origin="ci", build_origin_id="b1",
+             environment=dict(description="qemu", misc=dict(cpus=4)),
+             path="ltp.fs", status="PASS", waived=False, duration=0,
+             misc=dict(retries=[])),
+        dict(origin="ci", origin_id="t2",
+             build_origin="ci", build_origin_id="b1",
+             environment=dict(description="board"),
+             path="ltp.fs", status="FAIL"),
+    ],
+)
+
+
+def test_table_round_trip():
+    """Check objects come out of a table as they went in"""
+    for obj_list_name, obj_list in DATA.items():
+        if obj_list_name == "version":
+            continue
+        table = columnar.Table(obj_list_name)
+        table.extend(obj_list)
+        assert len(table) == len(obj_list)
+        assert list(table) == obj_list
+
+
+def test_table_get():
+    """Check values are decoded on retrieval, and missing ones are None"""
+    table = columnar.Table("tests")
+    table.extend(DATA["tests"])
+    assert table.get("environment", 0) == dict(description="qemu",
+                                               misc=dict(cpus=4))
+    assert table.get("misc", 0) == dict(retries=[])
+    assert table.get("misc", 1) is None
+    assert table.get("waived", 0) is False
+    assert table.get("waived", 1) is None
+    assert table.get("duration", 0) == 0
+    assert table.get("duration", 1) is None
+
+
+def test_table_interning():
+    """Check repeated strings of interned fields are stored once"""
+    table = columnar.Table("tests")
+    table.extend(
+        dict(obj, path="".join(["ltp", ".fs"])) for obj in DATA["tests"]
+    )
+    assert table.columns["path"][0] is table.columns["path"][1]
+
+
+def test_table_encoding_copies():
+    """Check appending an object doesn't modify it"""
+    obj = dict(DATA["tests"][0])
+    environment = dict(obj["environment"])
+    table = columnar.Table("tests")
+    table.append(obj)
+    assert obj == DATA["tests"][0]
+    assert obj["environment"] == environment
+
+
+def test_data_round_trip():
+    """Check I/O data comes out of columnar data as it went in"""
+    io_schema.validate(DATA)
+    data = columnar.Data()
+    data.extend(DATA)
+    data.extend(dict(version="1"))
+    assert data.to_json() == DATA
+
+
+@pytest.mark.parametrize("obj_list_name", ["revisions", "builds", "tests"])
+def test_parquet_round_trip(tmp_path, obj_list_name):
+    """Check objects come out of a Parquet file as they went in"""
+    pytest.importorskip("pyarrow")
+    data = columnar.Data()
+    data.extend(DATA)
+    path = str(tmp_path / "table.parquet")
+    data.tables[obj_list_name].to_parquet(path)
+    assert [
+        obj
+        for batch in columnar.iter_batches(path, "parquet", 1)
+        for obj in columnar.iter_arrow_objects(obj_list_name, batch)
+    ] == DATA[obj_list_name]
+
+
+@pytest.mark.parametrize("file_format", list(columnar.FILE_FORMAT_EXTENSIONS))
+def test_export_import(tmp_path, file_format):
+    """Check data exported from a database imports into another unchanged"""
+    pytest.importorskip("pyarrow")
+    source = kcidb.Client("sqlite::memory:")
+    source.init()
+    source.submit(DATA)
+    source.export_tables(str(tmp_path), file_format=file_format,
+                         page_size=1)
+    destination = kcidb.Client("sqlite::memory:")
+    destination.init()
+    destination.import_tables(str(tmp_path), file_format=file_format,
+                              chunk_size=1)
+    assert destination.query() == source.query() == DATA
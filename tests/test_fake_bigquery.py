@@ -0,0 +1,203 @@
+"""Test the BigQuery backend with the fake BigQuery client, offline"""
+
+import time
+import pytest
+from google.cloud import bigquery as bq
+import kcidb
+from kcidb import fake_bigquery
+from kcidb.backends import bigquery
+
+DATASET = "test"
+
+DATA = dict(
+    version="1",
+    revisions=[
+        dict(origin="ci", origin_id="r1"),
+    ],
+    builds=[
+        dict(origin="ci", origin_id="b1",
+             revision_origin="ci", revision_origin_id="r1", valid=True),
+    ],
+    tests=[
+        dict(origin="ci", origin_id="t1",
+             build_origin="ci", build_origin_id="b1",
+             path="boot", status="PASS", waived=False),
+        dict(origin="ci", origin_id="t2",
+             build_origin="ci", build_origin_id="b1",
+             path="ltp.fs", status="FAIL", waived=False),
+    ],
+)
+
+JSON = bq.SourceFormat.NEWLINE_DELIMITED_JSON
+
+# Number of seconds each fake load job takes
+LOAD_LATENCY = 0.3
+
+
+def get_client(fake, **kwargs):
+    """Create an initialized kcidb client using a fake BigQuery client"""
+    backend_kwargs = {
+        key: kwargs.pop(key) for key in ("load_format", "stream")
+        if key in kwargs
+    }
+    client = kcidb.Client(
+        bigquery.Backend(DATASET, bq_client=fake, **backend_kwargs),
+        **kwargs)
+    client.init()
+    return client
+
+
+def rows(fake, table_name):
+    """Get the rows of a table of the test dataset"""
+    return fake.list_rows(f"{fake.project}.{DATASET}.{table_name}")
+
+
+def merged_tables(fake):
+    """Get the names of the tables recorded queries merged into"""
+    return [
+        query.split("`")[1] for query, _ in fake.queries
+        if query.startswith("MERGE ")
+    ]
+
+
+def test_init_cleanup():
+    """Check tables are created, and removed on cleanup"""
+    fake = fake_bigquery.Client()
+    client = get_client(fake)
+    assert sorted(table_id.rsplit(".", 1)[-1] for table_id in fake.tables) \
+        == sorted(["revisions", "builds", "tests",
+                   "revision_summaries", "build_summaries"])
+    client.cleanup()
+    assert not fake.tables
+
+
+@pytest.mark.parametrize("load_format", [JSON, bq.SourceFormat.PARQUET])
+def test_submit_summarize(load_format):
+    """Check default submission loads the data and updates summaries"""
+    if load_format == bq.SourceFormat.PARQUET:
+        pytest.importorskip("pyarrow")
+    fake = fake_bigquery.Client()
+    client = get_client(fake, load_format=load_format)
+    client.submit(DATA)
+    for obj_list_name, obj_list in DATA.items():
+        if obj_list_name == "version":
+            continue
+        table_rows = rows(fake, obj_list_name)
+        assert [row["origin_id"] for row in table_rows] == \
+            [obj["origin_id"] for obj in obj_list]
+        assert all(row["ingestion_time"] for row in table_rows)
+    # Build summaries are updated before revision summaries
+    assert merged_tables(fake) == ["build_summaries", "revision_summaries"]
+    # Build summaries of the data are added, without scanning the tables
+    query, params = fake.queries[0]
+    assert "FROM tests" not in query and "FROM builds" not in query
+    summary = {
+        field["name"]: field_value["value"]
+        for field, field_value in zip(
+            params["build_summaries"]["parameterType"]["arrayType"][
+                "structTypes"],
+            params["build_summaries"]["parameterValue"]["arrayValues"][0][
+                "structValues"].values()
+        )
+    }
+    assert summary["origin_id"] == "b1"
+    assert summary["test_count"] == "2"
+    assert summary["status"] == "FAIL"
+    # Revision summaries are recomputed from build summaries
+    query, params = fake.queries[1]
+    assert "FROM tests" not in query and "FROM builds" not in query
+    assert params["revision_keys"]["parameterValue"]["arrayValues"]
+
+
+def test_submit_dedup_summarize():
+    """Check deduplicating submission recomputes summaries"""
+    fake = fake_bigquery.Client()
+    client = get_client(fake, load_format=JSON, dedup=True)
+    client.submit(DATA)
+    query, params = fake.queries[-2]
+    assert query.startswith("MERGE `build_summaries`")
+    assert "FROM tests" in query
+    assert "build_origins" in params and "build_origin_ids" in params
+    assert query.count("IN UNNEST(@build_origin_ids)") == 2
+
+
+def test_submit_no_summarize():
+    """Check submission without summaries doesn't query"""
+    fake = fake_bigquery.Client()
+    client = get_client(fake, summarize=False)
+    client.submit(DATA)
+    assert len(rows(fake, "tests")) == 2
+    assert not fake.queries
+
+
+def test_submit_dedup():
+    """Check deduplicating submission merges and removes a staging table"""
+    fake = fake_bigquery.Client()
+    client = get_client(fake, load_format=JSON, dedup=True,
+                        summarize=False)
+    client.submit(DATA)
+    # Tables are loaded concurrently, so they can be merged in any order
+    assert sorted(merged_tables(fake)) == ["builds", "revisions", "tests"]
+    for query, _ in fake.queries:
+        assert "USING `_staging_" in query
+    # The merge isn't executed, and the staging tables are removed
+    assert not rows(fake, "tests")
+    assert len(fake.tables) == 5
+
+
+def submit_time(load_concurrency):
+    """
+    Measure the time of submitting the test data to a fake BigQuery client
+    with a load latency, loading tables with the specified concurrency.
+    """
+    fake = fake_bigquery.Client(load_latency=LOAD_LATENCY)
+    client = get_client(fake, load_format=JSON, summarize=False,
+                        load_concurrency=load_concurrency)
+    start = time.monotonic()
+    client.submit(DATA)
+    elapsed = time.monotonic() - start
+    assert len(rows(fake, "tests")) == 2
+    return elapsed
+
+
+def test_submit_concurrent_loads():
+    """Check tables are loaded concurrently, taking as long as one load"""
+    assert LOAD_LATENCY <= submit_time(3) < LOAD_LATENCY * 2
+    assert submit_time(1) >= LOAD_LATENCY * 3
+
+
+def test_submit_stream():
+    """Check streaming submission drops repeated objects"""
+    fake = fake_bigquery.Client()
+    client = get_client(fake, stream=True, summarize=False)
+    client.submit(DATA)
+    client.submit(DATA)
+    assert len(rows(fake, "revisions")) == 1
+    assert len(rows(fake, "tests")) == 2
+
+
+def test_submit_load_error():
+    """Check load errors are reported, and summaries still updated"""
+    fake = fake_bigquery.Client(load_errors=dict(tests="Invalid row"))
+    client = get_client(fake, load_format=JSON)
+    with pytest.raises(Exception, match="tests: Invalid row"):
+        client.submit(DATA)
+    assert len(rows(fake, "builds")) == 1
+    assert not rows(fake, "tests")
+    assert merged_tables(fake) == ["build_summaries", "revision_summaries"]
+    # Summaries are recomputed, as some data wasn't loaded
+    assert "build_origins" in fake.queries[0][1]
+
+
+def test_query():
+    """Check queries are recorded with their parameters, returning nothing"""
+    fake = fake_bigquery.Client()
+    client = get_client(fake)
+    data = client.query(origin="ci", revision_ids=["r1"])
+    assert data == dict(version="1", revisions=[], builds=[], tests=[])
+    assert len(fake.queries) == 3
+    for query, params in fake.queries:
+        assert query.startswith("SELECT ")
+        assert params["origin"]["parameterValue"] == dict(value="ci")
+    assert client.query_summaries() == dict(revision_summaries=[],
+                                            build_summaries=[])
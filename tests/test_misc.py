@@ -0,0 +1,67 @@
+"""Test miscellaneous utilities"""
+
+import gzip
+import io
+import pytest
+from kcidb import misc
+
+# Text with non-ASCII characters, spanning multiple I/O chunks
+TEXT = "".join(f"line {index} ✓\n" for index in range(100000))
+
+
+class UnpeekableReader(io.RawIOBase):
+    """A raw binary stream without peek(), like a pipe"""
+
+    def __init__(self, data):
+        """Initialize the stream reading the specified bytes"""
+        super().__init__()
+        self.fp = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        return self.fp.readinto(buffer)
+
+
+def write(compression):
+    """Write TEXT with the specified compression, and return the bytes"""
+    fp = io.BytesIO()
+    with misc.open_output(fp, compression=compression) as text:
+        text.write(TEXT)
+    # The binary stream is left open
+    assert not fp.closed
+    return fp.getvalue()
+
+
+def read(data):
+    """Read text from the (compressed) bytes, without peeking"""
+    return misc.open_input(UnpeekableReader(data)).read()
+
+
+@pytest.mark.parametrize("compression", [None, "gzip", "zstd"])
+def test_round_trip(compression):
+    """Check text is written and read back unchanged"""
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    data = write(compression)
+    if compression is None:
+        assert data == TEXT.encode("utf-8")
+    else:
+        assert data.startswith(misc.COMPRESSION_MAGIC_MAP[compression])
+        assert len(data) < len(TEXT)
+    assert read(data) == TEXT
+
+
+def test_gzip_compatible():
+    """Check gzip output is standard, and concatenated members are read"""
+    data = write("gzip")
+    assert gzip.decompress(data).decode("utf-8") == TEXT
+    assert read(data + gzip.compress(b"last\n")) == TEXT + "last\n"
+
+
+def test_zstd_frames():
+    """Check concatenated zstd frames are all read"""
+    zstandard = pytest.importorskip("zstandard")
+    data = write("zstd") + zstandard.ZstdCompressor().compress(b"last\n")
+    assert read(data) == TEXT + "last\n"
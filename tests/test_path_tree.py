@@ -0,0 +1,55 @@
+"""Test the test path tree and path summaries"""
+
+import pytest
+from kcidb import cli
+from kcidb import path_tree
+
+TESTS = [
+    dict(origin="ci", origin_id="t1", build_origin="ci",
+         build_origin_id="b1", path="ltp.fs", status="PASS"),
+    dict(origin="ci", origin_id="t2", build_origin="ci",
+         build_origin_id="b1", path="ltp.mm", status="FAIL"),
+    dict(origin="ci", origin_id="t3", build_origin="ci",
+         build_origin_id="b2", path="boot", status="PASS"),
+]
+
+
+@pytest.mark.parametrize("path, normalized", [
+    ("", ""), (".", ""), ("ltp", "ltp"), ("ltp.", "ltp"),
+    (".ltp", "ltp"), ("ltp..fs", "ltp.fs"),
+])
+def test_normalize_path(path, normalized):
+    """Check empty path names are removed"""
+    assert path_tree.normalize_path(path) == normalized
+
+
+def test_get():
+    """Check nodes are found by path, and missing ones aren't"""
+    tree = path_tree.from_tests(TESTS)
+    assert tree.get("") is tree
+    assert tree.get("ltp").summary()["status"] == "FAIL"
+    assert tree.get("ltp.fs").summary()["status"] == "PASS"
+    assert tree.get("ltp.nosuch") is None
+    assert tree.get("nosuch") is None
+
+
+@pytest.mark.parametrize("path, paths", [
+    (".", [""]), ("ltp.", ["", "ltp"]), (".ltp", ["", "ltp"]),
+    ("ltp..fs", ["", "ltp", "ltp.fs"]), ("ltp.fs.", ["", "ltp", "ltp.fs"]),
+])
+def test_add_empty_names(path, paths):
+    """Check empty path names don't create nodes, nor are looked up"""
+    tree = path_tree.from_tests([dict(TESTS[0], path=path)])
+    assert [node.path for node in tree.walk()] == paths
+    assert all(node.test_count == 1 for node in tree.walk())
+    assert tree.get(path).path == paths[-1]
+
+
+def test_path_summaries():
+    """Check builds without tests under the prefix are skipped"""
+    # pylint: disable=protected-access
+    summaries = list(cli._get_path_summaries(TESTS, "ltp"))
+    assert [(s["build_origin_id"], s["path"]) for s in summaries] == [
+        ("b1", "ltp"), ("b1", "ltp.fs"), ("b1", "ltp.mm"),
+    ]
+    assert not list(cli._get_path_summaries(TESTS, "nosuch"))
@@ -0,0 +1,116 @@
+"""Test the submission spool and spooler"""
+
+import os
+import threading
+import pytest
+import kcidb
+from kcidb import misc
+from kcidb import spool
+
+
+class FailingClient:
+    """A client failing to submit batches containing specific revisions"""
+
+    def __init__(self, failing_ids):
+        """Initialize the client failing on the specified revision IDs"""
+        self.failing_ids = set(failing_ids)
+        self.submitted = []
+        self.attempts = 0
+
+    def submit(self, data, validate=True):
+        """Submit data, failing if it contains a failing revision"""
+        assert not validate
+        self.attempts += 1
+        ids = [revision["origin_id"] for revision in data["revisions"]]
+        if self.failing_ids & set(ids):
+            raise kcidb.SubmitError("Rejected by the database")
+        self.submitted.extend(ids)
+
+
+class TransientlyFailingClient(FailingClient):
+    """A client failing to connect a number of times, and then succeeding"""
+
+    def __init__(self, failures):
+        """Initialize the client failing the specified number of times"""
+        super().__init__([])
+        self.failures = failures
+
+    def submit(self, data, validate=True):
+        """Submit data, failing to connect, if any failures are left"""
+        if self.failures:
+            self.failures -= 1
+            self.attempts += 1
+            raise ConnectionError("Database unavailable")
+        super().submit(data, validate=validate)
+
+
+class StopEvent(threading.Event):
+    """A stop event which gets set once the spool is empty"""
+
+    def __init__(self, submission_spool):
+        """Initialize the event, checking the specified spool"""
+        super().__init__()
+        self.spool = submission_spool
+
+    def wait(self, timeout=None):
+        """Set the event if the spool is empty, and return immediately"""
+        if not self.spool.list():
+            self.set()
+        return self.is_set()
+
+
+def spool_submissions(directory, count):
+    """Create a spool with submissions of one revision each"""
+    submission_spool = spool.Spool(str(directory))
+    for index in range(count):
+        submission_spool.put(dict(
+            version="1",
+            revisions=[dict(origin="test", origin_id=f"r{index}")]
+        ))
+    return submission_spool
+
+
+@pytest.mark.parametrize("failing_ids", [[], ["r5"], ["r0", "r7"]])
+def test_run_rejects_failing(tmp_path, failing_ids):
+    """Check submissions which keep failing are rejected, but not others"""
+    submission_spool = spool_submissions(tmp_path, 8)
+    client = FailingClient(failing_ids)
+    spooler = spool.Spooler(client, submission_spool,
+                            batch_size=100, batch_age=0,
+                            min_retry_delay=0.001, max_retry_delay=0.001)
+    spooler.run(StopEvent(submission_spool), max_attempts=2)
+    assert sorted(client.submitted) == \
+        [f"r{index}" for index in range(8) if f"r{index}" not in failing_ids]
+    rejected = [
+        misc.json_load(os.path.join(submission_spool.rejected_dir, name))
+        for name in os.listdir(submission_spool.rejected_dir)
+    ]
+    assert sorted(data["revisions"][0]["origin_id"] for data in rejected) \
+        == sorted(failing_ids)
+    assert not submission_spool.list()
+
+
+def test_run_retries_transient(tmp_path):
+    """Check submissions failing transiently are retried, not rejected"""
+    submission_spool = spool_submissions(tmp_path, 8)
+    client = TransientlyFailingClient(10)
+    spooler = spool.Spooler(client, submission_spool,
+                            batch_size=100, batch_age=0,
+                            min_retry_delay=0.001, max_retry_delay=0.001)
+    spooler.run(StopEvent(submission_spool), max_attempts=2)
+    assert client.attempts == 11
+    assert sorted(client.submitted) == [f"r{index}" for index in range(8)]
+    assert not os.listdir(submission_spool.rejected_dir)
+    assert not submission_spool.list()
+
+
+def test_is_permanent():
+    """Check only errors caused by the submitted data are permanent"""
+    assert spool.is_permanent(kcidb.SubmitError("Invalid row"))
+    assert not spool.is_permanent(ConnectionError("Connection refused"))
+    assert not spool.is_permanent(Exception("Service unavailable"))
+    jsonschema = pytest.importorskip("jsonschema")
+    assert spool.is_permanent(jsonschema.exceptions.ValidationError("x"))
+    exceptions = pytest.importorskip("google.api_core.exceptions")
+    assert spool.is_permanent(exceptions.BadRequest("Invalid row"))
+    assert not spool.is_permanent(exceptions.ServiceUnavailable("Outage"))
@@ -0,0 +1,161 @@
+"""Test the SQLite backend's filters, and deduplication"""
+
+from datetime import datetime, timezone
+import pytest
+import kcidb
+
+# Revisions discovered on consecutive days, with a build each, and tests
+# with paths around the "a" prefix, plus a revision of another CI system
+DATA = dict(
+    version="1",
+    revisions=[
+        dict(origin="ci", origin_id=f"r{day}",
+             discovery_time=f"2020-01-0{day}T00:00:00+00:00")
+        for day in (1, 2, 3)
+    ] + [
+        dict(origin="other", origin_id="r1",
+             discovery_time="2020-01-02T00:00:00+00:00"),
+    ],
+    builds=[
+        dict(origin="ci", origin_id=f"b{day}",
+             revision_origin="ci", revision_origin_id=f"r{day}")
+        for day in (1, 2, 3)
+    ] + [
+        dict(origin="other", origin_id="b1",
+             revision_origin="other", revision_origin_id="r1"),
+    ],
+    tests=[
+        dict(origin="ci", origin_id=f"t{day}-{path}",
+             build_origin="ci", build_origin_id=f"b{day}", path=path)
+        for day in (1, 2, 3)
+        for path in ("a", "a.b", "a.b.c", "ab", "a-b", "a_b", "b")
+    ] + [
+        dict(origin="other", origin_id="t1",
+             build_origin="other", build_origin_id="b1", path="a"),
+    ],
+)
+
+
+@pytest.fixture(name="client")
+def client_fixture():
+    """A client of an in-memory SQLite database with the test data"""
+    client = kcidb.Client("sqlite::memory:")
+    client.init()
+    client.submit(DATA)
+    return client
+
+
+def ids(data):
+    """Get a dictionary of object list names and sorted object IDs"""
+    return {
+        obj_list_name: sorted(
+            f"{obj['origin']}:{obj['origin_id']}" for obj in obj_list
+        )
+        for obj_list_name, obj_list in data.items()
+        if obj_list_name != "version"
+    }
+
+
+def test_no_filters(client):
+    """Check everything is returned without filters"""
+    assert ids(client.query()) == ids(DATA)
+
+
+def test_origin(client):
+    """Check objects are filtered by origin, not only revisions"""
+    result = ids(client.query(origin="other"))
+    assert result == dict(revisions=["other:r1"], builds=["other:b1"],
+                          tests=["other:t1"])
+
+
+def test_revision_ids(client):
+    """Check builds and tests are limited to those of the revisions"""
+    result = ids(client.query(revision_ids=["r2"]))
+    assert result["revisions"] == ["ci:r2"]
+    assert result["builds"] == ["ci:b2"]
+    assert len(result["tests"]) == 7
+    assert all(test_id.startswith("ci:t2-") for test_id in result["tests"])
+    # The same ID from both CI systems, unless limited by origin
+    assert ids(client.query(revision_ids=["r1"]))["builds"] == \
+        ["ci:b1", "other:b1"]
+    assert ids(client.query(origin="ci", revision_ids=["r1"]))["tests"] == \
+        sorted(f"ci:t1-{path}"
+               for path in ("a", "a.b", "a.b.c", "ab", "a-b", "a_b", "b"))
+    assert ids(client.query(revision_ids=[])) == \
+        dict(revisions=[], builds=[], tests=[])
+
+
+@pytest.mark.parametrize("path_prefix, paths", [
+    ("a", ["a", "a.b", "a.b.c"]),
+    ("a.b", ["a.b", "a.b.c"]),
+    ("ab", ["ab"]),
+    ("a.c", []),
+])
+def test_path_prefix(client, path_prefix, paths):
+    """Check tests are limited to the path and below, without siblings"""
+    result = ids(client.query(origin="ci", revision_ids=["r3"],
+                              path_prefix=path_prefix))
+    assert result["tests"] == sorted(f"ci:t3-{path}" for path in paths)
+    # Revisions and builds aren't filtered by the test path
+    assert result["builds"] == ["ci:b3"]
+
+
+@pytest.mark.parametrize("after, before, revisions", [
+    (2, None, ["ci:r2", "ci:r3", "other:r1"]),
+    (None, 2, ["ci:r1"]),
+    (2, 3, ["ci:r2", "other:r1"]),
+    (3, 2, []),
+])
+def test_discovered(client, after, before, revisions):
+    """Check the discovery time bounds, and linked builds and tests"""
+    def get_time(day):
+        return None if day is None else \
+            datetime(2020, 1, day, tzinfo=timezone.utc)
+    result = ids(client.query(discovered_after=get_time(after),
+                              discovered_before=get_time(before)))
+    assert result["revisions"] == revisions
+    assert result["builds"] == sorted(
+        revision.replace(":r", ":b") for revision in revisions
+    )
+    assert {test.split("-")[0] for test in result["tests"]} == {
+        revision.replace(":r", ":t") for revision in revisions
+    }
+
+
+def test_discovered_timezone(client):
+    """Check discovery time bounds are compared in UTC"""
+    result = ids(client.query(discovered_after=datetime.fromisoformat(
+        "2020-01-03T01:00:00+02:00"
+    )))
+    assert result["revisions"] == ["ci:r3"]
+
+
+def test_dedup():
+    """Check deduplicating submissions replace objects with the same ID"""
+    data = dict(version="1", builds=[
+        dict(origin="ci", origin_id="b1", revision_origin="ci",
+             revision_origin_id="r1", valid=False),
+    ])
+    fixed_data = dict(version="1", builds=[
+        dict(origin="ci", origin_id="b1", revision_origin="ci",
+             revision_origin_id="r1", valid=True),
+        dict(origin="other", origin_id="b1", revision_origin="other",
+             revision_origin_id="r1", valid=False),
+    ])
+    client = kcidb.Client("sqlite::memory:")
+    client.init()
+    client.submit(data)
+    client.submit(fixed_data)
+    assert len(client.query()["builds"]) == 3
+    client = kcidb.Client("sqlite::memory:", dedup=True)
+    client.init()
+    client.submit(data)
+    client.submit(fixed_data)
+    assert sorted(client.query()["builds"],
+                  key=lambda build: build["origin"]) == fixed_data["builds"]
+    # The last of the objects with the same ID in a submission is kept
+    client.submit(dict(version="1",
+                       builds=fixed_data["builds"] + data["builds"]))
+    assert sorted(client.query()["builds"],
+                  key=lambda build: build["origin"]) == \
+        data["builds"] + fixed_data["builds"][1:]
@@ -0,0 +1,129 @@
+"""Test computing and combining build summaries of separate data"""
+
+import json
+import os
+import sqlite3
+import pytest
+import kcidb
+from kcidb import db_schema
+from kcidb import io_schema
+from kcidb.backends import summaries
+
+SAMPLES_DIR = os.path.join(os.path.dirname(__file__), "..", "samples")
+
+NAMES = [
+    field.name for field in db_schema.SUMMARY_TABLE_MAP["build_summaries"]
+]
+
+
+# Synthetic data with repeated builds, and tests of missing builds, with
+# and without statuses, waived and not, with and without durations
+SYNTHETIC = dict(
+    version="1",
+    builds=[
+        dict(origin="ci", origin_id=f"b{index % 3}",
+             revision_origin="ci", revision_origin_id=f"r{index}",
+             **(dict(valid=index % 2 == 0) if index % 5 else {}),
+             **(dict(duration=index * 1.5) if index % 4 else {}))
+        for index in range(9)
+    ],
+    tests=[
+        dict(origin="ci", origin_id=f"t{index}",
+             build_origin="ci", build_origin_id=f"b{index % 5}",
+             waived=index % 3 == 0,
+             **(dict(status=io_schema.TEST_STATUS_PRIORITY[
+                 index % len(io_schema.TEST_STATUS_PRIORITY)
+             ]) if index % 7 else {}),
+             **(dict(duration=index * 0.25) if index % 2 else {}))
+        for index in range(60)
+    ],
+)
+
+
+def load_sample(name):
+    """Load a sample I/O data file, or the synthetic data"""
+    if name == "synthetic":
+        return SYNTHETIC
+    with open(os.path.join(SAMPLES_DIR, name), "r",
+              encoding="utf-8") as json_file:
+        return json.load(json_file)
+
+
+def normalize(build_summaries):
+    """
+    Normalize build summaries for comparison: drop missing values, convert
+    booleans, round numbers, and sort by build.
+    """
+    result = []
+    for summary in build_summaries:
+        normalized = {}
+        for name, value in summary.items():
+            if value is None:
+                continue
+            if name == "valid":
+                value = bool(value)
+            elif isinstance(value, float):
+                value = round(value, 6)
+            normalized[name] = value
+        result.append(normalized)
+    return sorted(result, key=lambda s: (s["origin"], s["origin_id"]))
+
+
+def split(data):
+    """Split I/O data into two parts, interleaving the objects"""
+    return [
+        {
+            name: value[index::2] if isinstance(value, list) else value
+            for name, value in data.items()
+        }
+        for index in (0, 1)
+    ]
+
+
+@pytest.mark.parametrize("sample",
+                         ["synthetic", "kernelci.json", "cki.json"])
+def test_get_build_summaries(sample):
+    """Check summaries computed from data match the SQL-computed ones"""
+    data = load_sample(sample)
+    client = kcidb.Client("sqlite::memory:")
+    client.init()
+    client.submit(data)
+    assert normalize(summaries.get_build_summaries(data)) == \
+        normalize(client.query_summaries()["build_summaries"])
+
+
+@pytest.mark.parametrize("sample",
+                         ["synthetic", "kernelci.json", "cki.json"])
+def test_build_summaries_combine_sql(sample):
+    """Check combining summaries of parts of data in SQL sums them up"""
+    data = load_sample(sample)
+    conn = sqlite3.connect(":memory:")
+    for table_name, part in zip(("target", "source"), split(data)):
+        conn.execute(f"CREATE TABLE {table_name} ({', '.join(NAMES)})")
+        conn.executemany(
+            f"INSERT INTO {table_name} VALUES "
+            f"({', '.join('?' * len(NAMES))})",
+            (
+                [summary[name] for name in NAMES]
+                for summary in summaries.get_build_summaries(part)
+            )
+        )
+    exprs = summaries.build_summaries_combine_sql("target", "source")
+    combined = [
+        dict(zip(NAMES, row)) for row in conn.execute(
+            "SELECT target.origin, target.origin_id, " +
+            ", ".join(expr for _, expr in exprs) + " "
+            "FROM target INNER JOIN source "
+            "ON target.origin = source.origin AND "
+            "target.origin_id = source.origin_id"
+        )
+    ]
+    assert combined
+    combined_keys = {
+        (summary["origin"], summary["origin_id"]) for summary in combined
+    }
+    expected = [
+        summary for summary in summaries.get_build_summaries(data)
+        if (summary["origin"], summary["origin_id"]) in combined_keys
+    ]
+    assert normalize(combined) == normalize(expected)